@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 
 class Settings(BaseSettings):
     # Telegram
@@ -30,6 +30,21 @@ class Settings(BaseSettings):
 
     AI_TEMPERATURE: float = 0.7
     AI_MAX_TOKENS: int = 2000
+    AI_WEEK_MAX_TOKENS: int = 8000  # лимит ответа для плана на неделю одним запросом
+    AI_CONCURRENCY: int = 4  # одновременных запросов к Gemini на весь бот
+    AI_FEATURE_CONCURRENCY: Dict[str, int] = {"vision": 2, "photo": 2, "week_plan": 2}  # лимиты отдельных функций
+    AI_TIMEOUT: float = 30.0  # секунд на одну попытку запроса
+    AI_WEEK_TIMEOUT: float = 90.0  # секунд на план на неделю одним запросом
+    AI_MAX_RETRIES: int = 2  # повторов при 429/5xx и таймаутах
+    AI_RETRY_BASE_DELAY: float = 1.0  # базовая пауза перед повтором, секунд
+    AI_BREAKER_THRESHOLD: int = 5  # сбоев подряд до приостановки запросов к Gemini
+    AI_BREAKER_COOLDOWN: float = 60.0  # на сколько секунд приостанавливать запросы
+    AI_DEDUP_LOCK_TTL: int = 120  # срок блокировки одинакового запроса между репликами, секунд
+    AI_DEDUP_RESULT_TTL: int = 15  # сколько секунд отдавать готовый ответ на тот же промпт
+    MEAL_PLAN_WEEKLY_MODE: str = "single"  # single - неделя одним запросом, concurrent - дни параллельно
+    MEAL_PLAN_POOL_SIZE: int = 30  # планов на день в кэше для группы похожих профилей
+    MEAL_PLAN_POOL_MIN: int = 10  # с какого размера пула планы берутся из кэша без AI
+    MEAL_PLAN_CACHE_TTL: int = 7 * 24 * 3600  # секунд хранения пула без обращений
     
     # ========== НОВОЕ: File Storage ==========
     UPLOAD_DIR: str = "/app/uploads"
@@ -48,6 +63,38 @@ class Settings(BaseSettings):
     SUBSCRIPTION_YEARLY_PRICE: int = 1999
     DEBUG: bool = False
     
+    # Исходящие сообщения (лимиты Telegram)
+    MESSAGE_RATE_LIMIT: float = 30.0  # сообщений в секунду на весь бот
+    MESSAGE_PER_CHAT_INTERVAL: float = 1.0  # секунд между сообщениями в один чат
+    MESSAGE_MAX_CONCURRENCY: int = 20
+    MESSAGE_MAX_RETRIES: int = 3
+    
+    # Рендеринг графиков в отдельных процессах
+    CHART_RENDER_WORKERS: int = 2
+    CHART_RENDER_QUEUE_SIZE: int = 16  # задач сверх числа воркеров
+    CHART_RENDER_TIMEOUT: float = 30.0  # секунд на один график
+    CHART_RENDER_STUCK_TIMEOUT: float = 120.0  # секунд после таймаута, после которых зависший пул пересоздается
+    CHART_CACHE_TTL: int = 3600  # секунд хранения готового PNG
+    CHART_RENDER_WARMUP: bool = False  # поднять воркеры и загрузить matplotlib при старте
+    PRELOAD_MODULES: str = ""  # модули через запятую для загрузки при старте (по умолчанию - при первом использовании)
+    
+    # Ежедневная синхронизация фитнес-трекеров
+    FITNESS_SYNC_CONCURRENCY: int = 20  # одновременно синхронизируемых пользователей
+    FITNESS_SYNC_JITTER: float = 5.0  # случайная задержка перед пользователем, секунд
+    FITNESS_SYNC_WINDOW: float = 3600.0  # синхронизация должна уложиться в это время, секунд
+    GOOGLE_FIT_RATE_LIMIT: float = 10.0  # запросов в секунду к Google Fit API
+    TRACKER_SYNC_FULL_INTERVAL_DAYS: int = 7  # как часто перезапрашивать все окно синхронизации
+    
+    # HTTP-клиенты внешних интеграций
+    INTEGRATION_HTTP_LIMIT: int = 100  # соединений в пуле на провайдера
+    INTEGRATION_HTTP_LIMIT_PER_HOST: int = 20
+    INTEGRATION_HTTP_TIMEOUT: float = 15.0  # секунд на запрос
+    INTEGRATION_HTTP_DNS_TTL: int = 300  # секунд кэширования DNS
+    TOKEN_ENCRYPTION_KEY: Optional[str] = None  # ключ Fernet для токенов трекеров в БД
+    TOKEN_REFRESH_AHEAD: int = 300  # за сколько секунд до истечения обновлять access token
+    TOKEN_CACHE_IDLE_TTL: int = 1800  # через сколько секунд без обращений токены убираются из кэша
+    TOKEN_REFRESH_CONCURRENCY: int = 5  # одновременных фоновых обновлений токенов
+    
     
     class Config:
         env_file = ".env"
@@ -1,5 +1,5 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, BufferedInputFile
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from datetime import datetime
 import logging
@@ -7,9 +7,8 @@ import os
 
 from database.models import User
 from database.connection import get_session
-from bot.services.analytics_service import AnalyticsService
-from bot.services.plateau_adaptation import PlateauAdaptationService
-from bot.services.motivation_service import MotivationService
+from bot.services.registry import ServiceRegistry
+from bot.services.file_registry import file_registry
 from sqlalchemy import select
 
 router = Router()
@@ -48,7 +47,7 @@ async def analytics_menu(message: Message):
 
 # ============ ПОЛНЫЙ ОТЧЕТ ============
 @router.callback_query(F.data == "full_report")
-async def generate_full_report(callback: CallbackQuery):
+async def generate_full_report(callback: CallbackQuery, services: ServiceRegistry):
     """Генерирует полный отчет с графиками"""
     await callback.answer("Генерирую отчет...")
     
@@ -63,15 +62,14 @@ async def generate_full_report(callback: CallbackQuery):
             return
         
         # Генерируем отчет
-        analytics_service = AnalyticsService()
+        analytics_service = services.analytics
         try:
             report_data = await analytics_service.generate_comprehensive_report(user.id)
             
             if report_data:
                 # Отправляем график как фото
-                photo_file = BufferedInputFile(report_data, filename="report.png")
-                await callback.message.answer_photo(
-                    photo=photo_file,
+                await file_registry.send_photo(
+                    callback.message, report_data, "report.png",
                     caption="📊 **Ваш комплексный отчет готов!**\n\n"
                            "Отчет включает:\n"
                            "• График веса с прогнозом\n"
@@ -93,11 +91,11 @@ async def generate_full_report(callback: CallbackQuery):
 
 # ============ ПРОВЕРКА ПЛАТО ============
 @router.callback_query(F.data == "check_plateau")
-async def check_plateau(callback: CallbackQuery):
+async def check_plateau(callback: CallbackQuery, services: ServiceRegistry):
     """Проверяет наличие плато"""
     await callback.answer("Анализирую данные...")
     
-    plateau_service = PlateauAdaptationService()
+    plateau_service = services.plateau
     result = await plateau_service.check_and_adapt(callback.from_user.id)
     
     if not result['success']:
@@ -149,11 +147,11 @@ async def check_plateau(callback: CallbackQuery):
 
 # ============ ПЛАН ПРОРЫВА ПЛАТО ============
 @router.callback_query(F.data == "breakthrough_plan")
-async def breakthrough_plan(callback: CallbackQuery):
+async def breakthrough_plan(callback: CallbackQuery, services: ServiceRegistry):
     """Генерирует план прорыва плато"""
     await callback.answer("Создаю план прорыва...")
     
-    plateau_service = PlateauAdaptationService()
+    plateau_service = services.plateau
     plan = await plateau_service.generate_breakthrough_plan(callback.from_user.id)
     
     if plan['success']:
@@ -193,11 +191,11 @@ async def breakthrough_plan(callback: CallbackQuery):
 
 # ============ МОТИВАЦИЯ ============
 @router.callback_query(F.data == "daily_motivation")
-async def daily_motivation(callback: CallbackQuery):
+async def daily_motivation(callback: CallbackQuery, services: ServiceRegistry):
     """Показывает мотивацию дня"""
     await callback.answer()
     
-    motivation_service = MotivationService()
+    motivation_service = services.motivation
     motivation = await motivation_service.get_daily_motivation(callback.from_user.id)
     
     if motivation['success']:
@@ -227,11 +225,11 @@ async def daily_motivation(callback: CallbackQuery):
 
 # ============ НЕДЕЛЬНЫЙ ОТЧЕТ ============
 @router.callback_query(F.data == "weekly_report")
-async def weekly_report(callback: CallbackQuery):
+async def weekly_report(callback: CallbackQuery, services: ServiceRegistry):
     """Генерирует недельный отчет"""
     await callback.answer("Готовлю отчет...")
     
-    motivation_service = MotivationService()
+    motivation_service = services.motivation
     
     async with get_session() as session:
         result = await session.execute(
@@ -247,11 +245,11 @@ async def weekly_report(callback: CallbackQuery):
 
 # ============ АДАПТАЦИЯ ПЛАНА ============
 @router.callback_query(F.data == "adapt_plan")
-async def adapt_plan(callback: CallbackQuery):
+async def adapt_plan(callback: CallbackQuery, services: ServiceRegistry):
     """Адаптирует план питания и тренировок"""
     await callback.answer("Анализирую и адаптирую...")
     
-    plateau_service = PlateauAdaptationService()
+    plateau_service = services.plateau
     
     # Проверяем, нужен ли диетический перерыв
     needs_break = await plateau_service.suggest_diet_break(callback.from_user.id)
@@ -389,15 +387,12 @@ async def continue_plan(callback: CallbackQuery):
 
 # ============ СКАЧИВАНИЕ PDF ПЛАНА ПРОРЫВА ============
 @router.callback_query(F.data == "download_breakthrough")
-async def download_breakthrough_pdf(callback: CallbackQuery):
+async def download_breakthrough_pdf(callback: CallbackQuery, services: ServiceRegistry):
     """Скачивает PDF с планом прорыва плато"""
     await callback.answer("Генерирую PDF...")
     
-    from bot.services.pdf_generator import PDFGenerator
-    from aiogram.types import FSInputFile
-    
-    plateau_service = PlateauAdaptationService()
-    pdf_generator = PDFGenerator()
+    plateau_service = services.plateau
+    pdf_generator = services.pdf
     
     async with get_session() as session:
         result = await session.execute(
@@ -414,9 +409,9 @@ async def download_breakthrough_pdf(callback: CallbackQuery):
                 pdf_path = await pdf_generator.generate_breakthrough_pdf(user, breakthrough_plan['plan'])
                 
                 # Отправляем файл
-                pdf_file = FSInputFile(pdf_path, filename=f"breakthrough_plan_{datetime.now().strftime('%Y%m%d')}.pdf")
-                await callback.message.answer_document(
-                    pdf_file,
+                await file_registry.send_document(
+                    callback.message, pdf_path,
+                    f"breakthrough_plan_{datetime.now().strftime('%Y%m%d')}.pdf",
                     caption="📄 **План прорыва плато на 7 дней**\n\n"
                            "Следуйте этому плану для преодоления застоя.\n"
                            "Включает:\n"
@@ -468,11 +463,11 @@ async def start_breakthrough(callback: CallbackQuery):
 
 # ============ НОВЫЙ ЧЕЛЛЕНДЖ ============
 @router.callback_query(F.data == "new_challenge")
-async def new_challenge(callback: CallbackQuery):
+async def new_challenge(callback: CallbackQuery, services: ServiceRegistry):
     """Предлагает новый челлендж"""
     await callback.answer()
     
-    motivation_service = MotivationService()
+    motivation_service = services.motivation
     challenge = await motivation_service._get_active_challenge(callback.from_user.id)
     
     if challenge:
@@ -511,11 +506,11 @@ async def accept_challenge(callback: CallbackQuery):
 
 # ============ МОИ ДОСТИЖЕНИЯ ============
 @router.callback_query(F.data == "my_achievements")
-async def my_achievements(callback: CallbackQuery):
+async def my_achievements(callback: CallbackQuery, services: ServiceRegistry):
     """Показывает достижения пользователя"""
     await callback.answer()
     
-    motivation_service = MotivationService()
+    motivation_service = services.motivation
     
     async with get_session() as session:
         result = await session.execute(
@@ -562,7 +557,7 @@ async def my_achievements(callback: CallbackQuery):
             
 # ============ РЕКОМЕНДАЦИИ ============
 @router.callback_query(F.data == "get_recommendations")
-async def get_recommendations(callback: CallbackQuery):
+async def get_recommendations(callback: CallbackQuery, services: ServiceRegistry):
     """Показывает персональные рекомендации"""
     await callback.answer("Анализирую данные...")
     
@@ -576,7 +571,7 @@ async def get_recommendations(callback: CallbackQuery):
             await callback.message.answer("❌ Пользователь не найден")
             return
         
-        analytics_service = AnalyticsService()
+        analytics_service = services.analytics
         analysis = await analytics_service.analyze_user_progress(user.id)
         
         text = "💡 **Персональные рекомендации**\n\n"
@@ -609,8 +604,8 @@ async def back_to_analytics(callback: CallbackQuery):
     await analytics_menu(callback.message)
 
 @router.callback_query(F.data == "plateau_tips")
-async def plateau_tips(callback: CallbackQuery):
+async def plateau_tips(callback: CallbackQuery, services: ServiceRegistry):
     """Показывает советы при плато"""
-    motivation_service = MotivationService()
+    motivation_service = services.motivation
     tips = await motivation_service.get_plateau_motivation(callback.from_user.id)
     await callback.message.answer(tips, parse_mode="Markdown")
\ No newline at end of file
@@ -9,14 +9,31 @@ import os
 
 from database.models import User, CheckIn, MealPlan
 from database.connection import get_session
+from database.checkins import upsert_checkin
 from bot.states.checkin import MorningCheckInStates, EveningCheckInStates, FoodPhotoStates
 from bot.keyboards.checkin import get_mood_keyboard, get_meal_type_keyboard, get_water_keyboard, get_quick_weight_keyboard
 from bot.services.ai_service import AIService
+from bot.services.water_buffer import water_buffer
+from bot.services.registry import ServiceRegistry
 from bot.config import settings
+from bot.utils.timezone import user_local_date
 
 router = Router()
 logger = logging.getLogger(__name__)
 
+
+async def get_today_checkin(session, user: User, today: date):
+    """Чек-ин за текущий день пользователя (поиск по индексу user_id + local_date)"""
+    result = await session.execute(
+        select(CheckIn).where(
+            and_(
+                CheckIn.user_id == user.id,
+                CheckIn.local_date == today
+            )
+        )
+    )
+    return result.scalar_one_or_none()
+
 # ============ КОМАНДА СТАРТА ЧЕК-ИНА ============
 @router.message(Command("checkin"))
 async def checkin_menu(message: Message):
@@ -146,25 +163,12 @@ async def process_mood(message: Message, state: FSMContext):
             await state.clear()
             return
         
-        today = date.today()
-        result = await session.execute(
-            select(CheckIn).where(
-                and_(
-                    CheckIn.user_id == user.id,
-                    CheckIn.date >= datetime.combine(today, datetime.min.time()),
-                    CheckIn.date <= datetime.combine(today, datetime.max.time())
-                )
-            )
+        await upsert_checkin(
+            session, user.id, user_local_date(user.timezone),
+            weight=data.get('weight'),
+            sleep_hours=data.get('sleep_hours'),
+            mood=mood
         )
-        checkin = result.scalar_one_or_none()
-        
-        if not checkin:
-            checkin = CheckIn(user_id=user.id)
-            session.add(checkin)
-        
-        checkin.weight = data.get('weight')
-        checkin.sleep_hours = data.get('sleep_hours')
-        checkin.mood = mood
         
         await session.commit()
     
@@ -274,27 +278,17 @@ async def process_notes(message: Message, state: FSMContext):
         )
         user = result.scalar_one_or_none()
         
-        today = date.today()
-        result = await session.execute(
-            select(CheckIn).where(
-                and_(
-                    CheckIn.user_id == user.id,
-                    CheckIn.date >= datetime.combine(today, datetime.min.time()),
-                    CheckIn.date <= datetime.combine(today, datetime.max.time())
-                )
+        today = user_local_date(user.timezone)
+        # Итог воды перезаписывается - буферизованные приращения за день отбрасываются
+        async with water_buffer.overwrite(user.id, today):
+            await upsert_checkin(
+                session, user.id, today,
+                steps=data.get('steps'),
+                water_ml=data.get('water_ml'),
+                notes=notes
             )
-        )
-        checkin = result.scalar_one_or_none()
-        
-        if not checkin:
-            checkin = CheckIn(user_id=user.id)
-            session.add(checkin)
-        
-        checkin.steps = data.get('steps')
-        checkin.water_ml = data.get('water_ml')
-        checkin.notes = notes
-        
-        await session.commit()
+            
+            await session.commit()
     
     response = "✅ **Вечерний чек-ин сохранен!**\n\n"
     response += "📊 **Итоги дня:**\n"
@@ -361,7 +355,7 @@ async def process_meal_type(message: Message, state: FSMContext):
     await state.set_state(FoodPhotoStates.photo)
 
 @router.message(FoodPhotoStates.photo, F.photo)
-async def process_food_photo(message: Message, state: FSMContext):
+async def process_food_photo(message: Message, state: FSMContext, services: ServiceRegistry):
     """Обработка фото еды с детальным анализом"""
     data = await state.get_data()
     
@@ -388,8 +382,7 @@ async def process_food_photo(message: Message, state: FSMContext):
     await message.answer("🤖 Анализирую фото... Это займет несколько секунд")
     
     # Используем улучшенный Vision Service
-    from bot.services.vision_service import VisionService
-    vision_service = VisionService()
+    vision_service = services.vision
     
     async with get_session() as session:
         result = await session.execute(
@@ -407,7 +400,7 @@ async def process_food_photo(message: Message, state: FSMContext):
             )
         
         # Получаем план питания для сравнения
-        today = date.today()
+        today = user_local_date(user.timezone)
         current_week = datetime.utcnow().isocalendar()[1]
         day_number = datetime.utcnow().weekday() + 1
         
@@ -430,35 +423,15 @@ async def process_food_photo(message: Message, state: FSMContext):
                 # ИСПРАВЛЕНИЕ: Передаем результат анализа (analysis), а не путь к файлу
                 comparison = await vision_service.compare_with_plan(analysis, planned_meal)
         
-        # Сохраняем чек-ин
-        result = await session.execute(
-            select(CheckIn).where(
-                and_(
-                    CheckIn.user_id == user.id,
-                    CheckIn.date >= datetime.combine(today, datetime.min.time()),
-                    CheckIn.date <= datetime.combine(today, datetime.max.time())
-                )
-            )
+        # Сохраняем путь к фото и данные анализа в чек-ин
+        meal_field = data['meal_type'] if data['meal_type'] in ('breakfast', 'lunch', 'dinner') else 'snack'
+        await upsert_checkin(
+            session, user.id, today,
+            **{
+                f"{meal_field}_photo": filepath,
+                f"{meal_field}_analysis": analysis if analysis.get('success') else None
+            }
         )
-        checkin = result.scalar_one_or_none()
-        
-        if not checkin:
-            checkin = CheckIn(user_id=user.id)
-            session.add(checkin)
-        
-        # Сохраняем путь к фото и данные анализа
-        if data['meal_type'] == 'breakfast':
-            checkin.breakfast_photo = filepath
-            checkin.breakfast_analysis = analysis if analysis.get('success') else None
-        elif data['meal_type'] == 'lunch':
-            checkin.lunch_photo = filepath
-            checkin.lunch_analysis = analysis if analysis.get('success') else None
-        elif data['meal_type'] == 'dinner':
-            checkin.dinner_photo = filepath
-            checkin.dinner_analysis = analysis if analysis.get('success') else None
-        else:
-            checkin.snack_photo = filepath
-            checkin.snack_analysis = analysis if analysis.get('success') else None
         
         await session.commit()
     
@@ -536,19 +509,10 @@ async def quick_water(callback: CallbackQuery):
         )
         user = result.scalar_one_or_none()
         
-        today = date.today()
-        result = await session.execute(
-            select(CheckIn).where(
-                and_(
-                    CheckIn.user_id == user.id,
-                    CheckIn.date >= datetime.combine(today, datetime.min.time()),
-                    CheckIn.date <= datetime.combine(today, datetime.max.time())
-                )
-            )
-        )
-        checkin = result.scalar_one_or_none()
-        
-        current_water = checkin.water_ml if checkin and checkin.water_ml else 0
+        today = user_local_date(user.timezone)
+        checkin = await get_today_checkin(session, user, today)
+    
+    current_water = await water_buffer.get_total(user.id, today, checkin.water_ml if checkin else 0)
     
     await callback.message.edit_text(
         f"💧 **Трекер воды**\n\n"
@@ -563,32 +527,15 @@ async def add_water(callback: CallbackQuery):
     """Добавление воды"""
     amount = int(callback.data.split("_")[2])
     
-    async with get_session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = result.scalar_one_or_none()
-        
-        today = date.today()
-        result = await session.execute(
-            select(CheckIn).where(
-                and_(
-                    CheckIn.user_id == user.id,
-                    CheckIn.date >= datetime.combine(today, datetime.min.time()),
-                    CheckIn.date <= datetime.combine(today, datetime.max.time())
-                )
-            )
-        )
-        checkin = result.scalar_one_or_none()
-        
-        if not checkin:
-            checkin = CheckIn(user_id=user.id, water_ml=0)
-            session.add(checkin)
-        
-        checkin.water_ml = (checkin.water_ml or 0) + amount
-        await session.commit()
-        
-        total_water = checkin.water_ml
+    # Нажатия идут сериями, поэтому запись в БД откладывается и
+    # объединяется буфером, а ответ строится по буферизованному итогу
+    user_ref = await water_buffer.resolve_user(callback.from_user.id)
+    if not user_ref:
+        await callback.answer("Пользователь не найден. Используйте /start", show_alert=True)
+        return
+    
+    user_id, timezone = user_ref
+    total_water = await water_buffer.add(user_id, user_local_date(timezone), amount)
     
     await callback.answer(f"✅ Добавлено {amount}мл воды!")
     
@@ -622,17 +569,14 @@ async def show_today_progress(callback: CallbackQuery):
         )
         user = result.scalar_one_or_none()
         
-        today = date.today()
-        result = await session.execute(
-            select(CheckIn).where(
-                and_(
-                    CheckIn.user_id == user.id,
-                    CheckIn.date >= datetime.combine(today, datetime.min.time()),
-                    CheckIn.date <= datetime.combine(today, datetime.max.time())
-                )
-            )
-        )
-        checkin = result.scalar_one_or_none()
+        today = user_local_date(user.timezone)
+        checkin = await get_today_checkin(session, user, today)
+    
+    # Вода читается через буфер: последние нажатия могут быть еще не записаны
+    water_total = await water_buffer.get_total(user.id, today, checkin.water_ml if checkin else 0)
+    
+    if not checkin and water_total:
+        checkin = CheckIn(user_id=user.id, local_date=today)
     
     if not checkin:
         await callback.message.answer(
@@ -658,7 +602,7 @@ async def show_today_progress(callback: CallbackQuery):
     
     response += "**📈 Активность:**\n"
     response += f"• Шаги: {checkin.steps:,} / 8,000 🎯\n" if checkin.steps else "• Шаги: не записано\n"
-    response += f"• Вода: {checkin.water_ml/1000:.1f}л / 2л 💧\n" if checkin.water_ml else "• Вода: не записано\n"
+    response += f"• Вода: {water_total/1000:.1f}л / 2л 💧\n" if water_total else "• Вода: не записано\n"
     response += "\n"
     
     response += "**🍽 Питание:**\n"
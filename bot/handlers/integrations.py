@@ -11,8 +11,8 @@ import re # Добавлен импорт
 
 from database.models import User
 from database.connection import get_session
-from bot.services.fitness_tracker_integration import FitnessIntegrationService
-from bot.services.smart_reminder import SmartReminderService
+from bot.services.registry import ServiceRegistry
+from bot.services.smart_reminder import reschedule_user_reminders
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -156,11 +156,11 @@ async def connect_google_fit(callback: CallbackQuery, state: FSMContext):
     # await state.set_state(SettingsStates.google_fit_auth)
 
 @router.callback_query(F.data == "sync_google_fit")
-async def sync_google_fit(callback: CallbackQuery):
+async def sync_google_fit(callback: CallbackQuery, services: ServiceRegistry):
     """Синхронизация данных из Google Fit"""
     await callback.answer("Синхронизация...")
     
-    integration_service = FitnessIntegrationService()
+    integration_service = services.fitness
     success = await integration_service.sync_all(callback.from_user.id)
     
     if success.get("google_fit"):
@@ -178,11 +178,11 @@ async def sync_google_fit(callback: CallbackQuery):
         )
 
 @router.callback_query(F.data == "sync_all")
-async def sync_all_services(callback: CallbackQuery):
+async def sync_all_services(callback: CallbackQuery, services: ServiceRegistry):
     """Синхронизация всех подключенных сервисов"""
     await callback.answer("Синхронизация всех сервисов...")
     
-    integration_service = FitnessIntegrationService()
+    integration_service = services.fitness
     results = await integration_service.sync_all(callback.from_user.id)
     
     if any(results.values()):
@@ -266,6 +266,7 @@ async def save_timezone(callback: CallbackQuery):
         user = await session.scalar(select(User).where(User.telegram_id == callback.from_user.id))
         if user:
             user.timezone = timezone
+            await reschedule_user_reminders(session, user)
             await session.commit()
     await callback.answer(f"✅ Часовой пояс установлен: {timezone}")
     await _display_reminder_settings(callback)
@@ -300,6 +301,7 @@ async def save_morning_time(message: Message, state: FSMContext):
                 user.reminder_settings = user.reminder_settings or {}
                 user.reminder_settings["morning_time"] = time_str
                 flag_modified(user, "reminder_settings")
+                await reschedule_user_reminders(session, user)
                 await session.commit()
         await message.answer(f"✅ Утреннее напоминание установлено на {time_str}")
         await state.clear()
@@ -340,6 +342,7 @@ async def save_evening_time(message: Message, state: FSMContext):
                 user.reminder_settings = user.reminder_settings or {}
                 user.reminder_settings["evening_time"] = time_str
                 flag_modified(user, "reminder_settings")
+                await reschedule_user_reminders(session, user)
                 await session.commit()
         await message.answer(f"✅ Вечернее напоминание установлено на {time_str}")
         await state.clear()
@@ -384,6 +387,7 @@ async def toggle_water_reminders(callback: CallbackQuery):
             current_status = user.reminder_settings.get("water_reminders", True)
             user.reminder_settings["water_reminders"] = not current_status
             flag_modified(user, "reminder_settings")
+            await reschedule_user_reminders(session, user)
             await session.commit()
             await callback.answer(f"💧 Напоминания о воде {'выключены' if current_status else 'включены'}")
     await _display_reminder_settings(callback)
@@ -408,6 +412,7 @@ async def confirm_disable_all_reminders(callback: CallbackQuery):
             user.reminder_settings = user.reminder_settings or {}
             user.reminder_settings["all_disabled"] = True
             flag_modified(user, "reminder_settings")
+            await reschedule_user_reminders(session, user)
             await session.commit()
     await callback.answer("🔕 Все напоминания отключены", show_alert=True)
     await _display_reminder_settings(callback)
@@ -420,6 +425,7 @@ async def enable_all_reminders(callback: CallbackQuery):
             user.reminder_settings = user.reminder_settings or {}
             user.reminder_settings["all_disabled"] = False
             flag_modified(user, "reminder_settings")
+            await reschedule_user_reminders(session, user)
             await session.commit()
     await callback.answer("✅ Все напоминания включены", show_alert=True)
     await _display_reminder_settings(callback)
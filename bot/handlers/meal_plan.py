@@ -1,5 +1,5 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from datetime import datetime, timedelta
 from sqlalchemy import select
@@ -7,8 +7,8 @@ import json
 
 from database.models import User, MealPlan, Goal
 from database.connection import get_session
-from bot.services.meal_generator import MealPlanGenerator 
-from bot.services.pdf_generator import PDFGenerator
+from bot.services.registry import ServiceRegistry
+from bot.services.file_registry import file_registry
 from bot.services.ai_service import AIService
 from bot.keyboards.meal import get_meal_keyboard, get_day_keyboard
 import os
@@ -18,7 +18,7 @@ router = Router()
 logger = logging.getLogger(__name__)
 
 @router.message(Command("meal_plan"))
-async def show_meal_plan(message: Message):
+async def show_meal_plan(message: Message, services: ServiceRegistry):
     """Показать план питания на неделю"""
     async with get_session() as session:
         # Получаем пользователя
@@ -50,7 +50,7 @@ async def show_meal_plan(message: Message):
             # ========== НОВЫЙ КОД: Генерация плана через AI ==========
             await message.answer("🔄 Генерирую персональный план питания...")
             
-            generator = MealPlanGenerator()
+            generator = services.meal_generator
             try:
                 # Генерируем план на неделю
                 weekly_plan = await generator.generate_weekly_plan(user)
@@ -184,7 +184,7 @@ async def navigate_days(callback: CallbackQuery):
 
 # ========== НОВЫЙ КОД: Замена блюда ==========
 @router.callback_query(F.data.startswith("replace_"))
-async def replace_meal(callback: CallbackQuery):
+async def replace_meal(callback: CallbackQuery, services: ServiceRegistry):
     """Замена блюда в плане"""
     _, meal_type, day_num, week_num = callback.data.split("_")
     
@@ -207,7 +207,7 @@ async def replace_meal(callback: CallbackQuery):
         meal_plan = result.scalar_one_or_none()
         
         # Генерируем замену через AI
-        generator = MealPlanGenerator()
+        generator = services.meal_generator
         new_meal = await generator.generate_meal_replacement(
             user, meal_type, meal_plan
         )
@@ -234,7 +234,7 @@ async def replace_meal(callback: CallbackQuery):
 # ========== НОВЫЙ КОД: Список покупок ==========
 @router.callback_query(F.data == "shopping_list")
 @router.callback_query(F.data == "shopping_list")
-async def show_shopping_list(callback: CallbackQuery):
+async def show_shopping_list(callback: CallbackQuery, services: ServiceRegistry):
     """Показать список покупок на неделю"""
     await callback.answer()
     
@@ -258,7 +258,7 @@ async def show_shopping_list(callback: CallbackQuery):
             await callback.message.answer("❌ План питания на эту неделю еще не создан.")
             return
 
-        generator = PDFGenerator()
+        generator = services.pdf
         # ========== УБЕДИТЕСЬ, ЧТО ЗДЕСЬ ЕСТЬ AWAIT ==========
         shopping_list_categorized = await generator._generate_shopping_list(meal_plans)
         # ======================================================
@@ -294,7 +294,7 @@ async def show_shopping_list(callback: CallbackQuery):
 
 # ========== НОВЫЙ ОБРАБОТЧИК: ЭКСПОРТ В PDF ==========
 @router.callback_query(F.data == "export_shopping_pdf")
-async def export_shopping_pdf(callback: CallbackQuery):
+async def export_shopping_pdf(callback: CallbackQuery, services: ServiceRegistry):
     """Экспорт списка покупок в PDF"""
     await callback.answer("📄 Генерирую PDF...")
     
@@ -321,14 +321,13 @@ async def export_shopping_pdf(callback: CallbackQuery):
             return
         
         # Генерируем PDF
-        pdf_generator = PDFGenerator()
+        pdf_generator = services.pdf
         try:
             pdf_path = await pdf_generator.generate_shopping_list_pdf(user, meal_plans)
             
             # Отправляем файл
-            pdf_file = FSInputFile(pdf_path, filename=f"shopping_list_{current_week}.pdf")
-            await callback.message.answer_document(
-                pdf_file,
+            await file_registry.send_document(
+                callback.message, pdf_path, f"shopping_list_{current_week}.pdf",
                 caption="📄 Ваш список покупок на неделю\n\n"
                        "Можете распечатать и взять с собой в магазин!"
             )
@@ -344,7 +343,7 @@ async def export_shopping_pdf(callback: CallbackQuery):
 
 # ========== НОВЫЙ ОБРАБОТЧИК: ЭКСПОРТ ПЛАНА В PDF ==========
 @router.callback_query(F.data == "export_plan_pdf")
-async def export_plan_pdf(callback: CallbackQuery):
+async def export_plan_pdf(callback: CallbackQuery, services: ServiceRegistry):
     """Экспорт полного плана питания в PDF"""
     await callback.answer("📄 Генерирую PDF с планом питания...")
     
@@ -371,14 +370,13 @@ async def export_plan_pdf(callback: CallbackQuery):
             return
         
         # Генерируем PDF
-        pdf_generator = PDFGenerator()
+        pdf_generator = services.pdf
         try:
             pdf_path = await pdf_generator.generate_meal_plan_pdf(user, meal_plans)
             
             # Отправляем файл
-            pdf_file = FSInputFile(pdf_path, filename=f"meal_plan_week_{current_week}.pdf")
-            await callback.message.answer_document(
-                pdf_file,
+            await file_registry.send_document(
+                callback.message, pdf_path, f"meal_plan_week_{current_week}.pdf",
                 caption="📄 Ваш план питания на неделю\n\n"
                        "✅ Все блюда с калориями и БЖУ\n"
                        "✅ Список покупок в конце документа\n"
@@ -414,7 +412,7 @@ async def regenerate_plan(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "confirm_regenerate")
-async def confirm_regenerate(callback: CallbackQuery):
+async def confirm_regenerate(callback: CallbackQuery, services: ServiceRegistry):
     """Подтверждение регенерации плана"""
     await callback.answer("🔄 Генерирую новый план...")
     await callback.message.edit_text("🔄 Генерирую новый план питания...\nЭто может занять несколько секунд...")
@@ -439,7 +437,7 @@ async def confirm_regenerate(callback: CallbackQuery):
             plan.is_active = False
         
         # Генерируем новый план
-        generator = MealPlanGenerator()
+        generator = services.meal_generator
         try:
             weekly_plan = await generator.generate_weekly_plan(user)
             
@@ -493,7 +491,7 @@ async def start_checkin_from_meal(callback: CallbackQuery):
 
 # ========== ЭТАП 3: ОБРАБОТЧИК ДЛЯ ВОЗВРАТА К ПЛАНУ ==========
 @router.callback_query(F.data == "back_to_plan")
-async def back_to_plan(callback: CallbackQuery):
+async def back_to_plan(callback: CallbackQuery, services: ServiceRegistry):
     """Возврат к плану питания"""
     await callback.answer()
-    await show_meal_plan(callback.message)
\ No newline at end of file
+    await show_meal_plan(callback.message, services)
\ No newline at end of file
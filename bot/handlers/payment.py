@@ -12,7 +12,7 @@ import logging
 
 from database.models import User, SubscriptionPlan, PromoType
 from database.connection import get_session
-from bot.services.payment_service import PaymentService
+from bot.services.registry import ServiceRegistry
 
 router = Router()
 logger = logging.getLogger(__name__)
@@ -24,10 +24,10 @@ class PromoCodeStates(StatesGroup):
 
 # ============ КОМАНДА ПОДПИСКИ ============
 @router.message(Command("subscription"))
-async def subscription_menu(message: Message):
+async def subscription_menu(message: Message, services: ServiceRegistry):
     """Главное меню подписки"""
     # Получаем сервис платежей
-    payment_service = PaymentService(message.bot)
+    payment_service = services.payments
     
     # Проверяем статус подписки
     status = await payment_service.check_subscription_status(message.from_user.id)
@@ -171,7 +171,7 @@ async def show_subscription_plans(callback: CallbackQuery, state: FSMContext):
 
 # ============ ПОКУПКА ПОДПИСКИ ============
 @router.callback_query(F.data.startswith("buy_"))
-async def process_subscription_purchase(callback: CallbackQuery, state: FSMContext):
+async def process_subscription_purchase(callback: CallbackQuery, state: FSMContext, services: ServiceRegistry):
     """Обработка покупки подписки"""
     plan_type = callback.data.replace("buy_", "")
     
@@ -194,7 +194,7 @@ async def process_subscription_purchase(callback: CallbackQuery, state: FSMConte
     promo_code = data.get("promo_code")
     
     # Создаем инвойс
-    payment_service = PaymentService(callback.bot)
+    payment_service = services.payments
     invoice_link = await payment_service.create_invoice(
         user_id=callback.from_user.id,
         plan=plan,
@@ -217,15 +217,15 @@ async def process_subscription_purchase(callback: CallbackQuery, state: FSMConte
 
 # ============ ОБРАБОТКА ПЛАТЕЖЕЙ ============
 @router.pre_checkout_query()
-async def process_pre_checkout_query(pre_checkout_query: PreCheckoutQuery):
+async def process_pre_checkout_query(pre_checkout_query: PreCheckoutQuery, services: ServiceRegistry):
     """Обработка pre-checkout запроса"""
-    payment_service = PaymentService(pre_checkout_query.bot)
+    payment_service = services.payments
     await payment_service.process_pre_checkout(pre_checkout_query)
 
 @router.message(F.content_type == ContentType.SUCCESSFUL_PAYMENT)
-async def process_successful_payment(message: Message):
+async def process_successful_payment(message: Message, services: ServiceRegistry):
     """Обработка успешного платежа"""
-    payment_service = PaymentService(message.bot)
+    payment_service = services.payments
     
     success = await payment_service.process_successful_payment(
         message=message,
@@ -255,12 +255,12 @@ async def enter_promo_code(callback: CallbackQuery, state: FSMContext):
     await state.set_state(PromoCodeStates.entering_code)
 
 @router.message(PromoCodeStates.entering_code)
-async def process_promo_code(message: Message, state: FSMContext):
+async def process_promo_code(message: Message, state: FSMContext, services: ServiceRegistry):
     """Обработка введенного промокода"""
     code = message.text.strip().upper()
     
     # Проверяем промокод
-    payment_service = PaymentService(message.bot)
+    payment_service = services.payments
     promo = await payment_service.validate_promo_code(
         code=code,
         user_id=message.from_user.id,
@@ -306,12 +306,12 @@ async def process_promo_code(message: Message, state: FSMContext):
 
 # ============ ПАРТНЕРСКАЯ ПРОГРАММА ============
 @router.callback_query(F.data == "partner_program")
-async def show_partner_program(callback: CallbackQuery):
+async def show_partner_program(callback: CallbackQuery, services: ServiceRegistry):
     """Показывает информацию о партнерской программе"""
     await callback.answer()
     
     # Проверяем, есть ли у пользователя партнерский код
-    payment_service = PaymentService(callback.bot)
+    payment_service = services.payments
     
     keyboard = InlineKeyboardMarkup(inline_keyboard=[
         [
@@ -342,11 +342,11 @@ async def show_partner_program(callback: CallbackQuery):
     await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.callback_query(F.data == "generate_partner_code")
-async def generate_partner_code(callback: CallbackQuery):
+async def generate_partner_code(callback: CallbackQuery, services: ServiceRegistry):
     """Генерирует партнерский промокод"""
     await callback.answer("Генерирую код...")
     
-    payment_service = PaymentService(callback.bot)
+    payment_service = services.payments
     code = await payment_service.generate_partner_promo_code(callback.from_user.id)
     
     if code:
@@ -364,11 +364,11 @@ async def generate_partner_code(callback: CallbackQuery):
 
 # ============ ИСТОРИЯ ПЛАТЕЖЕЙ ============
 @router.callback_query(F.data == "payment_history")
-async def show_payment_history(callback: CallbackQuery):
+async def show_payment_history(callback: CallbackQuery, services: ServiceRegistry):
     """Показывает историю платежей"""
     await callback.answer()
     
-    payment_service = PaymentService(callback.bot)
+    payment_service = services.payments
     payments = await payment_service.get_payment_history(callback.from_user.id)
     
     if not payments:
@@ -412,11 +412,11 @@ async def cancel_subscription(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "confirm_cancel_subscription")
-async def confirm_cancel_subscription(callback: CallbackQuery):
+async def confirm_cancel_subscription(callback: CallbackQuery, services: ServiceRegistry):
     """Подтверждение отмены подписки"""
     await callback.answer()
     
-    payment_service = PaymentService(callback.bot)
+    payment_service = services.payments
     success = await payment_service.cancel_subscription(callback.from_user.id)
     
     if success:
@@ -469,9 +469,9 @@ async def show_subscription_info(callback: CallbackQuery):
     await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="Markdown")
 
 @router.callback_query(F.data == "back_to_subscription")
-async def back_to_subscription(callback: CallbackQuery):
+async def back_to_subscription(callback: CallbackQuery, services: ServiceRegistry):
     """Возврат в меню подписки"""
-    await subscription_menu(callback.message)
+    await subscription_menu(callback.message, services)
 
 # ============ СМЕНА ВАЛЮТЫ ============
 @router.callback_query(F.data == "change_currency")
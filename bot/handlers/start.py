@@ -10,6 +10,7 @@ from bot.states.onboarding import OnboardingStates
 from database.models import User, Gender, Goal, ActivityLevel, MealStyle
 from database.connection import get_session
 from bot.utils.calculations import calculate_calories_and_macros
+from bot.services.smart_reminder import reschedule_user_reminders
 
 router = Router()
 
@@ -372,6 +373,10 @@ async def save_user_and_calculate(message: Message, state: FSMContext):
         user.trial_started_at = datetime.utcnow()
         user.is_premium = True
         
+        # Планируем напоминания (нужен user.id)
+        await session.flush()
+        await reschedule_user_reminders(session, user)
+        
         await session.commit()
     
     goal_text = {
@@ -417,6 +422,7 @@ async def reset_onboarding(message: Message, state: FSMContext):
         
         if user:
             user.onboarding_completed = False
+            await reschedule_user_reminders(session, user)
             await session.commit()
     
     await message.answer(
@@ -1,5 +1,5 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile, BufferedInputFile
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.filters import Command
 from datetime import datetime, timedelta
 from sqlalchemy import select, and_, func
@@ -8,7 +8,8 @@ import os
 
 from database.models import User, CheckIn
 from database.connection import get_session
-from bot.services.charts_service import ChartsService
+from bot.services.registry import ServiceRegistry
+from bot.services.file_registry import file_registry
 from bot.config import settings
 
 router = Router()
@@ -40,7 +41,7 @@ async def stats_menu(message: Message):
     )
 
 @router.callback_query(F.data == "chart_weight")
-async def show_weight_chart(callback: CallbackQuery):
+async def show_weight_chart(callback: CallbackQuery, services: ServiceRegistry):
     """Показать график веса"""
     await callback.answer("Генерирую график веса...")
     
@@ -55,7 +56,7 @@ async def show_weight_chart(callback: CallbackQuery):
             return
         
         # Генерируем график
-        charts_service = ChartsService()
+        charts_service = services.charts
         chart_data = await charts_service.generate_weight_chart(user.id, days=30)
         
         if not chart_data:
@@ -65,10 +66,9 @@ async def show_weight_chart(callback: CallbackQuery):
             )
             return
         
-        photo_file = BufferedInputFile(chart_data, filename="weight_chart.png")
         # Отправляем график
-        await callback.message.answer_photo(
-            photo=photo_file,
+        await file_registry.send_photo(
+            callback.message, chart_data, "weight_chart.png",
             caption="📊 **График изменения веса за 30 дней**\n\n"
                     "🔵 Синяя линия - ваш вес\n"
                     "🔴 Красная линия - целевой вес\n"
@@ -76,7 +76,7 @@ async def show_weight_chart(callback: CallbackQuery):
         )
 
 @router.callback_query(F.data == "chart_activity")
-async def show_activity_chart(callback: CallbackQuery):
+async def show_activity_chart(callback: CallbackQuery, services: ServiceRegistry):
     """Показать график активности"""
     await callback.answer("Генерирую график активности...")
     
@@ -86,7 +86,7 @@ async def show_activity_chart(callback: CallbackQuery):
         )
         user = result.scalar_one_or_none()
         
-        charts_service = ChartsService()
+        charts_service = services.charts
         chart_data = await charts_service.generate_activity_chart(user.id, days=7)
         
         if not chart_data:
@@ -96,9 +96,8 @@ async def show_activity_chart(callback: CallbackQuery):
             )
             return
         
-        photo_file = BufferedInputFile(chart_data, filename="activity_chart.png")
-        await callback.message.answer_photo(
-            photo=photo_file,
+        await file_registry.send_photo(
+            callback.message, chart_data, "activity_chart.png",
             caption="📊 **График активности за неделю**\n\n"
                     "📊 Столбцы - количество шагов\n"
                     "💧 Синие столбцы - потребление воды\n"
@@ -106,7 +105,7 @@ async def show_activity_chart(callback: CallbackQuery):
         )
 
 @router.callback_query(F.data == "chart_sleep")
-async def show_sleep_chart(callback: CallbackQuery):
+async def show_sleep_chart(callback: CallbackQuery, services: ServiceRegistry):
     """Показать график сна и настроения"""
     await callback.answer("Генерирую график сна...")
     
@@ -116,7 +115,7 @@ async def show_sleep_chart(callback: CallbackQuery):
         )
         user = result.scalar_one_or_none()
         
-        charts_service = ChartsService()
+        charts_service = services.charts
         chart_data = await charts_service.generate_sleep_chart(user.id, days=14)
         
         if not chart_data:
@@ -126,9 +125,8 @@ async def show_sleep_chart(callback: CallbackQuery):
             )
             return
         
-        photo_file = BufferedInputFile(chart_data, filename="sleep_chart.png")
-        await callback.message.answer_photo(
-            photo=photo_file,
+        await file_registry.send_photo(
+            callback.message, chart_data, "sleep_chart.png",
             caption="💤 **График сна и настроения за 2 недели**\n\n"
                     "📊 Верхний график - часы сна\n"
                     "😊 Нижний график - настроение\n"
@@ -136,7 +134,7 @@ async def show_sleep_chart(callback: CallbackQuery):
         )
 
 @router.callback_query(F.data == "chart_summary")
-async def show_summary_chart(callback: CallbackQuery):
+async def show_summary_chart(callback: CallbackQuery, services: ServiceRegistry):
     """Показать общую сводку"""
     await callback.answer("Генерирую общую сводку...")
     
@@ -146,7 +144,7 @@ async def show_summary_chart(callback: CallbackQuery):
         )
         user = result.scalar_one_or_none()
         
-        charts_service = ChartsService()
+        charts_service = services.charts
         chart_data = await charts_service.generate_progress_summary(user.id)
         
         if not chart_data:
@@ -156,9 +154,8 @@ async def show_summary_chart(callback: CallbackQuery):
             )
             return
         
-        photo_file = BufferedInputFile(chart_data, filename="summary_chart.png")
-        await callback.message.answer_photo(
-            photo=photo_file,
+        await file_registry.send_photo(
+            callback.message, chart_data, "summary_chart.png",
             caption="📊 **Общая сводка прогресса**\n\n"
                     "Все ключевые метрики в одном месте:\n"
                     "• Динамика веса\n"
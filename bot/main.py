@@ -1,5 +1,10 @@
 import asyncio
 import logging
+import time
+
+# Замер времени импорта модулей бота для отчета при старте
+_import_started = time.perf_counter()
+
 from aiogram import Bot, Dispatcher
 from aiogram.fsm.storage.redis import RedisStorage
 from redis.asyncio import Redis
@@ -7,9 +12,17 @@ from redis.asyncio import Redis
 from bot.config import settings
 from bot.handlers import start, profile, meal_plan, checkin, stats, integrations, payment, analytics, help
 from bot.services.smart_reminder import SmartReminderService
-from bot.services.fitness_tracker_integration import FitnessIntegrationService
+from bot.services.registry import ServiceRegistry
+from bot.services.fitness_sync import FitnessSyncJob
+from bot.services.message_sender import MessageSender
+from bot.services.water_buffer import water_buffer
+from bot.services.render_pool import render_pool
+from bot.services.model_client import model_client
 from database.connection import init_db
 from datetime import datetime, timedelta
+from bot.utils.lazy import import_report, warm_up
+
+_import_seconds = time.perf_counter() - _import_started
 
 # Настройка логирования
 logging.basicConfig(
@@ -20,25 +33,35 @@ logger = logging.getLogger(__name__)
 
 # Глобальные сервисы
 reminder_service = None
-fitness_service = None
+message_sender = None
 
-async def on_startup(bot: Bot):
+async def on_startup(bot: Bot, services: ServiceRegistry):
     """Действия при запуске бота"""
-    global reminder_service, fitness_service
+    global reminder_service
     
     logger.info("Запуск сервисов...")
+    log_import_report()
+    
+    # Предзагрузка тяжелых библиотек (по умолчанию они грузятся при первом использовании)
+    if settings.PRELOAD_MODULES:
+        warm_up(name.strip() for name in settings.PRELOAD_MODULES.split(",") if name.strip())
+    if settings.CHART_RENDER_WARMUP:
+        await render_pool.warm_up()
     
     # Инициализация БД
     await init_db()
     
     # Запуск сервиса умных напоминаний
-    reminder_service = SmartReminderService(bot)
+    reminder_service = SmartReminderService(bot, sender=message_sender)
     await reminder_service.start()
     logger.info("Сервис умных напоминаний запущен")
     
-    # Инициализация сервиса интеграций
-    fitness_service = FitnessIntegrationService()
-    await fitness_service.load_user_integrations()
+    # Буфер отложенной записи воды
+    await water_buffer.start()
+    
+    # Загрузка подключенных интеграций в общий сервис
+    await services.fitness.load_user_integrations()
+    await services.fitness.start()
     logger.info("Сервис интеграций инициализирован")
     
     # Устанавливаем команды бота
@@ -46,7 +69,14 @@ async def on_startup(bot: Bot):
     
     logger.info("Бот успешно запущен и готов к работе!")
 
-async def on_shutdown(bot: Bot):
+def log_import_report():
+    """Пишет в лог время импорта модулей бота и уже загруженные тяжелые библиотеки"""
+    report = import_report()
+    logger.info(f"Импорт модулей бота занял {_import_seconds:.2f} с")
+    if report["heavy_loaded"]:
+        logger.warning(f"Тяжелые библиотеки загружены при старте: {', '.join(report['heavy_loaded'])}")
+
+async def on_shutdown(bot: Bot, services: ServiceRegistry):
     """Действия при остановке бота"""
     global reminder_service
     
@@ -55,6 +85,18 @@ async def on_shutdown(bot: Bot):
     if reminder_service:
         await reminder_service.stop()
     
+    # Сбрасываем накопленные приращения воды в БД
+    await water_buffer.stop()
+    
+    # Останавливаем процессы рендеринга графиков
+    render_pool.shutdown()
+    
+    # Закрываем HTTP-сессии интеграций
+    await services.fitness.close()
+    
+    for feature, metrics in model_client.report().items():
+        logger.info(f"Gemini {feature}: {metrics}")
+    
     logger.info("Все сервисы остановлены")
 
 async def set_bot_commands(bot: Bot):
@@ -76,10 +118,8 @@ async def set_bot_commands(bot: Bot):
     
     await bot.set_my_commands(commands)
 
-async def auto_sync_task():
+async def auto_sync_task(fitness_service):
     """Фоновая задача для автоматической синхронизации данных"""
-    global fitness_service
-    
     while True:
         try:
             # Ждем до 6 утра следующего дня
@@ -90,21 +130,8 @@ async def auto_sync_task():
             await asyncio.sleep(wait_seconds)
             
             # Синхронизируем данные для всех пользователей с интеграциями
-            if fitness_service:
-                logger.info("Начинаем автоматическую синхронизацию данных...")
-                
-                # Получаем всех пользователей с интеграциями
-                for user_id, services in fitness_service.user_integrations.items():
-                    try:
-                        results = await fitness_service.sync_all(user_id)
-                        logger.info(f"Синхронизация для пользователя {user_id}: {results}")
-                    except Exception as e:
-                        logger.error(f"Ошибка синхронизации для {user_id}: {e}")
-                
-                logger.info("Автоматическая синхронизация завершена")
-            
-            # Ждем 24 часа до следующей синхронизации
-            await asyncio.sleep(86400)
+            logger.info("Начинаем автоматическую синхронизацию данных...")
+            await FitnessSyncJob(fitness_service).run()
             
         except asyncio.CancelledError:
             break
@@ -123,6 +150,14 @@ async def main():
     # Инициализация бота и диспетчера
     bot = Bot(token=settings.BOT_TOKEN)
     dp = Dispatcher(storage=storage)
+    
+    # Общий отправитель исходящих сообщений с учетом лимитов Telegram
+    global message_sender
+    message_sender = MessageSender(bot)
+    
+    # Сервисы создаются один раз и передаются в хендлеры аргументом services
+    services = ServiceRegistry(bot)
+    dp["services"] = services
 
     # Регистрация обработчиков startup и shutdown
     dp.startup.register(on_startup)
@@ -140,9 +175,9 @@ async def main():
     dp.include_router(help.router)
 
     # Создаем фоновые задачи
-    auto_sync = asyncio.create_task(auto_sync_task())
+    auto_sync = asyncio.create_task(auto_sync_task(services.fitness))
 
-    plateau_check = asyncio.create_task(plateau_check_task())
+    plateau_check = asyncio.create_task(plateau_check_task(message_sender, services))
     
     # Запуск бота
     logger.info("Бот запущен")
@@ -150,16 +185,14 @@ async def main():
         await dp.start_polling(bot)
     finally:
         auto_sync.cancel()
+        plateau_check.cancel()
         await bot.session.close()
         await redis.aclose()
 
-async def plateau_check_task():
+async def plateau_check_task(sender: MessageSender, services: ServiceRegistry):
     """Фоновая задача для автоматической проверки плато у всех пользователей"""
-    from bot.services.plateau_adaptation import PlateauAdaptationService
-    from bot.services.motivation_service import MotivationService
-    
-    plateau_service = PlateauAdaptationService()
-    motivation_service = MotivationService()
+    plateau_service = services.plateau
+    motivation_service = services.motivation
     
     while True:
         try:
@@ -172,55 +205,12 @@ async def plateau_check_task():
             
             logger.info("Начинаем ежедневную проверку плато...")
             
-            async with get_session() as session:
-                # Получаем всех активных пользователей
-                result = await session.execute(
-                    select(User).where(
-                        and_(
-                            User.is_active == True,
-                            User.onboarding_completed == True,
-                            User.is_premium == True  # Только для премиум пользователей
-                        )
-                    )
-                )
-                users = result.scalars().all()
-                
-                for user in users:
-                    try:
-                        # Проверяем плато
-                        plateau_data = await plateau_service._detect_plateau(user.id)
-                        
-                        if plateau_data['is_plateau'] and plateau_data['plateau_days'] == 7:
-                            # Первая неделя плато - отправляем уведомление
-                            motivation = await motivation_service.get_plateau_motivation(user.telegram_id)
-                            
-                            await bot.send_message(
-                                user.telegram_id,
-                                f"📊 **Автоматический анализ прогресса**\n\n"
-                                f"Обнаружено плато веса (7 дней без изменений).\n\n"
-                                f"{motivation}\n\n"
-                                f"Используйте /analytics для детального анализа и адаптации плана.",
-                                parse_mode="Markdown"
-                            )
-                            
-                        elif plateau_data['plateau_days'] >= 14:
-                            # Две недели плато - автоматическая адаптация
-                            result = await plateau_service.check_and_adapt(user.telegram_id)
-                            
-                            if result['success'] and result.get('is_plateau'):
-                                await bot.send_message(
-                                    user.telegram_id,
-                                    "🔄 **Автоматическая адаптация плана**\n\n"
-                                    "Ваш план был автоматически скорректирован для прорыва плато.\n"
-                                    "Изменения вступят в силу со следующего дня.\n\n"
-                                    "Подробности: /analytics",
-                                    parse_mode="Markdown"
-                                )
-                    
-                    except Exception as e:
-                        logger.error(f"Ошибка проверки плато для пользователя {user.id}: {e}")
+            summary = await plateau_service.run_daily_check(sender, motivation_service)
             
-            logger.info(f"Проверка плато завершена для {len(users)} пользователей")
+            logger.info(
+                f"Проверка плато завершена для {summary['users']} пользователей: "
+                f"адаптировано {summary['adapted']}, уведомлено {summary['notified']}"
+            )
             
         except asyncio.CancelledError:
             break
@@ -1,14 +1,33 @@
 import json
 import logging
 from typing import Dict, List, Optional
-import google.generativeai as genai
-from google.generativeai.types import GenerationConfig
 
 from bot.config import settings
+from bot.utils.lazy import lazy_import
+from bot.services.model_client import model_client, CircuitOpenError
 from database.models import User, Goal
 
 logger = logging.getLogger(__name__)
 
+# SDK Gemini загружается при первом создании сервиса
+genai = lazy_import("google.generativeai")
+
+# Структура плана на день в ответе Gemini
+DAY_PLAN_SCHEMA = """{
+            "breakfast": {
+                "name": "Название блюда",
+                "calories": число,
+                "protein": число,
+                "fats": число,
+                "carbs": число,
+                "ingredients": ["Ингредиент 1 - количество", "Ингредиент 2 - количество"],
+                "recipe": "Краткий рецепт приготовления"
+            },
+            "lunch": { ... },
+            "dinner": { ... },
+            "snack": { ... } // это поле должно быть null или отсутствовать, если meal_count = 3
+        }"""
+
 class AIService:
     """Сервис для работы с Gemini API"""
     
@@ -16,8 +35,7 @@ class AIService:
         self.enabled = False
         if settings.GEMINI_API_KEY:
             try:
-                genai.configure(api_key=settings.GEMINI_API_KEY)
-                self.model = genai.GenerativeModel(settings.AI_MODEL)
+                model_client.get_model(settings.AI_MODEL)
                 self.enabled = True
                 logger.info("AI сервис инициализирован с Google Gemini")
             except Exception as e:
@@ -25,36 +43,100 @@ class AIService:
         else:
             logger.warning("AI сервис отключен - нет GEMINI_API_KEY")
 
-    async def generate_meal_plan(self, user: User) -> Optional[Dict]:
-        """Генерирует план питания через Gemini"""
+    async def generate_meal_plan(self, user: User, day: Optional[int] = None) -> Optional[Dict]:
+        """Генерирует план питания через Gemini (day - номер дня недели, чтобы дни различались)"""
         if not self.enabled:
             logger.warning("AI сервис отключен, генерация невозможна")
             return None
         
-        prompt = self._create_meal_prompt(user)
-        generation_config = GenerationConfig(
+        prompt = self._create_meal_prompt(user, day)
+        generation_config = genai.types.GenerationConfig(
             temperature=settings.AI_TEMPERATURE,
             max_output_tokens=settings.AI_MAX_TOKENS,
             response_mime_type="application/json", # Указываем, что ждем JSON
         )
         
         try:
-            response = await self.model.generate_content_async(
-                contents=prompt,
-                generation_config=generation_config
-            )
+            text = await self._generate("meal_plan", prompt, generation_config)
             
             # API возвращает JSON-строку, ее нужно распарсить
-            meal_data = json.loads(response.text)
+            meal_data = json.loads(text)
             logger.info(f"Gemini успешно сгенерировал план для пользователя {user.telegram_id}")
             return meal_data
             
+        except CircuitOpenError:
+            # Gemini недоступен - вызывающий код сразу переходит на локальный вариант
+            return None
         except Exception as e:
             logger.error(f"Ошибка при генерации через Gemini: {e}")
             return None
     
-    def _create_meal_prompt(self, user: User) -> str:
+    async def _generate(self, feature: str, prompt: str, generation_config, timeout: float = None) -> str:
+        """
+        Текст ответа Gemini через общий клиент (лимиты, таймауты, повторы).
+        Одинаковые одновременные запросы выполняются один раз.
+        """
+        return await model_client.generate_text(
+            feature, prompt, generation_config, model_name=settings.AI_MODEL, timeout=timeout
+        )
+    
+    async def generate_week_plan(self, user: User, days: int = 7) -> Optional[List[Optional[Dict]]]:
+        """
+        Генерирует план питания сразу на несколько дней одним запросом.
+        Возвращает список планов по дням (в формате generate_meal_plan) или None.
+        """
+        if not self.enabled:
+            return None
+        
+        prompt = self._create_week_prompt(user, days)
+        generation_config = genai.types.GenerationConfig(
+            temperature=settings.AI_TEMPERATURE,
+            max_output_tokens=settings.AI_WEEK_MAX_TOKENS,
+            response_mime_type="application/json",
+        )
+        
+        try:
+            text = await self._generate("week_plan", prompt, generation_config, timeout=settings.AI_WEEK_TIMEOUT)
+            week_data = json.loads(text)
+            day_plans = week_data.get("days") if isinstance(week_data, dict) else week_data
+            if not isinstance(day_plans, list):
+                logger.error("Gemini вернул план на неделю в неожиданном формате")
+                return None
+            logger.info(f"Gemini сгенерировал план на {len(day_plans)} дн. для пользователя {user.telegram_id}")
+            return day_plans
+            
+        except CircuitOpenError:
+            return None
+        except Exception as e:
+            logger.error(f"Ошибка при генерации плана на неделю через Gemini: {e}")
+            return None
+    
+    def _create_meal_prompt(self, user: User, day: Optional[int] = None) -> str:
         """Создает промпт для генерации плана питания"""
+        day_text = f" Это план на день {day} недели, блюда должны отличаться от других дней." if day else ""
+        return f"""
+        Ты — профессиональный диетолог. Твоя задача — создать персонализированный план питания на ОДИН день.{day_text}
+        Ответ должен быть СТРОГО в формате JSON без какого-либо дополнительного текста или markdown-разметки.
+        {self._client_prompt(user)}
+        Верни JSON объект со следующей структурой:
+        {DAY_PLAN_SCHEMA}
+        """
+    
+    def _create_week_prompt(self, user: User, days: int) -> str:
+        """Создает промпт для генерации плана питания на несколько дней"""
+        return f"""
+        Ты — профессиональный диетолог. Твоя задача — создать персонализированный план питания на {days} дней.
+        Ответ должен быть СТРОГО в формате JSON без какого-либо дополнительного текста или markdown-разметки.
+        {self._client_prompt(user)}
+        5. Блюда в разные дни не должны повторяться.
+
+        Верни JSON объект {{"days": [...]}}, где days — список ровно из {days} планов на день,
+        каждый со следующей структурой:
+        {DAY_PLAN_SCHEMA}
+        """
+    
+    def _client_prompt(self, user: User) -> str:
+        """Параметры клиента и требования к плану (общая часть промптов)"""
         goal_text = {
             Goal.LOSE_WEIGHT: "снижение веса",
             Goal.GAIN_MUSCLE: "набор мышечной массы",
@@ -71,11 +153,7 @@ class AIService:
         if user.food_preferences and user.food_preferences.get('allergies'):
             allergies = f"Исключить: {', '.join(user.food_preferences['allergies'])}"
         
-        # Системный промпт + пользовательский запрос в одном
-        prompt = f"""
-        Ты — профессиональный диетолог. Твоя задача — создать персонализированный план питания на ОДИН день.
-        Ответ должен быть СТРОГО в формате JSON без какого-либо дополнительного текста или markdown-разметки.
-
+        return f"""
         Параметры клиента:
         - Пол: {'мужской' if user.gender.value == 'male' else 'женский'}
         - Возраст: {user.age} лет
@@ -91,27 +169,9 @@ class AIService:
         Требования к плану:
         1. Блюда должны быть простыми в приготовлении.
         2. Ингредиенты должны быть доступны в обычных магазинах.
-        3. Общая калорийность и БЖУ должны быть максимально близки к целевым.
+        3. Общая калорийность и БЖУ каждого дня должны быть максимально близки к целевым.
         4. Используй русские названия блюд и ингредиентов.
-
-        Верни JSON объект со следующей структурой:
-        {{
-            "breakfast": {{
-                "name": "Название блюда",
-                "calories": число,
-                "protein": число,
-                "fats": число,
-                "carbs": число,
-                "ingredients": ["Ингредиент 1 - количество", "Ингредиент 2 - количество"],
-                "recipe": "Краткий рецепт приготовления"
-            }},
-            "lunch": {{ ... }},
-            "dinner": {{ ... }},
-            "snack": {{ ... }} // это поле должно быть null или отсутствовать, если meal_count = 3
-        }}
         """
-        
-        return prompt
     
     async def generate_meal_replacement(
         self, 
@@ -154,16 +214,18 @@ class AIService:
         }}
         """
 
-        generation_config = GenerationConfig(
+        generation_config = genai.types.GenerationConfig(
             temperature=0.8, # Больше вариативности
             max_output_tokens=500,
             response_mime_type="application/json",
         )
 
         try:
-            response = await self.model.generate_content_async(prompt, generation_config=generation_config)
-            result = json.loads(response.text)
+            text = await self._generate("replacement", prompt, generation_config)
+            result = json.loads(text)
             return result
+        except CircuitOpenError:
+            return None
         except Exception as e:
             logger.error(f"Ошибка при генерации замены: {e}")
             return None
@@ -204,16 +266,18 @@ class AIService:
         }}
         """
 
-        generation_config = GenerationConfig(
+        generation_config = genai.types.GenerationConfig(
             temperature=0.2, # Низкая температура для точности
             response_mime_type="application/json",
         )
 
         try:
-            response = await self.model.generate_content_async(prompt, generation_config=generation_config)
-            categorized_list = json.loads(response.text)
+            text = await self._generate("shopping", prompt, generation_config)
+            categorized_list = json.loads(text)
             logger.info("Gemini успешно категоризировал список покупок")
             return categorized_list
+        except CircuitOpenError:
+            return None
         except Exception as e:
             logger.error(f"Ошибка при категоризации списка покупок: {e}")
             return None # Возвращаем None, чтобы можно было откатиться к ручному методу
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+from redis.asyncio import Redis
+
+from bot.config import settings
+from database.cache import redis_client, get_data_version
+
+logger = logging.getLogger(__name__)
+
+
+class ChartCache:
+    """
+    Кэш готовых графиков в Redis. Ключ включает версию данных пользователя,
+    поэтому после любой записи чек-ина или профиля старые PNG просто
+    перестают запрашиваться и удаляются по TTL.
+    """
+
+    def __init__(self, redis: Redis, ttl: int = None):
+        self.redis = redis
+        self.ttl = ttl or settings.CHART_CACHE_TTL
+        self.metrics = {"hits": 0, "misses": 0, "errors": 0}
+
+    @staticmethod
+    def _key(user_id: int, kind: str, params: Dict, version: int) -> str:
+        params_hash = hashlib.sha1(
+            json.dumps(params, sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+        return f"chart:{user_id}:{kind}:{params_hash}:v{version}"
+
+    async def get_or_render(
+        self,
+        user_id: int,
+        kind: str,
+        params: Dict,
+        render: Callable[[], Awaitable[Optional[bytes]]]
+    ) -> Optional[bytes]:
+        """Возвращает PNG из кэша или рендерит и сохраняет его"""
+        key = None
+        try:
+            # Версию читаем до загрузки данных: если данные изменятся во время
+            # рендеринга, результат окажется под уже устаревшей версией
+            version = await get_data_version(user_id)
+            key = self._key(user_id, kind, params, version)
+            cached = await self.redis.get(key)
+            if cached is not None:
+                self.metrics["hits"] += 1
+                logger.debug(f"Кэш графиков: попадание {kind} для user {user_id}, {self.metrics}")
+                return cached
+        except Exception as e:
+            # Без Redis просто рендерим заново
+            self.metrics["errors"] += 1
+            logger.warning(f"Кэш графиков недоступен: {e}")
+
+        self.metrics["misses"] += 1
+        chart = await render()
+
+        if chart and key:
+            try:
+                await self.redis.set(key, chart, ex=self.ttl)
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.warning(f"Не удалось сохранить график в кэш: {e}")
+        return chart
+
+
+chart_cache = ChartCache(redis_client)
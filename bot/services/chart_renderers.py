@@ -0,0 +1,693 @@
+import io
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import matplotlib
+matplotlib.use('Agg')  # Для работы без GUI
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+from matplotlib.patches import Rectangle
+import seaborn as sns
+import numpy as np
+
+from bot.utils.plateau import plateau_intervals
+
+# Функции отрисовки для пула процессов (см. render_pool): принимают только
+# простые данные (списки, числа, строки), не обращаются к БД и возвращают PNG
+
+CHART_STYLE = 'seaborn-v0_8-darkgrid'
+CHART_COLORS = {
+    'primary': '#2E7D32',
+    'secondary': '#1976D2',
+    'accent': '#FF6B6B',
+    'success': '#4CAF50',
+    'warning': '#FFA726',
+    'background': '#F5F5F5'
+}
+
+ANALYTICS_STYLE = 'whitegrid'
+ANALYTICS_COLORS = {
+    'primary': '#2E7D32',
+    'secondary': '#1976D2',
+    'accent': '#FF6B6B',
+    'success': '#4CAF50',
+    'warning': '#FFA726',
+    'danger': '#EF5350',
+    'info': '#42A5F5',
+    'light': '#E0E0E0',
+    'dark': '#424242'
+}
+
+
+def _to_png(fig, dpi: int = 100, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=dpi, **kwargs)
+    plt.close(fig)
+    return buffer.getvalue()
+
+
+# ============ ГРАФИКИ СТАТИСТИКИ (ChartsService) ============
+
+def render_weight_chart(dates: List[datetime], weights: List[float], target_weight: Optional[float], days: int) -> bytes:
+    """График изменения веса"""
+    colors = CHART_COLORS
+    with plt.style.context(CHART_STYLE):
+        fig, ax = plt.subplots(figsize=(10, 6))
+
+        # Основная линия веса
+        ax.plot(dates, weights,
+               color=colors['primary'],
+               linewidth=2,
+               marker='o',
+               markersize=6,
+               label='Текущий вес')
+
+        # Линия тренда
+        z = np.polyfit(mdates.date2num(dates), weights, 1)
+        p = np.poly1d(z)
+        ax.plot(dates, p(mdates.date2num(dates)),
+               color=colors['secondary'],
+               linestyle='--',
+               alpha=0.7,
+               label='Тренд')
+
+        # Целевой вес
+        if target_weight:
+            ax.axhline(y=target_weight,
+                      color=colors['accent'],
+                      linestyle=':',
+                      alpha=0.7,
+                      label=f'Цель: {target_weight} кг')
+
+        # Настройка осей
+        ax.set_xlabel('Дата', fontsize=12)
+        ax.set_ylabel('Вес (кг)', fontsize=12)
+        ax.set_title('График изменения веса', fontsize=14, fontweight='bold')
+
+        # Форматирование дат
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+        ax.xaxis.set_major_locator(mdates.DayLocator(interval=max(1, days//10)))
+        plt.setp(ax.get_xticklabels(), rotation=45)
+
+        # Сетка и легенда
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='best')
+
+        # Добавляем статистику
+        weight_change = weights[-1] - weights[0]
+        avg_weight = sum(weights) / len(weights)
+
+        stats_text = (
+            f'Изменение: {weight_change:+.1f} кг\n'
+            f'Средний вес: {avg_weight:.1f} кг'
+        )
+        ax.text(0.02, 0.98, stats_text,
+               transform=ax.transAxes,
+               verticalalignment='top',
+               bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+
+        fig.tight_layout()
+        return _to_png(fig)
+
+
+def render_activity_chart(dates: List[datetime], steps: List[int], water: List[float]) -> bytes:
+    """График активности (шаги и вода)"""
+    colors = CHART_COLORS
+    with plt.style.context(CHART_STYLE):
+        # Создание графика с двумя осями Y
+        fig, ax1 = plt.subplots(figsize=(10, 6))
+
+        # График шагов
+        color1 = colors['primary']
+        ax1.set_xlabel('Дата', fontsize=12)
+        ax1.set_ylabel('Шаги', color=color1, fontsize=12)
+        ax1.bar([d - timedelta(hours=2) for d in dates], steps,
+               width=0.35, color=color1, alpha=0.7, label='Шаги')
+        ax1.tick_params(axis='y', labelcolor=color1)
+        ax1.axhline(y=8000, color=color1, linestyle='--', alpha=0.5, label='Цель: 8000')
+
+        # График воды на второй оси
+        ax2 = ax1.twinx()
+        color2 = colors['secondary']
+        ax2.set_ylabel('Вода (л)', color=color2, fontsize=12)
+        ax2.bar([d + timedelta(hours=2) for d in dates], water,
+               width=0.35, color=color2, alpha=0.7, label='Вода')
+        ax2.tick_params(axis='y', labelcolor=color2)
+        ax2.axhline(y=2.0, color=color2, linestyle='--', alpha=0.5, label='Цель: 2л')
+
+        # Заголовок
+        ax1.set_title('Активность за неделю', fontsize=14, fontweight='bold')
+
+        # Форматирование дат
+        ax1.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+        plt.setp(ax1.get_xticklabels(), rotation=45)
+
+        # Легенда
+        lines1, labels1 = ax1.get_legend_handles_labels()
+        lines2, labels2 = ax2.get_legend_handles_labels()
+        ax1.legend(lines1 + lines2, labels1 + labels2, loc='upper left')
+
+        # Статистика
+        avg_steps = sum(steps) / len(steps) if steps else 0
+        avg_water = sum(water) / len(water) if water else 0
+        days_goal_reached = sum(1 for s in steps if s >= 8000)
+
+        stats_text = (
+            f'Среднее:\n'
+            f'Шаги: {avg_steps:.0f}\n'
+            f'Вода: {avg_water:.1f}л\n'
+            f'Дней с 8000+: {days_goal_reached}'
+        )
+        ax1.text(0.02, 0.98, stats_text,
+                transform=ax1.transAxes,
+                verticalalignment='top',
+                bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+
+        fig.tight_layout()
+        return _to_png(fig)
+
+
+def render_sleep_chart(dates: List[datetime], sleep_hours: List[float], moods: List[int]) -> bytes:
+    """График сна и настроения (moods: 1 - плохо, 2 - нормально, 3 - отлично)"""
+    colors = CHART_COLORS
+    with plt.style.context(CHART_STYLE):
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 8), sharex=True)
+
+        # График сна
+        ax1.bar(dates, sleep_hours, color=colors['primary'], alpha=0.7)
+        ax1.axhline(y=7, color='green', linestyle='--', alpha=0.5, label='Минимум: 7ч')
+        ax1.axhline(y=9, color='orange', linestyle='--', alpha=0.5, label='Максимум: 9ч')
+        ax1.set_ylabel('Часы сна', fontsize=12)
+        ax1.set_title('Сон и самочувствие', fontsize=14, fontweight='bold')
+        ax1.legend(loc='upper right')
+        ax1.grid(True, alpha=0.3)
+
+        # График настроения
+        mood_colors = ['#FF6B6B', '#FFA726', '#4CAF50']
+        mood_labels = ['Плохо', 'Нормально', 'Отлично']
+
+        for date, mood in zip(dates, moods):
+            ax2.bar(date, mood, color=mood_colors[mood-1], alpha=0.7)
+
+        ax2.set_ylabel('Настроение', fontsize=12)
+        ax2.set_ylim(0.5, 3.5)
+        ax2.set_yticks([1, 2, 3])
+        ax2.set_yticklabels(mood_labels)
+        ax2.grid(True, alpha=0.3)
+
+        # Форматирование дат
+        ax2.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+        plt.setp(ax2.get_xticklabels(), rotation=45)
+        ax2.set_xlabel('Дата', fontsize=12)
+
+        # Статистика
+        avg_sleep = sum(sleep_hours) / len(sleep_hours)
+        good_days = sum(1 for m in moods if m == 3)
+
+        stats_text = (
+            f'Средний сон: {avg_sleep:.1f}ч\n'
+            f'Дней с отличным настроением: {good_days}'
+        )
+        ax1.text(0.02, 0.98, stats_text,
+                transform=ax1.transAxes,
+                verticalalignment='top',
+                bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+
+        fig.tight_layout()
+        return _to_png(fig)
+
+
+def render_progress_summary(
+    weight_dates: List[datetime],
+    weights: List[float],
+    activity_dates: List[datetime],
+    steps: List[int],
+    water: List[float]
+) -> bytes:
+    """Общая сводка прогресса: вес за 30 дней, шаги и вода за 7 дней"""
+    colors = CHART_COLORS
+    with plt.style.context(CHART_STYLE):
+        fig = plt.figure(figsize=(12, 10))
+
+        # График 1: Вес (верхняя половина)
+        if weights:
+            ax1 = fig.add_subplot(2, 2, (1, 2))
+            ax1.plot(weight_dates, weights, color=colors['primary'], linewidth=2, marker='o')
+            ax1.set_title('Динамика веса (30 дней)', fontsize=12)
+            ax1.set_ylabel('Вес (кг)')
+            ax1.grid(True, alpha=0.3)
+            ax1.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+
+        if activity_dates:
+            # График 2: Шаги (нижний левый)
+            ax2 = fig.add_subplot(2, 2, 3)
+            ax2.bar(activity_dates, steps, color=colors['primary'], alpha=0.7)
+            ax2.axhline(y=8000, color='red', linestyle='--', alpha=0.5)
+            ax2.set_title('Шаги (7 дней)', fontsize=12)
+            ax2.set_ylabel('Шаги')
+            ax2.tick_params(axis='x', rotation=45)
+
+            # График 3: Вода (нижний правый)
+            ax3 = fig.add_subplot(2, 2, 4)
+            ax3.bar(activity_dates, water, color=colors['secondary'], alpha=0.7)
+            ax3.axhline(y=2.0, color='red', linestyle='--', alpha=0.5)
+            ax3.set_title('Вода (7 дней)', fontsize=12)
+            ax3.set_ylabel('Литры')
+
+        fig.suptitle('Сводка прогресса', fontsize=16, fontweight='bold')
+        fig.tight_layout()
+        return _to_png(fig)
+
+
+# ============ АНАЛИТИКА (AnalyticsService) ============
+
+def _draw_weight_with_prediction(ax, data: Optional[Dict]):
+    """График веса с трендом и прогнозом"""
+    colors = ANALYTICS_COLORS
+    if not data:
+        ax.text(0.5, 0.5, 'Недостаточно данных', ha='center', va='center')
+        ax.set_title('График веса')
+        return
+
+    dates = data['dates']
+    weights = data['weights']
+    target_weight = data['target_weight']
+
+    # Основная линия
+    ax.plot(dates, weights, 'o-', color=colors['primary'],
+           linewidth=2, markersize=6, label='Фактический вес')
+
+    # Тренд
+    x_numeric = mdates.date2num(dates)
+    z = np.polyfit(x_numeric, weights, 1)
+    p = np.poly1d(z)
+    trend_line = p(x_numeric)
+    ax.plot(dates, trend_line, '--', color=colors['secondary'],
+           alpha=0.7, linewidth=2, label='Тренд')
+
+    # Прогноз на 30 дней
+    future_days = 30
+    last_date = dates[-1]
+    future_dates = [last_date + timedelta(days=i) for i in range(1, future_days + 1)]
+    future_x = mdates.date2num(future_dates)
+    future_weights = p(future_x)
+
+    ax.plot(future_dates, future_weights, ':', color=colors['info'],
+           linewidth=2, alpha=0.7, label='Прогноз')
+
+    # Зона неопределенности прогноза
+    std_dev = np.std(np.asarray(weights) - trend_line[:len(weights)])
+    upper_bound = future_weights + std_dev
+    lower_bound = future_weights - std_dev
+    ax.fill_between(future_dates, lower_bound, upper_bound,
+                   color=colors['info'], alpha=0.1)
+
+    # Целевой вес
+    if target_weight:
+        ax.axhline(y=target_weight, color=colors['accent'],
+                  linestyle='-.', linewidth=2, alpha=0.7,
+                  label=f'Цель: {target_weight} кг')
+
+        # Прогноз достижения цели
+        if z[0] != 0:  # Если есть изменение веса
+            days_to_goal = (target_weight - weights[-1]) / (z[0] * -1)
+            if 0 < days_to_goal < 365:
+                goal_date = last_date + timedelta(days=int(days_to_goal))
+                ax.axvline(x=goal_date, color=colors['success'],
+                         linestyle=':', alpha=0.5)
+                ax.text(goal_date, target_weight,
+                       f'  Цель\n  {goal_date.strftime("%d.%m")}',
+                       fontsize=9, color=colors['success'])
+
+    # Периоды плато
+    for start, end in data['plateau_periods']:
+        ax.axvspan(start, end, color=colors['warning'], alpha=0.2)
+
+    # Настройка осей
+    ax.set_xlabel('Дата', fontsize=12)
+    ax.set_ylabel('Вес (кг)', fontsize=12)
+    ax.set_title('Динамика веса с прогнозом на 30 дней', fontsize=14, fontweight='bold')
+    ax.legend(loc='best')
+    ax.grid(True, alpha=0.3)
+
+    # Форматирование дат
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+    ax.xaxis.set_major_locator(mdates.DayLocator(interval=max(1, len(dates) // 10)))
+    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
+
+    # Добавляем статистику
+    weight_change = weights[-1] - weights[0]
+    rate_per_week = (weight_change / len(dates)) * 7 if len(dates) > 0 else 0
+
+    stats_text = f'Изменение: {weight_change:+.1f} кг\n'
+    stats_text += f'Темп: {rate_per_week:+.2f} кг/нед'
+
+    ax.text(0.02, 0.98, stats_text, transform=ax.transAxes,
+           verticalalignment='top',
+           bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+
+
+def _draw_activity_heatmap(ax, cells: List[Tuple[int, float]]):
+    """Тепловая карта активности: cells - (день месяца, балл 0-10) за 30 дней"""
+    # Матрица активности 5x6 (30 дней)
+    activity_matrix = np.zeros((5, 6))
+    for i, (_, score) in enumerate(cells[:30]):
+        activity_matrix[i // 6, i % 6] = score
+
+    # Создаем тепловую карту
+    im = ax.imshow(activity_matrix, cmap='RdYlGn', aspect='auto', vmin=0, vmax=10)
+
+    # Добавляем значения в ячейки
+    for i, (day, _) in enumerate(cells[:30]):
+        ax.text(i % 6, i // 6, f'{day}',
+               ha="center", va="center", color="black", fontsize=8)
+
+    # Настройка осей
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_title('Карта активности за 30 дней', fontsize=14, fontweight='bold')
+
+    # Цветовая шкала
+    cbar = ax.figure.colorbar(im, ax=ax, orientation='horizontal', pad=0.1)
+    cbar.set_label('Уровень активности', fontsize=10)
+
+
+def _draw_macros_distribution(ax, data: Optional[Dict]):
+    """График распределения БЖУ"""
+    colors = ANALYTICS_COLORS
+    if not data:
+        ax.text(0.5, 0.5, 'Нет данных о питании', ha='center', va='center')
+        ax.set_title('Распределение БЖУ')
+        return
+
+    categories = ['Белки', 'Жиры', 'Углеводы']
+    x = np.arange(len(categories))
+    width = 0.35
+
+    # Столбцы
+    bars1 = ax.bar(x - width/2, data['actual'], width, label='Фактически',
+                  color=colors['primary'])
+    bars2 = ax.bar(x + width/2, data['target'], width, label='Цель',
+                  color=colors['secondary'], alpha=0.7)
+
+    # Подписи
+    ax.set_xlabel('Макронутриенты', fontsize=12)
+    ax.set_ylabel('Граммы', fontsize=12)
+    ax.set_title('Распределение БЖУ', fontsize=14, fontweight='bold')
+    ax.set_xticks(x)
+    ax.set_xticklabels(categories)
+    ax.legend()
+
+    # Добавляем значения на столбцы
+    for bars in [bars1, bars2]:
+        for bar in bars:
+            height = bar.get_height()
+            ax.text(bar.get_x() + bar.get_width()/2., height,
+                   f'{height:.0f}',
+                   ha='center', va='bottom', fontsize=9)
+
+
+def _draw_sleep_quality(ax, dates: List[datetime], sleep_hours: List[float]):
+    """График качества сна"""
+    colors = ANALYTICS_COLORS
+    if not dates:
+        ax.text(0.5, 0.5, 'Нет данных о сне', ha='center', va='center')
+        ax.set_title('Качество сна')
+        return
+
+    ax.bar(dates, sleep_hours, color=colors['primary'], alpha=0.7)
+
+    # Оптимальная зона сна
+    ax.axhspan(7, 9, color=colors['success'], alpha=0.2,
+              label='Оптимальная зона')
+    ax.axhline(y=8, color=colors['success'], linestyle='--',
+              alpha=0.5, linewidth=1)
+
+    # Настройка осей
+    ax.set_xlabel('Дата', fontsize=12)
+    ax.set_ylabel('Часы сна', fontsize=12)
+    ax.set_title('Качество сна', fontsize=14, fontweight='bold')
+    ax.legend()
+    ax.grid(True, alpha=0.3, axis='y')
+
+    # Форматирование дат
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%d.%m'))
+    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
+
+    # Статистика
+    avg_sleep = np.mean(sleep_hours)
+    quality = 'Отличное' if 7 <= avg_sleep <= 9 else 'Требует внимания'
+
+    stats_text = f'Среднее: {avg_sleep:.1f}ч\nКачество: {quality}'
+    ax.text(0.02, 0.98, stats_text, transform=ax.transAxes,
+           verticalalignment='top',
+           bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+
+
+def _draw_goal_progress(ax, data: Optional[Dict]):
+    """График прогресса к цели"""
+    colors = ANALYTICS_COLORS
+    if not data:
+        ax.text(0.5, 0.5, 'Недостаточно данных', ha='center', va='center')
+        ax.set_title('Прогресс к цели')
+        return
+
+    start_weight = data['start_weight']
+    current_weight = data['current_weight']
+    target_weight = data['target_weight']
+
+    # Рассчитываем прогресс
+    total_to_change = abs(target_weight - start_weight)
+    changed = abs(current_weight - start_weight)
+    progress_percent = (changed / total_to_change * 100) if total_to_change > 0 else 0
+
+    # Прогресс бар
+    ax.barh([0], [progress_percent], height=0.5,
+           color=colors['success'], alpha=0.7)
+    ax.barh([0], [100 - progress_percent], left=[progress_percent],
+           height=0.5, color=colors['light'], alpha=0.5)
+
+    # Метки
+    ax.text(progress_percent / 2, 0, f'{progress_percent:.1f}%',
+           ha='center', va='center', fontsize=14, fontweight='bold',
+           color='white')
+
+    # Контрольные точки
+    for milestone in [25, 50, 75]:
+        ax.axvline(x=milestone, color=colors['dark'],
+                 linestyle=':', alpha=0.3)
+        if progress_percent >= milestone:
+            ax.plot(milestone, 0, 'o', color=colors['success'],
+                   markersize=10)
+
+    # Настройка осей
+    ax.set_xlim(0, 100)
+    ax.set_ylim(-0.5, 0.5)
+    ax.set_xlabel('Прогресс (%)', fontsize=12)
+    ax.set_title(f'Прогресс к цели: {start_weight:.1f} → {target_weight:.1f} кг',
+               fontsize=14, fontweight='bold')
+    ax.set_yticks([])
+
+    # Информация
+    days_passed = data['days_passed']
+    rate = changed / days_passed * 7 if days_passed > 0 else 0
+
+    info_text = f'Пройдено: {changed:.1f} кг из {total_to_change:.1f} кг\n'
+    info_text += f'Темп: {rate:.2f} кг/неделю'
+
+    ax.text(0.98, 0.5, info_text, transform=ax.transAxes,
+           ha='right', va='center',
+           bbox=dict(boxstyle='round', facecolor='white', alpha=0.8))
+
+
+def render_comprehensive_report(data: Dict) -> bytes:
+    """Комплексный отчет из подготовленных данных AnalyticsService"""
+    with sns.axes_style(ANALYTICS_STYLE):
+        fig = plt.figure(figsize=(16, 20))
+
+        # Создаем сетку для графиков
+        gs = fig.add_gridspec(5, 2, hspace=0.3, wspace=0.3)
+
+        # 1. График веса с прогнозом
+        _draw_weight_with_prediction(fig.add_subplot(gs[0, :]), data['weight'])
+
+        # 2. Тепловая карта активности
+        _draw_activity_heatmap(fig.add_subplot(gs[1, :]), data['activity_cells'])
+
+        # 3. График состава тела (БЖУ)
+        _draw_macros_distribution(fig.add_subplot(gs[2, 0]), data['macros'])
+
+        # 4. График качества сна
+        _draw_sleep_quality(fig.add_subplot(gs[2, 1]), *data['sleep'])
+
+        # 5. График прогресса к цели
+        _draw_goal_progress(fig.add_subplot(gs[3, :]), data['goal'])
+
+        # 6. Статистика и рекомендации
+        ax6 = fig.add_subplot(gs[4, :])
+        ax6.axis('off')
+        ax6.text(0.05, 0.95, data['recommendations'], transform=ax6.transAxes,
+                fontsize=11, verticalalignment='top',
+                bbox=dict(boxstyle='round', facecolor=ANALYTICS_COLORS['light'],
+                        alpha=0.3, pad=1))
+
+        # Заголовок
+        fig.suptitle('Комплексный отчет о прогрессе', fontsize=20, fontweight='bold')
+
+        return _to_png(fig, bbox_inches='tight')
+
+
+def render_plateau_breakthrough_chart(dates: List[datetime], weights: List[float], base_calories: Optional[int]) -> bytes:
+    """График с планом прорыва плато"""
+    colors = ANALYTICS_COLORS
+    with sns.axes_style(ANALYTICS_STYLE):
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(12, 10))
+
+        if len(weights) < 2:
+            ax1.text(0.5, 0.5, 'Недостаточно данных', ha='center', va='center')
+            ax2.text(0.5, 0.5, 'Недостаточно данных', ha='center', va='center')
+        else:
+            # График веса с выделением плато
+            ax1.plot(dates, weights, 'o-', color=colors['primary'],
+                    linewidth=2, markersize=6, label='Вес')
+
+            # Определяем зону плато
+            intervals = plateau_intervals(weights)
+            if intervals:
+                ax1.axvspan(dates[intervals[0][0]], dates[-1],
+                           color=colors['warning'], alpha=0.2,
+                           label='Зона плато')
+
+            # Прогноз после применения стратегий
+            future_dates = [dates[-1] + timedelta(days=i) for i in range(1, 15)]
+            projected_weights = []
+            current = weights[-1]
+            for i in range(14):
+                # Моделируем прорыв плато
+                if i < 7:
+                    current -= 0.05  # Медленное снижение
+                else:
+                    current -= 0.15  # Ускорение после адаптации
+                projected_weights.append(current)
+
+            ax1.plot(future_dates, projected_weights, '--',
+                    color=colors['success'], linewidth=2,
+                    alpha=0.7, label='Прогноз после адаптации')
+
+            ax1.set_title('План прорыва плато', fontsize=14, fontweight='bold')
+            ax1.set_xlabel('Дата')
+            ax1.set_ylabel('Вес (кг)')
+            ax1.legend()
+            ax1.grid(True, alpha=0.3)
+
+            # График калорий с циклированием
+            ax2.set_title('Стратегия циклирования калорий', fontsize=14, fontweight='bold')
+
+            if base_calories:
+                days = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+                calories = [
+                    base_calories - 300,  # Пн - низкие
+                    base_calories - 100,  # Вт - средние
+                    base_calories - 300,  # Ср - низкие
+                    base_calories,         # Чт - обычные
+                    base_calories - 300,  # Пт - низкие
+                    base_calories - 100,  # Сб - средние
+                    base_calories + 200   # Вс - рефид
+                ]
+
+                colors_cal = ['#EF5350' if c < base_calories - 200 else
+                             '#FFA726' if c < base_calories else
+                             '#66BB6A' for c in calories]
+
+                bars = ax2.bar(days, calories, color=colors_cal)
+                ax2.axhline(y=base_calories, color='blue', linestyle='--',
+                           alpha=0.5, label=f'Базовые калории ({base_calories})')
+
+                # Добавляем значения на столбцы
+                for bar, cal in zip(bars, calories):
+                    height = bar.get_height()
+                    ax2.text(bar.get_x() + bar.get_width()/2., height,
+                            f'{int(cal)}',
+                            ha='center', va='bottom')
+
+                ax2.set_ylabel('Калории')
+                ax2.legend()
+                ax2.grid(True, alpha=0.3, axis='y')
+
+        fig.tight_layout()
+        return _to_png(fig, bbox_inches='tight')
+
+
+def render_motivation_card(stats: Optional[Dict]) -> bytes:
+    """Мотивационная карточка с достижениями (stats=None - нет чек-инов)"""
+    colors = ANALYTICS_COLORS
+    with sns.axes_style(ANALYTICS_STYLE):
+        fig = plt.figure(figsize=(10, 14))
+
+        # Создаем красивый фон
+        ax = fig.add_subplot(111)
+        ax.set_xlim(0, 10)
+        ax.set_ylim(0, 14)
+        ax.axis('off')
+
+        # Градиентный фон
+        gradient = np.linspace(0, 1, 256).reshape(256, 1)
+        ax.imshow(gradient, extent=[0, 10, 0, 14], aspect='auto',
+                 cmap='RdYlGn', alpha=0.3)
+
+        # Заголовок
+        ax.text(5, 13, 'ТВОИ ДОСТИЖЕНИЯ', fontsize=24, fontweight='bold',
+               ha='center', color=colors['primary'])
+
+        if stats:
+            # Блок потери веса
+            if stats['weight_lost'] and stats['weight_lost'] > 0:
+                ax.add_patch(Rectangle((1, 10), 8, 1.5,
+                                      facecolor=colors['success'],
+                                      alpha=0.3, edgecolor='black'))
+                ax.text(5, 10.75, f'🏆 СБРОШЕНО: {stats["weight_lost"]:.1f} КГ',
+                       fontsize=18, fontweight='bold', ha='center')
+
+            # Серия дней
+            if stats['streak'] > 0:
+                ax.add_patch(Rectangle((1, 8), 8, 1.5,
+                                      facecolor=colors['warning'],
+                                      alpha=0.3, edgecolor='black'))
+                ax.text(5, 8.75, f'🔥 СЕРИЯ: {stats["streak"]} ДНЕЙ',
+                       fontsize=18, fontweight='bold', ha='center')
+
+            # Общее количество чек-инов
+            ax.add_patch(Rectangle((1, 6), 8, 1.5,
+                                  facecolor=colors['info'],
+                                  alpha=0.3, edgecolor='black'))
+            ax.text(5, 6.75, f'✅ ЧЕКИНОВ: {stats["checkins_count"]}',
+                   fontsize=18, fontweight='bold', ha='center')
+
+            # Средние показатели
+            if stats['avg_steps']:
+                ax.text(5, 4.5, f'👟 Среднее шагов: {stats["avg_steps"]:.0f}',
+                       fontsize=14, ha='center')
+
+            if stats['avg_water']:
+                ax.text(5, 3.5, f'💧 Среднее воды: {stats["avg_water"]:.1f}л',
+                       fontsize=14, ha='center')
+
+            # Мотивационная цитата
+            quotes = [
+                "Каждый день - это новая возможность!",
+                "Ты сильнее, чем думаешь!",
+                "Прогресс, а не совершенство!",
+                "Верь в себя и все получится!",
+                "Маленькие шаги ведут к большим целям!"
+            ]
+            quote = random.choice(quotes)
+
+            ax.text(5, 1.5, f'"{quote}"', fontsize=16,
+                   fontstyle='italic', ha='center',
+                   color=colors['dark'])
+
+            # Дата создания
+            ax.text(5, 0.5, datetime.now().strftime('%d.%m.%Y'),
+                   fontsize=10, ha='center', alpha=0.7)
+
+        return _to_png(fig, dpi=150, bbox_inches='tight')
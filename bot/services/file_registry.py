@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Union
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message, BufferedInputFile
+from redis.asyncio import Redis
+
+from database.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+FILE_ID_KEY = "file_id:{kind}:{digest}"
+
+# Telegram хранит загруженные файлы долго, но id может стать недействительным,
+# поэтому запись периодически обновляется
+FILE_ID_TTL = 30 * 24 * 3600
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _digest(data: bytes, filename: str = "") -> str:
+    sha = hashlib.sha256(data)
+    sha.update(filename.encode())
+    return sha.hexdigest()
+
+
+class FileIdRegistry:
+    """
+    Реестр file_id уже загруженных в Telegram файлов.
+    Одинаковые по содержимому графики и PDF отправляются по file_id
+    без повторной загрузки. Ключ - sha256 содержимого (для документов
+    вместе с именем файла, т.к. оно видно пользователю).
+    """
+
+    def __init__(self, redis: Redis, ttl: int = FILE_ID_TTL):
+        self.redis = redis
+        self.ttl = ttl
+        self.metrics = {"reused": 0, "uploaded": 0, "stale": 0}
+
+    async def _lookup(self, key: str) -> Optional[str]:
+        try:
+            file_id = await self.redis.get(key)
+        except Exception as e:
+            logger.warning(f"Реестр file_id недоступен: {e}")
+            return None
+        return file_id.decode() if isinstance(file_id, bytes) else file_id
+
+    async def _remember(self, key: str, file_id: str):
+        try:
+            await self.redis.set(key, file_id, ex=self.ttl)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить file_id: {e}")
+
+    async def _forget(self, key: str):
+        try:
+            await self.redis.delete(key)
+        except Exception as e:
+            logger.warning(f"Не удалось удалить устаревший file_id: {e}")
+
+    async def _send(self, kind: str, key: str, send, data: bytes, filename: str, **kwargs) -> Message:
+        file_id = await self._lookup(key)
+        if file_id:
+            try:
+                result = await send(file_id, **kwargs)
+                self.metrics["reused"] += 1
+                return result
+            except TelegramBadRequest as e:
+                # id устарел или принадлежит другому боту - загружаем заново
+                logger.info(f"file_id для {kind} недействителен, загружаю заново: {e}")
+                self.metrics["stale"] += 1
+                await self._forget(key)
+
+        result = await send(BufferedInputFile(data, filename=filename), **kwargs)
+        self.metrics["uploaded"] += 1
+
+        if kind == "photo" and result.photo:
+            await self._remember(key, result.photo[-1].file_id)
+        elif kind == "document" and result.document:
+            await self._remember(key, result.document.file_id)
+        return result
+
+    async def send_photo(self, message: Message, data: bytes, filename: str, **kwargs) -> Message:
+        """Отправляет изображение в чат message, переиспользуя file_id"""
+        key = FILE_ID_KEY.format(kind="photo", digest=_digest(data))
+        return await self._send("photo", key, message.answer_photo, data, filename, **kwargs)
+
+    async def send_document(
+        self,
+        message: Message,
+        document: Union[bytes, str],
+        filename: str,
+        **kwargs
+    ) -> Message:
+        """Отправляет документ (bytes или путь к файлу), переиспользуя file_id"""
+        if isinstance(document, str):
+            document = await asyncio.to_thread(_read_file, document)
+        key = FILE_ID_KEY.format(kind="document", digest=_digest(document, filename))
+        return await self._send("document", key, message.answer_document, document, filename, **kwargs)
+
+
+file_registry = FileIdRegistry(redis_client)
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from bot.config import settings
+from bot.services.fitness_tracker_integration import FitnessIntegrationService
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_LOG_INTERVAL = 60  # секунд между записями о прогрессе
+
+
+class FitnessSyncJob:
+    """
+    Массовая синхронизация фитнес-трекеров через очередь задач
+    (пользователь, сервис). Одновременно выполняется не больше
+    concurrency задач, перед каждой добавляется случайная задержка,
+    а квоты API соблюдаются внутри интеграций (TokenBucket на провайдера).
+    Задачи, не успевшие выполниться за window секунд, пропускаются.
+    """
+
+    def __init__(
+        self,
+        fitness_service: FitnessIntegrationService,
+        concurrency: int = None,
+        jitter: float = None,
+        window: float = None
+    ):
+        self.fitness_service = fitness_service
+        self.concurrency = concurrency or settings.FITNESS_SYNC_CONCURRENCY
+        self.jitter = jitter if jitter is not None else settings.FITNESS_SYNC_JITTER
+        self.window = window or settings.FITNESS_SYNC_WINDOW
+        self.metrics = Counter()
+        self.provider_metrics: Dict[str, Counter] = {}
+
+    def _jobs(self) -> List[Tuple[int, str]]:
+        return [
+            (user_id, service)
+            for user_id, services in list(self.fitness_service.user_integrations.items())
+            for service in services
+        ]
+
+    def _record(self, service: str, outcome: str):
+        self.metrics[outcome] += 1
+        self.provider_metrics.setdefault(service, Counter())[outcome] += 1
+
+    async def _worker(self, queue: asyncio.Queue, deadline: float):
+        while True:
+            try:
+                user_id, service = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+
+            try:
+                if self.jitter:
+                    await asyncio.sleep(random.uniform(0, self.jitter))
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._record(service, "skipped")
+                    continue
+
+                ok = await asyncio.wait_for(
+                    self.fitness_service.sync_service(user_id, service),
+                    timeout=remaining
+                )
+                self._record(service, "synced" if ok else "failed")
+            except asyncio.TimeoutError:
+                logger.warning(f"Синхронизация {service} для {user_id} не уложилась в окно")
+                self._record(service, "timed_out")
+            except Exception as e:
+                logger.error(f"Ошибка синхронизации {service} для {user_id}: {e}")
+                self._record(service, "failed")
+            finally:
+                queue.task_done()
+
+    async def _report_progress(self, total: int, started: float):
+        while True:
+            await asyncio.sleep(PROGRESS_LOG_INTERVAL)
+            done = sum(self.metrics.values())
+            logger.info(
+                f"Синхронизация трекеров: {done}/{total} за {time.monotonic() - started:.0f}с, "
+                f"{dict(self.metrics)}"
+            )
+
+    async def run(self) -> Dict:
+        """Выполняет синхронизацию всех подключенных сервисов и возвращает метрики"""
+        self.metrics.clear()
+        self.provider_metrics.clear()
+
+        jobs = self._jobs()
+        # Перемешиваем, чтобы при нехватке времени пропускались не всегда одни и те же
+        random.shuffle(jobs)
+        queue = asyncio.Queue()
+        for job in jobs:
+            queue.put_nowait(job)
+
+        started = time.monotonic()
+        deadline = started + self.window
+        progress = asyncio.create_task(self._report_progress(len(jobs), started))
+        try:
+            await asyncio.gather(*(
+                self._worker(queue, deadline)
+                for _ in range(min(self.concurrency, len(jobs)))
+            ))
+        finally:
+            progress.cancel()
+
+        summary = {
+            "total": len(jobs),
+            "duration": round(time.monotonic() - started, 1),
+            **self.metrics,
+            "providers": {name: dict(counter) for name, counter in self.provider_metrics.items()}
+        }
+        logger.info(f"Синхронизация трекеров завершена: {summary}")
+        return summary
@@ -1,20 +1,41 @@
 import logging
 import json
-from typing import Dict, Optional, List
-from datetime import datetime, timedelta
+from typing import Dict, Optional, List, Tuple
+from datetime import date, datetime, time, timedelta
 from abc import ABC, abstractmethod
-import aiohttp
 from sqlalchemy import select, and_
+from sqlalchemy.dialects.postgresql import insert
 
-from database.models import User, CheckIn
+from database.models import User, CheckIn, TrackerSyncState
 from database.connection import get_session
+from database.checkins import merge_checkins_bulk
 from bot.config import settings
+from bot.utils.timezone import user_local_date, parse_utc_offset
+from bot.utils.rate_limit import TokenBucket
+from bot.services.http_client import ProviderHttpClient
+from bot.services.token_store import TokenManager
 
 logger = logging.getLogger(__name__)
 
+EPOCH = datetime(1970, 1, 1)
+DAY_MILLIS = 86400000
+
+# Типы данных Google Fit для агрегированного запроса и поля результата
+AGGREGATE_TYPES = [
+    ("com.google.step_count.delta", "steps"),
+    ("com.google.calories.expended", "calories"),
+    ("com.google.distance.delta", "distance"),
+    ("com.google.active_minutes", "active_minutes"),
+    ("com.google.sleep.segment", "sleep_hours"),
+]
+# Стадии сегментов сна, которые считаются сном (сон, легкий, глубокий, REM)
+SLEEP_STAGES = {2, 4, 5, 6}
+
 class FitnessTrackerBase(ABC):
     """Базовый класс для интеграции с фитнес-трекерами"""
     
+    provider: str = None  # имя в TrackerSyncState и connected_services
+    
     @abstractmethod
     async def authenticate(self, user_id: int, auth_code: str) -> bool:
         """Аутентификация пользователя"""
@@ -29,11 +50,62 @@ class FitnessTrackerBase(ABC):
     async def sync_data(self, user_id: int, days_back: int = 7) -> bool:
         """Синхронизация данных за период"""
         pass
+    
+    async def _sync_window(self, session, user_id: int, tz_string: Optional[str], days_back: int) -> Tuple[date, bool]:
+        """
+        Первый день, который нужно запросить, и признак полной сверки.
+        Дни до отметки последней синхронизации считаются окончательными:
+        запрашиваются только день прошлой синхронизации и позже (минимум
+        вчера и сегодня). Раз в TRACKER_SYNC_FULL_INTERVAL_DAYS окно
+        days_back перезапрашивается целиком.
+        """
+        result = await session.execute(
+            select(TrackerSyncState).where(
+                and_(
+                    TrackerSyncState.user_id == user_id,
+                    TrackerSyncState.provider == self.provider
+                )
+            )
+        )
+        state = result.scalar_one_or_none()
+        
+        now_utc = datetime.utcnow()
+        today = user_local_date(tz_string, now_utc)
+        full_window_start = today - timedelta(days=days_back - 1)
+        
+        full_interval = timedelta(days=settings.TRACKER_SYNC_FULL_INTERVAL_DAYS)
+        if not state or not state.last_full_sync_at or now_utc - state.last_full_sync_at >= full_interval:
+            return full_window_start, True
+        
+        # Трекеры досылают данные с опозданием, поэтому день прошлой
+        # синхронизации запрашивается повторно
+        first_day = min(user_local_date(tz_string, state.last_synced_at), today - timedelta(days=1))
+        return max(first_day, full_window_start), False
+    
+    async def _save_sync_state(self, session, user_id: int, full: bool):
+        """Сдвигает отметку синхронизации (после успешной записи данных)"""
+        now_utc = datetime.utcnow()
+        stmt = insert(TrackerSyncState).values(
+            user_id=user_id,
+            provider=self.provider,
+            last_synced_at=now_utc,
+            last_full_sync_at=now_utc if full else None
+        )
+        update_set = {"last_synced_at": stmt.excluded.last_synced_at}
+        if full:
+            update_set["last_full_sync_at"] = stmt.excluded.last_full_sync_at
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[TrackerSyncState.user_id, TrackerSyncState.provider],
+            set_=update_set
+        ))
 
 class GoogleFitIntegration(FitnessTrackerBase):
     """Интеграция с Google Fit"""
     
-    def __init__(self):
+    provider = "google_fit"
+    
+    def __init__(self, http: Optional[ProviderHttpClient] = None):
+        self.http = http or ProviderHttpClient("google_fit")
         self.base_url = "https://www.googleapis.com/fitness/v1"
         self.oauth_url = "https://accounts.google.com/o/oauth2/v2/auth"
         self.token_url = "https://oauth2.googleapis.com/token"
@@ -43,8 +115,11 @@ class GoogleFitIntegration(FitnessTrackerBase):
         self.client_secret = getattr(settings, 'GOOGLE_FIT_CLIENT_SECRET', None)
         self.redirect_uri = getattr(settings, 'GOOGLE_FIT_REDIRECT_URI', "http://localhost:8080/callback")
         
-        # Хранилище токенов (в продакшене использовать Redis или БД)
-        self.user_tokens = {}
+        # Токены хранятся в User.fitness_tokens и обновляются заранее в фоне
+        self.tokens = TokenManager(self.provider, self._request_refresh)
+        
+        # Квота запросов к Google Fit API, общая для всех пользователей
+        self.quota = TokenBucket(settings.GOOGLE_FIT_RATE_LIMIT)
     
     def get_auth_url(self, user_id: int) -> str:
         """Получает URL для авторизации в Google Fit"""
@@ -78,80 +153,116 @@ class GoogleFitIntegration(FitnessTrackerBase):
             return False
         
         try:
-            async with aiohttp.ClientSession() as session:
-                data = {
-                    "code": auth_code,
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "redirect_uri": self.redirect_uri,
-                    "grant_type": "authorization_code"
-                }
+            session = self.http.session
+            data = {
+                "code": auth_code,
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "redirect_uri": self.redirect_uri,
+                "grant_type": "authorization_code"
+            }
                 
-                async with session.post(self.token_url, data=data) as response:
-                    if response.status == 200:
-                        tokens = await response.json()
-                        self.user_tokens[user_id] = {
-                            "access_token": tokens["access_token"],
-                            "refresh_token": tokens.get("refresh_token"),
-                            "expires_at": datetime.now() + timedelta(seconds=tokens["expires_in"])
-                        }
-                        
-                        # Сохраняем токены в БД
-                        await self.save_tokens(user_id, tokens)
-                        logger.info(f"Successfully authenticated user {user_id} with Google Fit")
-                        return True
-                    else:
-                        error = await response.text()
-                        logger.error(f"Failed to authenticate: {error}")
-                        return False
+            async with session.post(self.token_url, data=data) as response:
+                if response.status == 200:
+                    # Сохраняем токены в БД
+                    await self.tokens.put(user_id, await response.json())
+                    logger.info(f"Successfully authenticated user {user_id} with Google Fit")
+                    return True
+                else:
+                    error = await response.text()
+                    logger.error(f"Failed to authenticate: {error}")
+                    return False
                         
         except Exception as e:
             logger.error(f"Error during Google Fit authentication: {e}")
             return False
     
-    async def refresh_token(self, user_id: int) -> bool:
-        """Обновляет access token используя refresh token"""
-        tokens = self.user_tokens.get(user_id)
-        if not tokens or not tokens.get("refresh_token"):
-            return False
-        
-        try:
-            async with aiohttp.ClientSession() as session:
-                data = {
-                    "refresh_token": tokens["refresh_token"],
-                    "client_id": self.client_id,
-                    "client_secret": self.client_secret,
-                    "grant_type": "refresh_token"
-                }
-                
-                async with session.post(self.token_url, data=data) as response:
-                    if response.status == 200:
-                        new_tokens = await response.json()
-                        tokens["access_token"] = new_tokens["access_token"]
-                        tokens["expires_at"] = datetime.now() + timedelta(seconds=new_tokens["expires_in"])
-                        return True
-                        
-        except Exception as e:
-            logger.error(f"Error refreshing token: {e}")
+    async def _request_refresh(self, refresh_token: str) -> Optional[Dict]:
+        """Обменивает refresh token на новый access token (ответ Google или None)"""
+        data = {
+            "refresh_token": refresh_token,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "grant_type": "refresh_token"
+        }
         
-        return False
+        async with self.http.session.post(self.token_url, data=data) as response:
+            if response.status == 200:
+                return await response.json()
+            logger.error(f"Failed to refresh Google Fit token: {await response.text()}")
+            return None
     
     async def get_daily_data(self, user_id: int, date: datetime) -> Dict:
         """Получает данные о активности за день из Google Fit"""
-        # Проверяем и обновляем токен если нужно
-        tokens = self.user_tokens.get(user_id)
+        days = await self.get_range_data(user_id, date.date(), 1)
+        return (days or {}).get(date.date(), {})
+    
+    async def get_range_data(
+        self,
+        user_id: int,
+        first_day: date,
+        days: int,
+        tz_string: Optional[str] = None
+    ) -> Optional[Dict[date, Dict]]:
+        """
+        Получает данные за days дней начиная с first_day одним запросом
+        dataset:aggregate с разбиением по суткам пользователя.
+        Возвращает {день: данные}; None при ошибке.
+        """
+        # Токен из кэша или БД; истекающий обновляется до запроса
+        tokens = await self.tokens.get(user_id)
         if not tokens:
             logger.warning(f"No tokens for user {user_id}")
-            return {}
+            return None
         
-        if datetime.now() >= tokens["expires_at"]:
-            if not await self.refresh_token(user_id):
-                return {}
+        # Границы суток пользователя в миллисекундах UTC
+        offset = parse_utc_offset(tz_string)
+        start = datetime.combine(first_day, time.min) - offset
+        start_time = int((start - EPOCH).total_seconds() * 1000)
+        end_time = start_time + days * DAY_MILLIS
         
-        # Временные метки для запроса (начало и конец дня)
-        start_time = int(datetime.combine(date.date(), datetime.min.time()).timestamp() * 1000)
-        end_time = int(datetime.combine(date.date(), datetime.max.time()).timestamp() * 1000)
+        request = {
+            "aggregateBy": [{"dataTypeName": data_type} for data_type, _ in AGGREGATE_TYPES],
+            "bucketByTime": {"durationMillis": DAY_MILLIS},
+            "startTimeMillis": start_time,
+            "endTimeMillis": end_time
+        }
+        # Для шагов используем ту же оценку, что и приложение Google Fit
+        request["aggregateBy"][0]["dataSourceId"] = (
+            "derived:com.google.step_count.delta:com.google.android.gms:estimated_steps"
+        )
         
+        try:
+            await self.quota.acquire()
+            session = self.http.session
+            headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+            
+            async with session.post(
+                f"{self.base_url}/users/me/dataset:aggregate",
+                headers=headers,
+                json=request
+            ) as response:
+                if response.status != 200:
+                    logger.error(f"Google Fit aggregate failed for user {user_id}: {response.status}")
+                    return None
+                result = await response.json()
+        
+        except Exception as e:
+            logger.error(f"Error getting Google Fit data: {e}")
+            return None
+        
+        by_day = {}
+        for bucket in result.get("bucket", []):
+            bucket_start = int(bucket["startTimeMillis"])
+            day = first_day + timedelta(days=(bucket_start - start_time) // DAY_MILLIS)
+            by_day[day] = self._parse_bucket(bucket)
+        
+        logger.info(f"Retrieved Google Fit data for user {user_id}: {len(by_day)} days")
+        return by_day
+    
+    @staticmethod
+    def _parse_bucket(bucket: Dict) -> Dict:
+        """Суммирует точки одного суточного bucket по типам данных"""
         data = {
             "steps": 0,
             "calories": 0,
@@ -162,41 +273,18 @@ class GoogleFitIntegration(FitnessTrackerBase):
             "weight": None
         }
         
-        try:
-            async with aiohttp.ClientSession() as session:
-                headers = {"Authorization": f"Bearer {tokens['access_token']}"}
-                
-                # Получаем шаги
-                steps_data = {
-                    "aggregateBy": [{
-                        "dataTypeName": "com.google.step_count.delta",
-                        "dataSourceId": "derived:com.google.step_count.delta:com.google.android.gms:estimated_steps"
-                    }],
-                    "bucketByTime": {"durationMillis": 86400000},
-                    "startTimeMillis": start_time,
-                    "endTimeMillis": end_time
-                }
-                
-                async with session.post(
-                    f"{self.base_url}/users/me/dataset:aggregate",
-                    headers=headers,
-                    json=steps_data
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        if result.get("bucket"):
-                            for bucket in result["bucket"]:
-                                for dataset in bucket.get("dataset", []):
-                                    for point in dataset.get("point", []):
-                                        for value in point.get("value", []):
-                                            if value.get("intVal"):
-                                                data["steps"] += value["intVal"]
-                
-                logger.info(f"Retrieved Google Fit data for user {user_id}: {data}")
-                
-        except Exception as e:
-            logger.error(f"Error getting Google Fit data: {e}")
+        # Наборы данных идут в порядке aggregateBy запроса
+        for dataset, (_, field) in zip(bucket.get("dataset", []), AGGREGATE_TYPES):
+            for point in dataset.get("point", []):
+                if field == "sleep_hours":
+                    if point.get("value") and point["value"][0].get("intVal") in SLEEP_STAGES:
+                        nanos = int(point["endTimeNanos"]) - int(point["startTimeNanos"])
+                        data["sleep_hours"] += nanos / 3.6e12
+                    continue
+                for value in point.get("value", []):
+                    data[field] += value.get("intVal") or value.get("fpVal") or 0
         
+        data["sleep_hours"] = round(data["sleep_hours"], 1)
         return data
     
     async def sync_data(self, user_id: int, days_back: int = 7) -> bool:
@@ -205,60 +293,53 @@ class GoogleFitIntegration(FitnessTrackerBase):
             async with get_session() as session:
                 # Получаем пользователя
                 result = await session.execute(
-                    select(User).where(User.telegram_id == user_id)
+                    select(User.id, User.timezone).where(User.telegram_id == user_id)
                 )
-                user = result.scalar_one_or_none()
+                user = result.one_or_none()
                 
                 if not user:
                     return False
                 
-                # Синхронизируем данные за последние N дней
-                for i in range(days_back):
-                    date = datetime.now() - timedelta(days=i)
-                    
-                    # Получаем данные из Google Fit
-                    fit_data = await self.get_daily_data(user_id, date)
-                    
-                    if fit_data and fit_data.get("steps"):
-                        # Проверяем, есть ли уже чек-ин за этот день
-                        result = await session.execute(
-                            select(CheckIn).where(
-                                and_(
-                                    CheckIn.user_id == user.id,
-                                    CheckIn.date >= datetime.combine(date.date(), datetime.min.time()),
-                                    CheckIn.date <= datetime.combine(date.date(), datetime.max.time())
-                                )
-                            )
-                        )
-                        checkin = result.scalar_one_or_none()
-                        
-                        if not checkin:
-                            checkin = CheckIn(
-                                user_id=user.id,
-                                date=date
-                            )
-                            session.add(checkin)
-                        
-                        # Обновляем данные
-                        if fit_data.get("steps"):
-                            checkin.steps = fit_data["steps"]
-                        if fit_data.get("weight"):
-                            checkin.weight = fit_data["weight"]
-                        if fit_data.get("sleep_hours"):
-                            checkin.sleep_hours = fit_data["sleep_hours"]
-                        if fit_data.get("calories"):
-                            checkin.calories_burned = fit_data["calories"]
-                        if fit_data.get("active_minutes"):
-                            checkin.active_minutes = fit_data["active_minutes"]
-                        if fit_data.get("distance"):
-                            checkin.distance_km = fit_data["distance"] / 1000
-                        
-                        # Добавляем в tracker_data
-                        checkin.tracker_data = checkin.tracker_data or {}
-                        checkin.tracker_data["google_fit"] = {
-                            "synced_at": datetime.now().isoformat(),
-                            "raw_data": fit_data
-                        }
+                # Окончательные дни повторно не запрашиваются
+                first_day, full = await self._sync_window(session, user.id, user.timezone, days_back)
+            
+            # Все дни окна - одним запросом с разбиением по суткам пользователя
+            now = datetime.now()
+            today = user_local_date(user.timezone)
+            days_data = await self.get_range_data(
+                user_id, first_day, (today - first_day).days + 1, user.timezone
+            )
+            if days_data is None:
+                return False
+            
+            rows, patches, checkin_dates = {}, {}, {}
+            synced_at = now.isoformat()
+            for local_day, fit_data in days_data.items():
+                if not fit_data.get("steps"):
+                    continue
+                
+                # Нулевые значения не затирают введенные вручную (None = оставить как есть)
+                rows[local_day] = {
+                    "steps": fit_data["steps"],
+                    "weight": fit_data.get("weight") or None,
+                    "sleep_hours": fit_data.get("sleep_hours") or None,
+                    "calories_burned": fit_data.get("calories") or None,
+                    "active_minutes": fit_data.get("active_minutes") or None,
+                    "distance_km": fit_data["distance"] / 1000 if fit_data.get("distance") else None
+                }
+                # Добавляем в tracker_data, сохраняя данные других трекеров
+                patches[local_day] = {
+                    "google_fit": {
+                        "synced_at": synced_at,
+                        "raw_data": fit_data
+                    }
+                }
+                checkin_dates[local_day] = now - timedelta(days=(today - local_day).days)
+            
+            async with get_session() as session:
+                # Все дни записываются одним многострочным upsert
+                await merge_checkins_bulk(session, user.id, rows, "tracker_data", patches, checkin_dates)
+                await self._save_sync_state(session, user.id, full)
                 
                 await session.commit()
                 logger.info(f"Successfully synced Google Fit data for user {user_id}")
@@ -267,30 +348,17 @@ class GoogleFitIntegration(FitnessTrackerBase):
         except Exception as e:
             logger.error(f"Error syncing Google Fit data: {e}")
             return False
-    
-    async def save_tokens(self, user_id: int, tokens: Dict):
-        """Сохраняет токены в БД"""
-        async with get_session() as session:
-            result = await session.execute(
-                select(User).where(User.telegram_id == user_id)
-            )
-            user = result.scalar_one_or_none()
-            
-            if user:
-                user.fitness_tokens = user.fitness_tokens or {}
-                user.fitness_tokens["google_fit"] = {
-                    "access_token": tokens["access_token"],
-                    "refresh_token": tokens.get("refresh_token"),
-                    "expires_at": (datetime.now() + timedelta(seconds=tokens["expires_in"])).isoformat()
-                }
-                await session.commit()
 
 class FitnessIntegrationService:
     """Сервис управления интеграциями с фитнес-трекерами"""
     
     def __init__(self):
+        # У каждого провайдера своя долгоживущая HTTP-сессия (закрывается в close)
+        self.http_clients = {
+            "google_fit": ProviderHttpClient("google_fit"),
+        }
         self.integrations = {
-            "google_fit": GoogleFitIntegration(),
+            "google_fit": GoogleFitIntegration(self.http_clients["google_fit"]),
             # В будущем можно добавить:
             # "apple_health": AppleHealthIntegration(),
             # "fitbit": FitbitIntegration(),
@@ -298,6 +366,18 @@ class FitnessIntegrationService:
         }
         self.user_integrations = {}  # {user_id: ["google_fit", ...]}
     
+    async def start(self):
+        """Запускает фоновое обновление токенов провайдеров"""
+        for integration in self.integrations.values():
+            await integration.tokens.start()
+    
+    async def close(self):
+        """Останавливает обновление токенов и закрывает HTTP-сессии провайдеров"""
+        for integration in self.integrations.values():
+            await integration.tokens.stop()
+        for client in self.http_clients.values():
+            await client.close()
+    
     async def connect_service(self, user_id: int, service: str) -> Optional[str]:
         """Начинает процесс подключения сервиса"""
         if service not in self.integrations:
@@ -329,15 +409,22 @@ class FitnessIntegrationService:
         
         return success
     
+    async def sync_service(self, user_id: int, service: str) -> Optional[bool]:
+        """Синхронизирует один сервис пользователя (None - интеграция недоступна)"""
+        integration = self.integrations.get(service)
+        if not integration:
+            return None
+        return await integration.sync_data(user_id)
+    
     async def sync_all(self, user_id: int) -> Dict[str, bool]:
         """Синхронизирует данные со всеми подключенными сервисами"""
         results = {}
         
         if user_id in self.user_integrations:
             for service in self.user_integrations[user_id]:
-                integration = self.integrations.get(service)
-                if integration:
-                    results[service] = await integration.sync_data(user_id)
+                result = await self.sync_service(user_id, service)
+                if result is not None:
+                    results[service] = result
         
         return results
     
@@ -0,0 +1,55 @@
+import asyncio
+import logging
+from typing import Optional
+import aiohttp
+
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderHttpClient:
+    """
+    Долгоживущая HTTP-сессия для одного внешнего провайдера: пул
+    keep-alive соединений с лимитами, кэш DNS и таймаут на запрос.
+    Сессия создается при первом запросе (нужен запущенный event loop).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int = None,
+        limit_per_host: int = None,
+        timeout: float = None,
+        dns_ttl: int = None
+    ):
+        self.name = name
+        self.limit = limit or settings.INTEGRATION_HTTP_LIMIT
+        self.limit_per_host = limit_per_host or settings.INTEGRATION_HTTP_LIMIT_PER_HOST
+        self.timeout = timeout or settings.INTEGRATION_HTTP_TIMEOUT
+        self.dns_ttl = dns_ttl or settings.INTEGRATION_HTTP_DNS_TTL
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                ttl_dns_cache=self.dns_ttl,
+                keepalive_timeout=30
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            logger.info(f"HTTP-сессия {self.name} открыта")
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            # Даем закрыться SSL-соединениям, иначе aiohttp пишет предупреждения
+            await asyncio.sleep(0.25)
+            logger.info(f"HTTP-сессия {self.name} закрыта")
+        self._session = None
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from database.models import IngredientCategory
+from database.connection import get_session
+from bot.utils.text_match import KeywordMatcher, stem_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CATEGORY = "Другое"
+
+# Начальные ключевые слова категорий (работают без AI и без БД)
+SEED_KEYWORDS = {
+    "Мясо и птица": ["курица", "говядина", "свинина", "индейка", "фарш"],
+    "Рыба и морепродукты": ["рыба", "треска", "лосось", "креветки", "тунец"],
+    "Молочные продукты": ["молоко", "творог", "сыр", "йогурт", "кефир", "сметана"],
+    "Овощи": ["помидор", "огурец", "капуста", "морковь", "лук", "картофель", "перец", "кабачок"],
+    "Фрукты": ["яблоко", "банан", "апельсин", "груша", "ягоды"],
+    "Бакалея": ["рис", "гречка", "овсянка", "макароны", "паста", "киноа", "мука", "хлеб"]
+}
+
+
+class IngredientCategoryIndex:
+    """
+    Категории продуктов для списка покупок. Названия приводятся к основам
+    слов и ищутся в словаре, выученном из прошлых ответов AI (таблица
+    ingredient_categories), затем по ключевым словам. AI вызывается одним
+    запросом только для названий, которые еще не встречались.
+    """
+
+    def __init__(self):
+        self.matcher = KeywordMatcher(
+            (keyword, category) for category, keywords in SEED_KEYWORDS.items() for keyword in keywords
+        )
+        self.names: Dict[str, str] = {}
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self.metrics = {"learned": 0, "keyword": 0, "ai": 0, "unknown": 0}
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            try:
+                async with get_session() as session:
+                    result = await session.execute(
+                        select(IngredientCategory.name, IngredientCategory.category)
+                    )
+                    self.names.update(dict(result.all()))
+                logger.info(f"Загружено категорий продуктов: {len(self.names)}")
+            except Exception as e:
+                logger.error(f"Не удалось загрузить категории продуктов: {e}")
+            self._loaded = True
+
+    def lookup(self, name: str) -> Optional[str]:
+        """Категория по уже известным данным (без AI) или None"""
+        key = stem_text(name)
+        category = self.names.get(key)
+        if category:
+            self.metrics["learned"] += 1
+            return category
+        category = self.matcher.find_stemmed(key)
+        if category:
+            self.metrics["keyword"] += 1
+        return category
+
+    async def categorize(self, items: List[str], ai_service=None) -> Dict[str, List[str]]:
+        """
+        Группирует строки списка покупок ("Название - количество") по категориям.
+        Неизвестные названия один раз отправляются в AI и запоминаются.
+        """
+        await self._ensure_loaded()
+
+        categories = defaultdict(list)
+        unknown: Dict[str, List[str]] = defaultdict(list)
+        for item in items:
+            category = self.lookup(item)
+            if category:
+                categories[category].append(item)
+            else:
+                unknown[stem_text(item)].append(item)
+
+        learned = {}
+        if unknown and ai_service and ai_service.enabled:
+            learned = await self._learn(unknown, ai_service)
+
+        for key, key_items in unknown.items():
+            category = learned.get(key)
+            self.metrics["ai" if category else "unknown"] += 1
+            categories[category or DEFAULT_CATEGORY].extend(key_items)
+
+        return dict(categories)
+
+    async def _learn(self, unknown: Dict[str, List[str]], ai_service) -> Dict[str, str]:
+        """Категоризирует новые названия одним запросом к AI и сохраняет результат"""
+        names = [items[0].split(' - ', 1)[0].strip() for items in unknown.values()]
+        response = await ai_service.categorize_shopping_list(names)
+        if not response:
+            return {}
+
+        learned = {}
+        for category, category_names in response.items():
+            if not isinstance(category_names, list):
+                continue
+            for name in category_names:
+                key = stem_text(str(name))
+                if key in unknown:
+                    learned[key] = category
+        # Названия, которые AI не вернул дословно, не запоминаются: в этот раз
+        # они попадут в категорию по умолчанию, а в следующий будут запрошены снова
+        if not learned:
+            return {}
+
+        self.names.update(learned)
+        try:
+            async with get_session() as session:
+                stmt = insert(IngredientCategory).values([
+                    {"name": key[:200], "category": category[:100], "source": "ai"}
+                    for key, category in learned.items()
+                ]).on_conflict_do_nothing(index_elements=[IngredientCategory.name])
+                await session.execute(stmt)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить категории продуктов: {e}")
+
+        logger.info(f"AI категоризировал новых продуктов: {len(learned)}")
+        return learned
+
+
+ingredient_categories = IngredientCategoryIndex()
@@ -1,15 +1,25 @@
+import asyncio
 import json
+import logging
 import random
 from typing import Dict, List, Optional
 from database.models import User, Goal, MealStyle
+from bot.config import settings
 from bot.services.ai_service import AIService
+from bot.services.meal_plan_cache import meal_plan_cache
+from bot.services.model_client import model_client
+
+logger = logging.getLogger(__name__)
+
+MEAL_KEYS = ['breakfast', 'lunch', 'dinner', 'snack']
+NUTRIENT_KEYS = ['calories', 'protein', 'fats', 'carbs']
 
 class MealPlanGenerator:
     """Генератор планов питания на основе параметров пользователя"""
     
-    def __init__(self):
+    def __init__(self, ai_service: Optional[AIService] = None):
         # ========== ИНИЦИАЛИЗАЦИЯ AI СЕРВИСА ==========
-        self.ai_service = AIService()
+        self.ai_service = ai_service or AIService()
         
         # ========== НОВЫЙ КОД: База данных блюд ==========
         # В реальном проекте это должно быть в отдельной БД
@@ -231,15 +241,39 @@ class MealPlanGenerator:
             ]
         }
     
-    async def generate_weekly_plan(self, user: User) -> List[Dict]:
+    async def generate_weekly_plan(self, user: User, days: int = 7) -> List[Dict]:
         """
-        Генерирует план питания на неделю
-        ========== НОВЫЙ КОД: Основная логика генерации ==========
+        Генерирует план питания на неделю.
+        AI-режим задается MEAL_PLAN_WEEKLY_MODE: single - все дни одним запросом,
+        concurrent - дни запрашиваются параллельно (под общим лимитом AIService).
+        Если в кэше уже достаточно планов для похожего профиля, AI не вызывается.
+        Дни, которые AI не вернул, подбираются из локальной базы блюд.
         """
-        weekly_plan = []
+        ai_plans = []
+        if self.ai_service.enabled:
+            ai_plans = await meal_plan_cache.take(user, days)
+        if self.ai_service.enabled and not ai_plans:
+            if settings.MEAL_PLAN_WEEKLY_MODE == "concurrent":
+                # Все дни укладываются в тот же срок, что и неделя одним запросом
+                with model_client.deadline(settings.AI_WEEK_TIMEOUT):
+                    ai_plans = await asyncio.gather(
+                        *(self.ai_service.generate_meal_plan(user, day) for day in range(1, days + 1)),
+                        return_exceptions=True
+                    )
+            else:
+                ai_plans = await self.ai_service.generate_week_plan(user, days) or []
+            await meal_plan_cache.add(
+                user, [plan for plan in ai_plans if self._from_ai_plan(user, plan)]
+            )
         
-        for day in range(1, 8):  # 7 дней
-            day_plan = await self.generate_day_plan(user)
+        weekly_plan = []
+        for day in range(days):
+            ai_plan = ai_plans[day] if day < len(ai_plans) else None
+            day_plan = self._from_ai_plan(user, ai_plan)
+            if day_plan is None:
+                if self.ai_service.enabled:
+                    logger.warning(f"AI не вернул план на день {day + 1}, используется локальная база")
+                day_plan = self._local_day_plan(user)
             weekly_plan.append(day_plan)
         
         return weekly_plan
@@ -251,35 +285,52 @@ class MealPlanGenerator:
         """
         # ========== СНАЧАЛА ПРОБУЕМ AI ==========
         if self.ai_service.enabled:
-            try:
-                ai_plan = await self.ai_service.generate_meal_plan(user)
-                if ai_plan:
-                    # Добавляем итоговые подсчеты
-                    total_calories = 0
-                    total_protein = 0
-                    total_fats = 0
-                    total_carbs = 0
-                    
-                    for meal_key in ['breakfast', 'lunch', 'dinner', 'snack']:
-                        if meal_key in ai_plan and ai_plan[meal_key]:
-                            total_calories += ai_plan[meal_key]['calories']
-                            total_protein += ai_plan[meal_key]['protein']
-                            total_fats += ai_plan[meal_key]['fats']
-                            total_carbs += ai_plan[meal_key]['carbs']
-                    
-                    return {
-                        'breakfast': ai_plan.get('breakfast'),
-                        'lunch': ai_plan.get('lunch'),
-                        'dinner': ai_plan.get('dinner'),
-                        'snack': ai_plan.get('snack') if user.meal_count == 4 else None,
-                        'total_calories': total_calories,
-                        'total_protein': total_protein,
-                        'total_fats': total_fats,
-                        'total_carbs': total_carbs
-                    }
-            except Exception as e:
-                logger.error(f"Ошибка при генерации через AI: {e}")
+            cached = await meal_plan_cache.take(user)
+            day_plan = self._from_ai_plan(user, cached[0]) if cached else None
+            if day_plan:
+                return day_plan
+            
+            ai_plan = await self.ai_service.generate_meal_plan(user)
+            day_plan = self._from_ai_plan(user, ai_plan)
+            if day_plan:
+                await meal_plan_cache.add(user, [ai_plan])
+                return day_plan
         
+        return self._local_day_plan(user)
+    
+    def _from_ai_plan(self, user: User, ai_plan) -> Optional[Dict]:
+        """Приводит ответ AI к формату плана на день; None, если ответ непригоден"""
+        if not isinstance(ai_plan, dict):
+            return None
+        
+        try:
+            # Добавляем итоговые подсчеты
+            totals = dict.fromkeys(NUTRIENT_KEYS, 0)
+            for meal_key in MEAL_KEYS:
+                meal = ai_plan.get(meal_key)
+                if meal_key == 'snack' and (not meal or user.meal_count != 4):
+                    continue
+                if not meal:
+                    return None
+                for key in NUTRIENT_KEYS:
+                    totals[key] += meal[key]
+        except (KeyError, TypeError) as e:
+            logger.error(f"Некорректный план от AI: {e}")
+            return None
+        
+        return {
+            'breakfast': ai_plan.get('breakfast'),
+            'lunch': ai_plan.get('lunch'),
+            'dinner': ai_plan.get('dinner'),
+            'snack': ai_plan.get('snack') if user.meal_count == 4 else None,
+            'total_calories': totals['calories'],
+            'total_protein': totals['protein'],
+            'total_fats': totals['fats'],
+            'total_carbs': totals['carbs']
+        }
+    
+    def _local_day_plan(self, user: User) -> Dict:
+        """Подбирает план на день из локальной базы блюд"""
         # ========== FALLBACK: ИСПОЛЬЗУЕМ БАЗОВУЮ ГЕНЕРАЦИЮ ==========
         # Определяем категорию по цели
         goal_key = {
@@ -314,14 +365,15 @@ class MealPlanGenerator:
                                      for allergy in allergies)]
         
         # Выбираем случайные блюда
-        breakfast = random.choice(breakfast_options) if breakfast_options else self.get_default_meal("breakfast")
-        lunch = random.choice(lunch_options) if lunch_options else self.get_default_meal("lunch")
-        dinner = random.choice(dinner_options) if dinner_options else self.get_default_meal("dinner")
+        # (копии, т.к. порции ниже масштабируются)
+        breakfast = dict(random.choice(breakfast_options) if breakfast_options else self.get_default_meal("breakfast"))
+        lunch = dict(random.choice(lunch_options) if lunch_options else self.get_default_meal("lunch"))
+        dinner = dict(random.choice(dinner_options) if dinner_options else self.get_default_meal("dinner"))
         
         # Добавляем перекус если нужно 4 приема пищи
         snack = None
         if user.meal_count == 4:
-            snack = random.choice(self.meal_database["snack"])
+            snack = dict(random.choice(self.meal_database["snack"]))
         
         # Подсчитываем итоги
         total_calories = breakfast['calories'] + lunch['calories'] + dinner['calories']
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import logging
+import random
+from typing import Dict, List
+from redis.asyncio import Redis
+
+from bot.config import settings
+from database.cache import redis_client
+from database.models import User
+
+logger = logging.getLogger(__name__)
+
+# Шаги округления параметров профиля: пользователи с близкими параметрами
+# получают один ключ и общий пул планов
+CALORIES_STEP = 50
+MACROS_STEP = 10
+AGE_STEP = 5
+WEIGHT_STEP = 5
+HEIGHT_STEP = 5
+
+
+def _bucket(value, step: int):
+    if value is None:
+        return None
+    return int(round(value / step) * step)
+
+
+def profile_key(user: User) -> str:
+    """Нормализованный ключ профиля из тех же полей, что входят в промпт Gemini"""
+    allergies = []
+    if user.food_preferences and user.food_preferences.get('allergies'):
+        allergies = sorted({a.strip().lower() for a in user.food_preferences['allergies']})
+
+    profile = {
+        "gender": user.gender.value if user.gender else None,
+        "age": _bucket(user.age, AGE_STEP),
+        "weight": _bucket(user.current_weight, WEIGHT_STEP),
+        "height": _bucket(user.height, HEIGHT_STEP),
+        "goal": user.goal.value if user.goal else None,
+        "calories": _bucket(user.daily_calories, CALORIES_STEP),
+        "protein": _bucket(user.daily_protein, MACROS_STEP),
+        "fats": _bucket(user.daily_fats, MACROS_STEP),
+        "carbs": _bucket(user.daily_carbs, MACROS_STEP),
+        "meal_count": user.meal_count,
+        "budget": user.budget,
+        "allergies": allergies,
+    }
+    return hashlib.sha1(json.dumps(profile, sort_keys=True).encode()).hexdigest()[:20]
+
+
+class MealPlanCache:
+    """
+    Пул сгенерированных AI планов на день для группы похожих профилей.
+    Каждая группа - список в Redis не длиннее pool_size (старые варианты
+    вытесняются новыми), срок жизни продлевается при каждом обращении,
+    поэтому неиспользуемые группы удаляются по TTL.
+    """
+
+    def __init__(self, redis: Redis, pool_size: int = None, min_variants: int = None, ttl: int = None):
+        self.redis = redis
+        self.pool_size = pool_size or settings.MEAL_PLAN_POOL_SIZE
+        self.min_variants = min_variants or settings.MEAL_PLAN_POOL_MIN
+        self.ttl = ttl or settings.MEAL_PLAN_CACHE_TTL
+        self.metrics = {"hits": 0, "misses": 0, "errors": 0}
+
+    @staticmethod
+    def _key(user: User) -> str:
+        return f"meal_plan_pool:{profile_key(user)}"
+
+    async def take(self, user: User, count: int = 1) -> List[Dict]:
+        """
+        Возвращает count разных планов из пула группы пользователя
+        или пустой список, если вариантов пока слишком мало.
+        """
+        key = self._key(user)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.lrange(key, 0, -1)
+                pipe.expire(key, self.ttl)
+                variants, _ = await pipe.execute()
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.warning(f"Кэш планов питания недоступен: {e}")
+            return []
+
+        if len(variants) < max(count, self.min_variants):
+            self.metrics["misses"] += 1
+            return []
+
+        self.metrics["hits"] += 1
+        logger.debug(f"Кэш планов питания: попадание для user {user.telegram_id}, {self.metrics}")
+        return [json.loads(variant) for variant in random.sample(variants, count)]
+
+    async def add(self, user: User, plans: List[Dict]):
+        """Добавляет сгенерированные планы в пул группы пользователя"""
+        if not plans:
+            return
+
+        key = self._key(user)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.lpush(key, *(json.dumps(plan, ensure_ascii=False) for plan in plans))
+                pipe.ltrim(key, 0, self.pool_size - 1)
+                pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            self.metrics["errors"] += 1
+            logger.warning(f"Не удалось сохранить планы питания в кэш: {e}")
+
+
+meal_plan_cache = MealPlanCache(redis_client)
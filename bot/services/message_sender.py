@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+from itertools import islice
+from typing import Dict, Iterable, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError, TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+    TelegramNetworkError, TelegramServerError
+)
+
+from bot.config import settings
+from bot.utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Сколько отправок рассылки создается одновременно (остальные ждут своей пачки)
+BROADCAST_CHUNK_SIZE = 500
+
+
+class MessageSender:
+    """
+    Общий движок исходящих сообщений для рассылок и напоминаний:
+    глобальный лимит скорости, пауза между сообщениями в один чат,
+    автоматическое ожидание RetryAfter и ограничение параллельности.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        rate: float = None,
+        per_chat_interval: float = None,
+        max_concurrency: int = None,
+        max_retries: int = None
+    ):
+        self.bot = bot
+        self.bucket = TokenBucket(rate or settings.MESSAGE_RATE_LIMIT)
+        self.per_chat_interval = per_chat_interval if per_chat_interval is not None else settings.MESSAGE_PER_CHAT_INTERVAL
+        self.semaphore = asyncio.Semaphore(max_concurrency or settings.MESSAGE_MAX_CONCURRENCY)
+        self.max_retries = max_retries if max_retries is not None else settings.MESSAGE_MAX_RETRIES
+
+        self._chat_next_slot: Dict[int, float] = {}
+        self._paused_until = 0.0
+        self.metrics = {
+            "sent": 0,
+            "failed": 0,
+            "blocked": 0,
+            "retried": 0,
+            "flood_waits": 0
+        }
+
+    async def _wait_for_chat_slot(self, chat_id: int):
+        """Соблюдает минимальный интервал между сообщениями в один чат"""
+        now = time.monotonic()
+        slot = max(now, self._chat_next_slot.get(chat_id, 0.0))
+        self._chat_next_slot[chat_id] = slot + self.per_chat_interval
+
+        if len(self._chat_next_slot) > 10000:
+            self._chat_next_slot = {
+                cid: ts for cid, ts in self._chat_next_slot.items() if ts > now
+            }
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def _wait_for_flood_pause(self):
+        """Ждет окончания глобальной паузы после RetryAfter"""
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def send_message(self, chat_id: int, text: str, **kwargs) -> bool:
+        """Отправляет сообщение с учетом всех лимитов. Возвращает True при успехе."""
+        async with self.semaphore:
+            await self._wait_for_chat_slot(chat_id)
+
+            for attempt in range(self.max_retries + 1):
+                await self._wait_for_flood_pause()
+                await self.bucket.acquire()
+
+                try:
+                    await self.bot.send_message(chat_id, text, **kwargs)
+                    self.metrics["sent"] += 1
+                    return True
+
+                except TelegramRetryAfter as e:
+                    # Flood control действует на весь бот - приостанавливаем все отправки
+                    self.metrics["flood_waits"] += 1
+                    self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+                    logger.warning(f"Flood control: пауза {e.retry_after}с (чат {chat_id})")
+
+                except TelegramForbiddenError:
+                    # Пользователь заблокировал бота - повторять бессмысленно
+                    self.metrics["blocked"] += 1
+                    logger.info(f"Пользователь {chat_id} заблокировал бота")
+                    return False
+
+                except TelegramBadRequest as e:
+                    self.metrics["failed"] += 1
+                    logger.error(f"Не удалось отправить сообщение {chat_id}: {e}")
+                    return False
+
+                except (TelegramNetworkError, TelegramServerError) as e:
+                    logger.warning(f"Временная ошибка при отправке {chat_id}: {e}")
+                    await asyncio.sleep(2 ** attempt)
+
+                except TelegramAPIError as e:
+                    self.metrics["failed"] += 1
+                    logger.error(f"Ошибка Telegram при отправке {chat_id}: {e}")
+                    return False
+
+                except Exception as e:
+                    self.metrics["failed"] += 1
+                    logger.error(f"Не удалось отправить сообщение {chat_id}: {e}", exc_info=True)
+                    return False
+
+                if attempt < self.max_retries:
+                    self.metrics["retried"] += 1
+
+            self.metrics["failed"] += 1
+            logger.error(f"Сообщение для {chat_id} не доставлено после {self.max_retries + 1} попыток")
+            return False
+
+    async def broadcast(self, messages: Iterable[Tuple[int, str, Optional[Dict]]]) -> Dict[str, int]:
+        """
+        Рассылает пачку сообщений (chat_id, text, kwargs) с учетом лимитов.
+        Возвращает статистику доставки этой рассылки.
+        """
+        started = time.monotonic()
+        messages = iter(messages)
+        results = []
+        while True:
+            chunk = list(islice(messages, BROADCAST_CHUNK_SIZE))
+            if not chunk:
+                break
+            # Ошибка одного получателя не должна прерывать всю рассылку
+            results.extend(await asyncio.gather(
+                *(self.send_message(chat_id, text, **(kwargs or {})) for chat_id, text, kwargs in chunk),
+                return_exceptions=True
+            ))
+
+        delivered = sum(1 for ok in results if ok is True)
+        summary = {
+            "total": len(results),
+            "delivered": delivered,
+            "failed": len(results) - delivered
+        }
+        if results:
+            logger.info(
+                f"Рассылка: доставлено {delivered}/{len(results)} "
+                f"за {time.monotonic() - started:.1f}с, всего метрики: {self.metrics}"
+            )
+        return summary
@@ -0,0 +1,345 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from bot.config import settings
+from database.cache import redis_client
+from bot.utils.lazy import lazy_import
+
+logger = logging.getLogger(__name__)
+
+genai = lazy_import("google.generativeai")
+
+# HTTP-коды ошибок Gemini (google.api_core), после которых есть смысл повторить запрос
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+# Как часто проверять ответ, который получает другая реплика, секунд
+DEDUP_POLL_INTERVAL = 0.25
+
+# Абсолютный срок (time.monotonic()) для всех запросов текущей задачи
+_deadline: ContextVar[Optional[float]] = ContextVar("ai_deadline", default=None)
+
+
+class CircuitOpenError(Exception):
+    """Gemini временно считается недоступным, запрос не отправлялся"""
+
+
+class ModelClient:
+    """
+    Общий клиент Gemini для всех сервисов: глобальный лимит и лимиты по
+    функциям, таймаут с учетом общего срока задачи, повторы с джиттером
+    на временных ошибках и предохранитель, который после серии сбоев
+    сразу отказывает, чтобы сервисы переходили на локальные варианты.
+    Для каждой функции собираются метрики задержки и токенов.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = None,
+        feature_limits: Dict[str, int] = None,
+        timeout: float = None,
+        max_retries: int = None,
+        breaker_threshold: int = None,
+        breaker_cooldown: float = None
+    ):
+        self.semaphore = asyncio.Semaphore(max_concurrency or settings.AI_CONCURRENCY)
+        self.feature_limits = feature_limits if feature_limits is not None else settings.AI_FEATURE_CONCURRENCY
+        self.timeout = timeout or settings.AI_TIMEOUT
+        self.max_retries = max_retries if max_retries is not None else settings.AI_MAX_RETRIES
+        self.breaker_threshold = breaker_threshold or settings.AI_BREAKER_THRESHOLD
+        self.breaker_cooldown = breaker_cooldown or settings.AI_BREAKER_COOLDOWN
+
+        self._feature_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._models = {}
+        self._configured = False
+
+        # Предохранитель: число сбоев подряд и время, до которого запросы не отправляются
+        self._failures = 0
+        self._open_until = 0.0
+        self._probing = False
+
+        # Одинаковые запросы в процессе: {ключ промпта: задача}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.redis = redis_client
+
+        self.metrics: Dict[str, Dict] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.GEMINI_API_KEY)
+
+    def get_model(self, model_name: str = None):
+        """Модель Gemini (создается один раз на имя модели)"""
+        model_name = model_name or settings.AI_MODEL
+        if not self._configured:
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+            self._configured = True
+        if model_name not in self._models:
+            self._models[model_name] = genai.GenerativeModel(model_name)
+        return self._models[model_name]
+
+    @staticmethod
+    @contextmanager
+    def deadline(seconds: float):
+        """Общий срок для всех запросов к Gemini внутри блока (вложенный срок не продлевает внешний)"""
+        new_deadline = time.monotonic() + seconds
+        current = _deadline.get()
+        token = _deadline.set(min(current, new_deadline) if current else new_deadline)
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+
+    def _feature_metrics(self, feature: str) -> Dict:
+        if feature not in self.metrics:
+            self.metrics[feature] = {
+                "calls": 0,
+                "errors": 0,
+                "retries": 0,
+                "timeouts": 0,
+                "rejected": 0,
+                "deduplicated": 0,
+                "latency_total": 0.0,
+                "latency_max": 0.0,
+                "prompt_tokens": 0,
+                "output_tokens": 0
+            }
+        return self.metrics[feature]
+
+    def _feature_semaphore(self, feature: str) -> Optional[asyncio.Semaphore]:
+        limit = self.feature_limits.get(feature)
+        if not limit:
+            return None
+        if feature not in self._feature_semaphores:
+            self._feature_semaphores[feature] = asyncio.Semaphore(limit)
+        return self._feature_semaphores[feature]
+
+    def _check_circuit(self):
+        """Пропускает запрос или сразу отказывает, пока предохранитель разомкнут"""
+        if self._failures < self.breaker_threshold:
+            return
+        if time.monotonic() < self._open_until or self._probing:
+            raise CircuitOpenError("Gemini временно недоступен")
+        # Время ожидания прошло - пропускаем один пробный запрос
+        self._probing = True
+
+    def _record_result(self, success: bool):
+        self._probing = False
+        if success:
+            if self._failures >= self.breaker_threshold:
+                logger.info("Gemini снова доступен, предохранитель замкнут")
+            self._failures = 0
+            return
+
+        self._failures += 1
+        if self._failures >= self.breaker_threshold:
+            self._open_until = time.monotonic() + self.breaker_cooldown
+            logger.warning(
+                f"Gemini: {self._failures} сбоев подряд, запросы приостановлены на {self.breaker_cooldown:.0f}с"
+            )
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+            return True
+        return getattr(error, "code", None) in RETRYABLE_CODES
+
+    async def _call(self, feature: str, model, contents, generation_config, timeout: float):
+        # Ожидание слотов входит в timeout попытки и в общий срок задачи
+        return await asyncio.wait_for(
+            self._call_limited(feature, model, contents, generation_config),
+            timeout
+        )
+
+    async def _call_limited(self, feature: str, model, contents, generation_config):
+        # Сначала лимит функции, потом общий: задачи, упершиеся в свой лимит,
+        # не занимают общие слоты, нужные другим функциям
+        async with self._feature_semaphore(feature) or nullcontext():
+            async with self.semaphore:
+                return await model.generate_content_async(
+                    contents=contents, generation_config=generation_config
+                )
+
+    async def generate(
+        self,
+        feature: str,
+        contents,
+        generation_config=None,
+        model_name: str = None,
+        timeout: float = None
+    ):
+        """
+        Запрос generate_content_async с лимитами, таймаутом и повторами.
+        feature - имя вызывающей функции (для лимитов и метрик).
+        Бросает CircuitOpenError, если Gemini временно считается недоступным,
+        и исходную ошибку, если повторы не помогли.
+        """
+        metrics = self._feature_metrics(feature)
+        # До проверки предохранителя: ошибка создания модели не должна
+        # оставить пробный запрос висеть
+        model = self.get_model(model_name)
+        try:
+            self._check_circuit()
+        except CircuitOpenError:
+            metrics["rejected"] += 1
+            raise
+
+        timeout = timeout or self.timeout
+        attempt = 0
+
+        while True:
+            attempt_timeout = timeout
+            deadline = _deadline.get()
+            if deadline is not None:
+                attempt_timeout = min(timeout, deadline - time.monotonic())
+
+            metrics["calls"] += 1
+            started = time.monotonic()
+            try:
+                if attempt_timeout <= 0:
+                    raise asyncio.TimeoutError()
+                response = await self._call(feature, model, contents, generation_config, attempt_timeout)
+            except asyncio.CancelledError:
+                # Отмененный пробный запрос не должен оставить предохранитель разомкнутым
+                self._probing = False
+                raise
+            except Exception as e:
+                metrics["errors"] += 1
+                if isinstance(e, asyncio.TimeoutError):
+                    metrics["timeouts"] += 1
+
+                if not self._is_retryable(e):
+                    # Ошибки запроса (некорректный промпт и т.п.) ничего не говорят
+                    # о доступности Gemini: состояние предохранителя не меняется
+                    self._probing = False
+                    raise
+                if attempt >= self.max_retries:
+                    self._record_result(False)
+                    raise
+
+                # Экспоненциальная пауза с полным джиттером, в пределах общего срока
+                delay = random.uniform(0, settings.AI_RETRY_BASE_DELAY * 2 ** attempt)
+                if deadline is not None and time.monotonic() + delay >= deadline:
+                    self._record_result(False)
+                    raise
+                attempt += 1
+                metrics["retries"] += 1
+                logger.warning(f"Gemini ({feature}): {type(e).__name__}, повтор {attempt} через {delay:.1f}с")
+                await asyncio.sleep(delay)
+                continue
+
+            latency = time.monotonic() - started
+            metrics["latency_total"] += latency
+            metrics["latency_max"] = max(metrics["latency_max"], latency)
+            usage = getattr(response, "usage_metadata", None)
+            if usage:
+                metrics["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+                metrics["output_tokens"] += getattr(usage, "candidates_token_count", 0) or 0
+            self._record_result(True)
+            return response
+
+    @staticmethod
+    def _prompt_key(feature: str, prompt: str, generation_config, model_name: str) -> str:
+        payload = "\x00".join([feature, model_name or settings.AI_MODEL, repr(generation_config), prompt])
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def generate_text(
+        self,
+        feature: str,
+        prompt: str,
+        generation_config=None,
+        model_name: str = None,
+        timeout: float = None
+    ) -> str:
+        """
+        Текст ответа на текстовый промпт. Одинаковые одновременные запросы
+        (двойное нажатие, несколько реплик бота) отправляются в Gemini один раз:
+        в процессе - через общую задачу, между репликами - через блокировку
+        и ключ результата в Redis.
+        """
+        key = self._prompt_key(feature, prompt, generation_config, model_name)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(
+                self._generate_shared(key, feature, prompt, generation_config, model_name, timeout)
+            )
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._feature_metrics(feature)["deduplicated"] += 1
+        return await asyncio.shield(task)
+
+    async def _generate_shared(self, key: str, feature: str, prompt: str, generation_config, model_name, timeout) -> str:
+        lock_key, result_key = f"ai_lock:{key}", f"ai_result:{key}"
+        metrics = self._feature_metrics(feature)
+
+        try:
+            cached = await self.redis.get(result_key)
+            if cached is not None:
+                metrics["deduplicated"] += 1
+                return cached.decode()
+            owner = await self.redis.set(lock_key, 1, nx=True, ex=settings.AI_DEDUP_LOCK_TTL)
+        except Exception as e:
+            # Без Redis дедупликация только в пределах процесса
+            logger.warning(f"Redis недоступен для дедупликации запросов Gemini: {e}")
+            response = await self.generate(feature, prompt, generation_config, model_name, timeout)
+            return response.text
+
+        if not owner:
+            text = await self._wait_for_result(lock_key, result_key)
+            if text is not None:
+                metrics["deduplicated"] += 1
+                return text
+            # Другая реплика не получила ответ - выполняем запрос сами
+
+        try:
+            response = await self.generate(feature, prompt, generation_config, model_name, timeout)
+            text = response.text
+            try:
+                await self.redis.set(result_key, text, ex=settings.AI_DEDUP_RESULT_TTL)
+            except Exception as e:
+                logger.warning(f"Не удалось сохранить ответ Gemini для дедупликации: {e}")
+            return text
+        finally:
+            if owner:
+                try:
+                    await self.redis.delete(lock_key)
+                except Exception:
+                    pass
+
+    async def _wait_for_result(self, lock_key: str, result_key: str) -> Optional[str]:
+        """Ждет ответ, который получает другая реплика, пока жива ее блокировка"""
+        deadline = _deadline.get()
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                await asyncio.sleep(DEDUP_POLL_INTERVAL)
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    pipe.get(result_key)
+                    pipe.exists(lock_key)
+                    result, locked = await pipe.execute()
+                if result is not None:
+                    return result.decode()
+                if not locked:
+                    return None
+        except Exception as e:
+            logger.warning(f"Ошибка ожидания ответа Gemini в Redis: {e}")
+        return None
+
+    def report(self) -> Dict[str, Dict]:
+        """Сводка метрик по функциям со средней задержкой успешного запроса"""
+        report = {}
+        for feature, metrics in self.metrics.items():
+            succeeded = metrics["calls"] - metrics["errors"]
+            report[feature] = {
+                **metrics,
+                "latency_avg": metrics["latency_total"] / succeeded if succeeded else 0.0
+            }
+        return report
+
+
+model_client = ModelClient()
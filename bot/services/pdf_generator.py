@@ -1,7 +1,7 @@
 import os
 import logging
 from datetime import datetime
-from typing import List, Dict
+from typing import List, Dict, Optional
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -14,20 +14,33 @@ from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from bot.config import settings
 from database.models import User, MealPlan, Goal
 from bot.services.ai_service import AIService
+from bot.services.ingredient_categories import ingredient_categories
 
 logger = logging.getLogger(__name__)
 
-pdfmetrics.registerFont(TTFont('DejaVu', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'))
-pdfmetrics.registerFont(TTFont('DejaVu-Bold', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'))
+_fonts_registered = False
+
+
+def _register_fonts():
+    # Чтение TTF занимает заметное время, поэтому делается при первой генерации,
+    # а не при импорте модуля
+    global _fonts_registered
+    if _fonts_registered:
+        return
+    pdfmetrics.registerFont(TTFont('DejaVu', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'))
+    pdfmetrics.registerFont(TTFont('DejaVu-Bold', '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf'))
+    _fonts_registered = True
 
 
 class PDFGenerator:
     """Генератор PDF документов"""
     
-    def __init__(self):
+    def __init__(self, ai_service: Optional[AIService] = None):
         # ========== НАСТРОЙКА PDF ==========
+        self.ai_service = ai_service
         self.pdf_dir = settings.PDF_DIR
         os.makedirs(self.pdf_dir, exist_ok=True)
+        _register_fonts()
         
         # Попытка зарегистрировать кириллические шрифты
         try:
@@ -57,7 +70,10 @@ class PDFGenerator:
             rightMargin=20*mm,
             leftMargin=20*mm,
             topMargin=20*mm,
-            bottomMargin=20*mm
+            bottomMargin=20*mm,
+            # Без даты создания и случайного ID: одинаковый план дает
+            # одинаковый файл, и повторная отправка идет по file_id
+            invariant=1
         )
         
         # Стили
@@ -217,7 +233,8 @@ class PDFGenerator:
             rightMargin=20*mm,
             leftMargin=20*mm,
             topMargin=20*mm,
-            bottomMargin=20*mm
+            bottomMargin=20*mm,
+            invariant=1
         )
         
         styles = getSampleStyleSheet()
@@ -259,12 +276,11 @@ class PDFGenerator:
     
     async def _generate_shopping_list(self, meal_plans: List[MealPlan]) -> Dict[str, List[str]]:
         """
-        Генерирует и категоризирует список покупок, 
-        предпочитая категоризацию через AI.
+        Генерирует и категоризирует список покупок.
+        Категории берутся из словаря продуктов, AI вызывается только для новых названий.
         """
         import re
         from collections import defaultdict
-        from bot.services.ai_service import AIService
 
         # === Шаг 1: Сбор и суммирование всех ингредиентов ===
         summable_ingredients = defaultdict(lambda: defaultdict(float))
@@ -299,38 +315,8 @@ class PDFGenerator:
         for item, amounts in misc_ingredients.items():
             final_items_list.append(f"{item} - {', '.join(sorted(list(set(amounts))))}")
         
-        # === Шаг 3: Попытка категоризации через AI ===
-        ai_service = AIService()
-        if ai_service.enabled and final_items_list:
-            categorized_by_ai = await ai_service.categorize_shopping_list(final_items_list)
-            if categorized_by_ai:
-                return categorized_by_ai
-
-
-        logger.warning("AI категоризация не удалась, используется ручной метод.")
-        categories = defaultdict(list)
-        keywords = {
-            "Мясо и птица": ["курица", "говядина", "свинина", "индейка", "фарш"],
-            "Рыба и морепродукты": ["рыба", "треска", "лосось", "креветки", "тунец"],
-            "Молочные продукты": ["молоко", "творог", "сыр", "йогурт", "кефир", "сметана"],
-            "Овощи": ["помидор", "огурец", "капуста", "морковь", "лук", "картофель", "перец", "кабачок"],
-            "Фрукты": ["яблоко", "банан", "апельсин", "груша", "ягоды"],
-            "Бакалея": ["рис", "гречка", "овсянка", "макароны", "паста", "киноа", "мука", "хлеб"]
-        }
-
-        for item_str in final_items_list:
-            item_name = item_str.split(' - ')[0]
-            categorized = False
-            for category, keys in keywords.items():
-                if any(key in item_name.lower() for key in keys):
-                    categories[category].append(item_str)
-                    categorized = True
-                    break
-            if not categorized:
-                categories["Другое"].append(item_str)
-        logger.warning("AI категоризация не удалась или выключена. Список покупок будет пустым.")
-        #return {}
-        return dict(categories) # Возвращаем обычный dict для совместимости
+        # === Шаг 3: Категоризация (AI - только для новых названий) ===
+        return await ingredient_categories.categorize(final_items_list, self.ai_service)
     
     def _get_goal_text(self, goal: Goal) -> str:
         """Получить текстовое описание цели"""
@@ -1,13 +1,17 @@
 import logging
 import base64
 from typing import Optional, Dict
-import google.generativeai as genai
-from PIL import Image
 
 from bot.config import settings
+from bot.utils.lazy import lazy_import
+from bot.services.model_client import model_client, CircuitOpenError
 
 logger = logging.getLogger(__name__)
 
+Image = lazy_import("PIL.Image")
+
+VISION_MODEL = "gemini-1.5-flash"
+
 class PhotoAnalyzer:
     """Анализатор фото еды через AI"""
     
@@ -19,9 +23,8 @@ class PhotoAnalyzer:
         self.enabled = False
         if settings.GEMINI_API_KEY:
             try:
-                genai.configure(api_key=settings.GEMINI_API_KEY)
                 # Используем модель с поддержкой изображений
-                self.model = genai.GenerativeModel('gemini-1.5-flash')
+                model_client.get_model(VISION_MODEL)
                 self.enabled = True
                 logger.info("Анализатор фото инициализирован с Gemini Vision")
             except Exception as e:
@@ -66,7 +69,7 @@ class PhotoAnalyzer:
             """
             
             # Отправляем запрос к Gemini
-            response = await self.model.generate_content_async([prompt, img])
+            response = await model_client.generate("photo", [prompt, img], model_name=VISION_MODEL)
             
             # Парсим ответ
             try:
@@ -94,6 +97,8 @@ class PhotoAnalyzer:
                     "carbs": 0
                 }
                 
+        except CircuitOpenError:
+            return None
         except Exception as e:
             logger.error(f"Ошибка при анализе фото: {e}")
             return None
@@ -1,16 +1,43 @@
 import logging
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Tuple
-from sqlalchemy import select, and_, func
-import numpy as np
+from sqlalchemy import select, and_, func, update
 
 from database.models import User, CheckIn, MealPlan, Goal, ActivityLevel
-from database.connection import get_session
+from database.connection import get_session, mark_user_data_changed
+from database.cache import redis_client
 from bot.utils.calculations import calculate_calories_and_macros, adjust_calories_for_plateau
+from bot.utils.plateau import detect_plateaus
 from bot.services.meal_generator import MealPlanGenerator
 
 logger = logging.getLogger(__name__)
 
+# История веса для анализа плато: текущее плато может длиться дольше двух недель
+PLATEAU_HISTORY_DAYS = 35
+
+# Ежедневная проверка: одно уведомление после 7 дней плато, адаптация плана
+# после 14 дней и далее не чаще раза в неделю (чтобы не урезать калории каждый день).
+# Дни календарные - от первого до последнего взвешивания плато
+PLATEAU_ADAPT_AFTER = 14
+PLATEAU_ADAPT_EVERY = 7
+
+# Что уже сделано для текущего плато пользователя: start, notified, adapted_at
+PLATEAU_STATE_KEY = "plateau_state:{user_id}"
+PLATEAU_STATE_TTL = 60 * 24 * 3600
+
+PLATEAU_NOTICE_TEXT = (
+    "📊 **Автоматический анализ прогресса**\n\n"
+    "Обнаружено плато веса ({days} дней без изменений).\n\n"
+    "{motivation}\n\n"
+    "Используйте /analytics для детального анализа и адаптации плана."
+)
+PLATEAU_ADAPTED_TEXT = (
+    "🔄 **Автоматическая адаптация плана**\n\n"
+    "Ваш план был автоматически скорректирован для прорыва плато.\n"
+    "Изменения вступят в силу со следующего дня.\n\n"
+    "Подробности: /analytics"
+)
+
 class PlateauAdaptationService:
     """Сервис для автоматической адаптации при плато"""
     
@@ -62,47 +89,168 @@ class PlateauAdaptationService:
             
             return {"success": False, "error": "No adaptation strategy"}
     
-    async def _detect_plateau(self, user_id: int) -> Dict:
-        """Определяет наличие плато"""
+    async def run_daily_check(self, sender, motivation_service) -> Dict[str, int]:
+        """
+        Ежедневная проверка плато у всех премиум-пользователей: история веса
+        загружается одним запросом, плато считается по всей когорте, новые
+        нормы записываются одним массовым UPDATE, а уведомления уходят
+        через MessageSender с учетом лимитов Telegram.
+        """
+        now = datetime.now()
+        # Без нового взвешивания плато не меняется - не реагируем повторно
+        fresh_since = now - timedelta(days=1)
+        notifications = []
+        updates = []
+        new_states = {}
+        
         async with get_session() as session:
-            # Получаем последние чек-ины с весом
-            two_weeks_ago = datetime.now() - timedelta(days=14)
             result = await session.execute(
-                select(CheckIn).where(
+                select(User).where(
                     and_(
-                        CheckIn.user_id == user_id,
-                        CheckIn.date >= two_weeks_ago,
-                        CheckIn.weight.isnot(None)
+                        User.is_active == True,
+                        User.onboarding_completed == True,
+                        User.is_premium == True  # Только для премиум пользователей
                     )
-                ).order_by(CheckIn.date)
+                )
             )
-            checkins = result.scalars().all()
-            
-            if len(checkins) < self.plateau_threshold_days:
-                return {"is_plateau": False, "plateau_days": 0}
+            users = {user.id: user for user in result.scalars().all()}
+            if not users:
+                return {"users": 0, "adapted": 0, "notified": 0}
             
-            # Анализируем последние N дней
-            recent_weights = [c.weight for c in checkins[-self.plateau_threshold_days:]]
-            weight_range = max(recent_weights) - min(recent_weights)
+            result = await session.execute(
+                select(CheckIn.user_id, CheckIn.date, CheckIn.weight).where(
+                    and_(
+                        CheckIn.user_id.in_(list(users)),
+                        CheckIn.date >= now - timedelta(days=PLATEAU_HISTORY_DAYS),
+                        CheckIn.weight.isnot(None)
+                    )
+                ).order_by(CheckIn.user_id, CheckIn.date)
+            )
+            series = {user_id: [] for user_id in users}
+            dates = {user_id: [] for user_id in users}
+            for user_id, checkin_date, weight in result.all():
+                series[user_id].append(weight)
+                dates[user_id].append(checkin_date)
             
-            # Плато, если изменение веса меньше порога
-            is_plateau = weight_range <= self.weight_change_threshold
+            plateaus = detect_plateaus(series, self.plateau_threshold_days, self.weight_change_threshold, dates)
+            candidates = {
+                user_id: plateau_data for user_id, plateau_data in plateaus.items()
+                if plateau_data['is_plateau'] and dates[user_id][-1] >= fresh_since
+            }
+            states = await self._load_plateau_states(candidates)
+            today = now.date()
             
-            # Подсчитываем дни плато
-            plateau_days = 0
-            if is_plateau:
-                for i in range(len(checkins) - 1, 0, -1):
-                    if abs(checkins[i].weight - checkins[i-1].weight) <= self.weight_change_threshold:
-                        plateau_days += 1
-                    else:
-                        break
+            for user_id, plateau_data in candidates.items():
+                user = users[user_id]
+                plateau_days = plateau_data['plateau_days']
+                plateau_start = plateau_data['plateau_start'].isoformat()
+                
+                # Состояние прошлого плато к текущему не относится
+                state = states.get(user_id, {})
+                if state.get("start") != plateau_start:
+                    state = {"start": plateau_start}
+                
+                adapted_at = state.get("adapted_at")
+                adapt_due = plateau_days >= PLATEAU_ADAPT_AFTER and (
+                    adapted_at is None
+                    or (today - date.fromisoformat(adapted_at)).days >= PLATEAU_ADAPT_EVERY
+                )
+                
+                if adapt_due:
+                    adaptation_strategy = self.adaptation_strategies.get(user.goal)
+                    if not adaptation_strategy:
+                        continue
+                    
+                    adaptations = await adaptation_strategy(user, plateau_data)
+                    targets = self._adapted_targets(user, adaptations)
+                    if targets:
+                        updates.append({"id": user.id, **targets})
+                    notifications.append((user.telegram_id, PLATEAU_ADAPTED_TEXT, {"parse_mode": "Markdown"}))
+                    state.update(notified="1", adapted_at=today.isoformat())
+                    new_states[user_id] = state
+                
+                elif plateau_days >= self.plateau_threshold_days and not state.get("notified"):
+                    # Плато только обнаружено - одно уведомление без изменения плана
+                    motivation = await motivation_service.get_plateau_motivation(user.telegram_id)
+                    notifications.append((
+                        user.telegram_id,
+                        PLATEAU_NOTICE_TEXT.format(days=plateau_days, motivation=motivation),
+                        {"parse_mode": "Markdown"}
+                    ))
+                    state["notified"] = "1"
+                    new_states[user_id] = state
             
-            return {
-                "is_plateau": is_plateau,
-                "plateau_days": plateau_days,
-                "weight_range": weight_range,
-                "recent_weights": recent_weights
-            }
+            if updates:
+                # Массовое обновление по первичному ключу
+                await session.execute(update(User), updates)
+                for row in updates:
+                    mark_user_data_changed(session, row["id"])
+        
+        await self._save_plateau_states(new_states)
+        delivery = await sender.broadcast(notifications)
+        return {
+            "users": len(users),
+            "adapted": len(updates),
+            "notified": delivery["delivered"]
+        }
+    
+    async def _load_plateau_states(self, user_ids) -> Dict[int, Dict[str, str]]:
+        """Что уже отправлено пользователям по их текущему плато"""
+        user_ids = list(user_ids)
+        if not user_ids:
+            return {}
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.hgetall(PLATEAU_STATE_KEY.format(user_id=user_id))
+            rows = await pipe.execute()
+        return {
+            user_id: {key.decode(): value.decode() for key, value in row.items()}
+            for user_id, row in zip(user_ids, rows) if row
+        }
+    
+    async def _save_plateau_states(self, states: Dict[int, Dict[str, str]]):
+        if not states:
+            return
+        async with redis_client.pipeline(transaction=False) as pipe:
+            for user_id, state in states.items():
+                key = PLATEAU_STATE_KEY.format(user_id=user_id)
+                pipe.delete(key)
+                pipe.hset(key, mapping=state)
+                pipe.expire(key, PLATEAU_STATE_TTL)
+            await pipe.execute()
+    
+    async def _detect_plateau(self, user_id: int) -> Dict:
+        """Определяет наличие плато"""
+        return (await self.detect_plateaus([user_id]))[user_id]
+    
+    async def detect_plateaus(self, user_ids: List[int]) -> Dict[int, Dict]:
+        """
+        Определяет плато сразу для пачки пользователей: веса за
+        PLATEAU_HISTORY_DAYS загружаются одним запросом.
+        """
+        if not user_ids:
+            return {}
+        
+        since = datetime.now() - timedelta(days=PLATEAU_HISTORY_DAYS)
+        async with get_session() as session:
+            result = await session.execute(
+                select(CheckIn.user_id, CheckIn.date, CheckIn.weight).where(
+                    and_(
+                        CheckIn.user_id.in_(user_ids),
+                        CheckIn.date >= since,
+                        CheckIn.weight.isnot(None)
+                    )
+                ).order_by(CheckIn.user_id, CheckIn.date)
+            )
+            rows = result.all()
+        
+        series = {user_id: [] for user_id in user_ids}
+        dates = {user_id: [] for user_id in user_ids}
+        for user_id, checkin_date, weight in rows:
+            series[user_id].append(weight)
+            dates[user_id].append(checkin_date)
+        
+        return detect_plateaus(series, self.plateau_threshold_days, self.weight_change_threshold, dates)
     
     async def _adapt_for_weight_loss(self, user: User, plateau_data: Dict) -> Dict:
         """Адаптация для снижения веса"""
@@ -191,27 +339,33 @@ class PlateauAdaptationService:
             "strategies": ["Поддержание текущего режима"]
         }
     
-    async def _apply_adaptations(self, user: User, adaptations: Dict, session):
-        """Применяет адаптации к профилю пользователя"""
+    def _adapted_targets(self, user: User, adaptations: Dict) -> Dict:
+        """Новые значения норм пользователя после адаптации (только изменившиеся поля)"""
+        targets = {}
+        
         # Корректируем калории
-        if adaptations.get('calorie_adjustment'):
-            user.daily_calories += adaptations['calorie_adjustment']
+        if adaptations.get('calorie_adjustment') and user.daily_calories:
+            new_calories = user.daily_calories + adaptations['calorie_adjustment']
+            targets['daily_calories'] = new_calories
             
             # Пересчитываем макросы пропорционально
-            calorie_ratio = (user.daily_calories + adaptations['calorie_adjustment']) / user.daily_calories
-            user.daily_protein *= calorie_ratio
-            user.daily_fats *= calorie_ratio
-            user.daily_carbs *= calorie_ratio
+            calorie_ratio = new_calories / user.daily_calories
+            for field in ('daily_protein', 'daily_fats', 'daily_carbs'):
+                if getattr(user, field) is not None:
+                    targets[field] = getattr(user, field) * calorie_ratio
         
         # Применяем изменения макросов
-        if adaptations.get('macro_adjustment'):
-            for macro, value in adaptations['macro_adjustment'].items():
-                if macro == 'protein':
-                    user.daily_protein = value
-                elif macro == 'fats':
-                    user.daily_fats = value
-                elif macro == 'carbs':
-                    user.daily_carbs = value
+        macro_fields = {'protein': 'daily_protein', 'fats': 'daily_fats', 'carbs': 'daily_carbs'}
+        for macro, value in adaptations.get('macro_adjustment', {}).items():
+            if macro in macro_fields:
+                targets[macro_fields[macro]] = value
+        
+        return targets
+    
+    async def _apply_adaptations(self, user: User, adaptations: Dict, session):
+        """Применяет адаптации к профилю пользователя"""
+        for field, value in self._adapted_targets(user, adaptations).items():
+            setattr(user, field, value)
         
         await session.commit()
     
@@ -0,0 +1,59 @@
+import logging
+from functools import cached_property
+from aiogram import Bot
+
+from bot.services.ai_service import AIService
+from bot.services.analytics_service import AnalyticsService
+from bot.services.charts_service import ChartsService
+from bot.services.fitness_tracker_integration import FitnessIntegrationService
+from bot.services.meal_generator import MealPlanGenerator
+from bot.services.motivation_service import MotivationService
+from bot.services.payment_service import PaymentService
+from bot.services.plateau_adaptation import PlateauAdaptationService
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry:
+    """
+    Общие для всего процесса экземпляры сервисов. Создается один раз в main()
+    и передается в хендлеры через workflow data диспетчера (аргумент services).
+    Сервисы не хранят данных конкретного запроса, поэтому их можно
+    использовать из любых хендлеров одновременно.
+    Сервисы с тяжелыми зависимостями (Gemini, reportlab) создаются
+    при первом обращении.
+    """
+
+    def __init__(self, bot: Bot):
+        fields = {
+            "charts": ChartsService(),
+            "analytics": AnalyticsService(),
+            "plateau": PlateauAdaptationService(),
+            "motivation": MotivationService(),
+            "payments": PaymentService(bot),
+            "fitness": FitnessIntegrationService(),
+        }
+        # Атрибуты задаются в обход __setattr__, который запрещает замену сервисов
+        self.__dict__.update(fields)
+        logger.info("Реестр сервисов создан")
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"Реестр сервисов неизменяем: нельзя заменить {name}")
+
+    @cached_property
+    def ai(self) -> AIService:
+        return AIService()
+
+    @cached_property
+    def meal_generator(self) -> MealPlanGenerator:
+        return MealPlanGenerator(ai_service=self.ai)
+
+    @cached_property
+    def pdf(self):
+        from bot.services.pdf_generator import PDFGenerator
+        return PDFGenerator(ai_service=self.ai)
+
+    @cached_property
+    def vision(self):
+        from bot.services.vision_service import VisionService
+        return VisionService()
@@ -1,21 +1,24 @@
 import asyncio
 import logging
 from datetime import datetime, time, timedelta
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from aiogram import Bot
 from sqlalchemy import select, and_
 
 from database.models import User, CheckIn
 from database.connection import get_session
 from bot.keyboards.checkin import get_checkin_reminder_keyboard
+from bot.services.smart_reminder import CheckInState, CHECKIN_LOOKUP_WINDOW
+from bot.services.message_sender import MessageSender
 
 logger = logging.getLogger(__name__)
 
 class ReminderService:
     """Сервис для отправки напоминаний о чек-инах"""
     
-    def __init__(self, bot: Bot):
+    def __init__(self, bot: Bot, sender: Optional[MessageSender] = None):
         self.bot = bot
+        self.sender = sender or MessageSender(bot)
         self.running = False
         self.tasks = []
         
@@ -143,148 +146,108 @@ class ReminderService:
                 logger.error(f"Ошибка в напоминаниях о воде: {e}")
                 await asyncio.sleep(60)
     
+    async def _load_users_with_today_checkins(self, session) -> List[Tuple[User, CheckInState]]:
+        """
+        Одним запросом получает активных пользователей и их чек-ины из окна,
+        покрывающего "сегодня" в любом часовом поясе (LEFT JOIN), затем в памяти
+        оставляет только текущий локальный день каждого пользователя.
+        """
+        now_utc = datetime.utcnow()
+        result = await session.execute(
+            select(User, CheckIn.local_date, CheckIn.weight, CheckIn.steps, CheckIn.water_ml)
+            .outerjoin(CheckIn, and_(
+                CheckIn.user_id == User.id,
+                CheckIn.local_date.between(
+                    (now_utc - CHECKIN_LOOKUP_WINDOW).date(),
+                    (now_utc + CHECKIN_LOOKUP_WINDOW).date()
+                )
+            ))
+            .where(
+                and_(
+                    User.is_active == True,
+                    User.onboarding_completed == True
+                )
+            )
+        )
+        
+        users: Dict[int, Tuple[User, list]] = {}
+        for user, checkin_date, weight, steps, water_ml in result.all():
+            _, rows = users.setdefault(user.id, (user, []))
+            if checkin_date is not None:
+                rows.append((checkin_date, weight, steps, water_ml))
+        
+        return [(user, CheckInState.for_local_day(user, now_utc, rows)) for user, rows in users.values()]
+    
     async def send_morning_reminders(self):
         """Отправка утренних напоминаний"""
         async with get_session() as session:
-            # Получаем активных пользователей
-            result = await session.execute(
-                select(User).where(
-                    and_(
-                        User.is_active == True,
-                        User.onboarding_completed == True
-                    )
-                )
-            )
-            users = result.scalars().all()
-            
-            keyboard = get_checkin_reminder_keyboard()
-            
-            for user in users:
-                try:
-                    # Проверяем, не сделан ли уже утренний чек-ин
-                    today = datetime.now().date()
-                    result = await session.execute(
-                        select(CheckIn).where(
-                            and_(
-                                CheckIn.user_id == user.id,
-                                CheckIn.date >= datetime.combine(today, datetime.min.time()),
-                                CheckIn.date <= datetime.combine(today, datetime.max.time())
-                            )
-                        )
-                    )
-                    checkin = result.scalar_one_or_none()
-                    
-                    if not checkin or not checkin.weight:
-                        # Если чек-ин не сделан или не записан вес
-                        await self.bot.send_message(
-                            user.telegram_id,
-                            "🌅 Доброе утро!\n\n"
-                            "Не забудь сделать утренний чек-ин:\n"
-                            "• Взвесься натощак\n"
-                            "• Отметь качество сна\n"
-                            "• Оцени самочувствие\n\n"
-                            "Это займет всего минуту!",
-                            reply_markup=keyboard
-                        )
-                        logger.info(f"Отправлено утреннее напоминание пользователю {user.telegram_id}")
-                
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке напоминания пользователю {user.telegram_id}: {e}")
+            users = await self._load_users_with_today_checkins(session)
+        
+        keyboard = get_checkin_reminder_keyboard()
+        text = (
+            "🌅 Доброе утро!\n\n"
+            "Не забудь сделать утренний чек-ин:\n"
+            "• Взвесься натощак\n"
+            "• Отметь качество сна\n"
+            "• Оцени самочувствие\n\n"
+            "Это займет всего минуту!"
+        )
+        
+        # Напоминаем только тем, кто еще не записал вес
+        messages = [
+            (user.telegram_id, text, {"reply_markup": keyboard})
+            for user, state in users
+            if not state.weight_logged
+        ]
+        summary = await self.sender.broadcast(messages)
+        logger.info(f"Утренние напоминания: {summary}")
     
     async def send_evening_reminders(self):
         """Отправка вечерних напоминаний"""
         async with get_session() as session:
-            result = await session.execute(
-                select(User).where(
-                    and_(
-                        User.is_active == True,
-                        User.onboarding_completed == True
-                    )
-                )
-            )
-            users = result.scalars().all()
+            users = await self._load_users_with_today_checkins(session)
+        
+        keyboard = get_checkin_reminder_keyboard()
+        messages = []
+        
+        for user, state in users:
+            # Формируем персонализированное сообщение
+            message = "🌙 Добрый вечер!\n\n"
             
-            keyboard = get_checkin_reminder_keyboard()
+            if not state.steps_logged:
+                message += "📝 Не забудь записать:\n"
+                message += "• Количество шагов за день\n"
+                if not state.water_ml:
+                    message += "• Сколько воды выпил(а)\n"
+                message += "• Заметки о дне\n"
+            else:
+                message += "Как прошел день? Запиши свои впечатления!"
             
-            for user in users:
-                try:
-                    # Получаем сегодняшний чек-ин
-                    today = datetime.now().date()
-                    result = await session.execute(
-                        select(CheckIn).where(
-                            and_(
-                                CheckIn.user_id == user.id,
-                                CheckIn.date >= datetime.combine(today, datetime.min.time()),
-                                CheckIn.date <= datetime.combine(today, datetime.max.time())
-                            )
-                        )
-                    )
-                    checkin = result.scalar_one_or_none()
-                    
-                    # Формируем персонализированное сообщение
-                    message = "🌙 Добрый вечер!\n\n"
-                    
-                    if not checkin or not checkin.steps:
-                        message += "📝 Не забудь записать:\n"
-                        if not checkin or not checkin.steps:
-                            message += "• Количество шагов за день\n"
-                        if not checkin or not checkin.water_ml:
-                            message += "• Сколько воды выпил(а)\n"
-                        message += "• Заметки о дне\n"
-                    else:
-                        message += "Как прошел день? Запиши свои впечатления!"
-                    
-                    await self.bot.send_message(
-                        user.telegram_id,
-                        message,
-                        reply_markup=keyboard
-                    )
-                    logger.info(f"Отправлено вечернее напоминание пользователю {user.telegram_id}")
-                
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке напоминания пользователю {user.telegram_id}: {e}")
+            messages.append((user.telegram_id, message, {"reply_markup": keyboard}))
+        
+        summary = await self.sender.broadcast(messages)
+        logger.info(f"Вечерние напоминания: {summary}")
     
     async def send_water_reminders(self):
         """Отправка напоминаний о воде"""
         async with get_session() as session:
-            result = await session.execute(
-                select(User).where(
-                    and_(
-                        User.is_active == True,
-                        User.onboarding_completed == True
-                    )
-                )
-            )
-            users = result.scalars().all()
+            users = await self._load_users_with_today_checkins(session)
+        
+        messages = []
+        for user, state in users:
+            current_water = state.water_ml
             
-            for user in users:
-                try:
-                    # Получаем сегодняшний чек-ин
-                    today = datetime.now().date()
-                    result = await session.execute(
-                        select(CheckIn).where(
-                            and_(
-                                CheckIn.user_id == user.id,
-                                CheckIn.date >= datetime.combine(today, datetime.min.time()),
-                                CheckIn.date <= datetime.combine(today, datetime.max.time())
-                            )
-                        )
-                    )
-                    checkin = result.scalar_one_or_none()
-                    
-                    current_water = checkin.water_ml if checkin and checkin.water_ml else 0
-                    
-                    # Отправляем напоминание только если выпито меньше цели
-                    if current_water < 2000:
-                        remaining = 2000 - current_water
-                        await self.bot.send_message(
-                            user.telegram_id,
-                            f"💧 Напоминание о воде!\n\n"
-                            f"Сегодня выпито: {current_water/1000:.1f}л\n"
-                            f"До цели осталось: {remaining/1000:.1f}л\n\n"
-                            f"Используй /checkin для быстрого добавления"
-                        )
-                        logger.info(f"Отправлено напоминание о воде пользователю {user.telegram_id}")
-                
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке напоминания пользователю {user.telegram_id}: {e}")
\ No newline at end of file
+            # Отправляем напоминание только если выпито меньше цели
+            if current_water < 2000:
+                remaining = 2000 - current_water
+                messages.append((
+                    user.telegram_id,
+                    f"💧 Напоминание о воде!\n\n"
+                    f"Сегодня выпито: {current_water/1000:.1f}л\n"
+                    f"До цели осталось: {remaining/1000:.1f}л\n\n"
+                    f"Используй /checkin для быстрого добавления",
+                    None
+                ))
+        
+        summary = await self.sender.broadcast(messages)
+        logger.info(f"Напоминания о воде: {summary}")
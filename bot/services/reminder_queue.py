@@ -0,0 +1,87 @@
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Tuple
+from redis.asyncio import Redis
+
+from database.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+REMINDER_QUEUE_KEY = "reminders:schedule"
+
+# Атомарно забирает наступившие элементы: реплика, получившая элемент,
+# единственная его и обрабатывает. Возвращает [элемент, время, ...]
+_CLAIM_DUE_SCRIPT = """
+local items = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'WITHSCORES', 'LIMIT', 0, ARGV[2])
+local members = {}
+for i = 1, #items, 2 do
+    members[#members + 1] = items[i]
+end
+if #members > 0 then
+    redis.call('ZREM', KEYS[1], unpack(members))
+end
+return items
+"""
+
+
+def _member(user_id: int, reminder_type: str) -> str:
+    return f"{user_id}:{reminder_type}"
+
+
+def _parse_member(member) -> Tuple[int, str]:
+    if isinstance(member, bytes):
+        member = member.decode()
+    user_id, reminder_type = member.split(":", 1)
+    return int(user_id), reminder_type
+
+
+def _score(fire_at_utc: datetime) -> float:
+    # Время в БД наивное UTC
+    return (fire_at_utc - datetime(1970, 1, 1)).total_seconds()
+
+
+class ReminderQueue:
+    """
+    Очередь напоминаний в Redis (sorted set по времени срабатывания),
+    общая для всех реплик бота. Источником истины остается таблица
+    reminder_schedules, очередь лишь распределяет работу.
+    """
+
+    def __init__(self, redis: Redis, key: str = REMINDER_QUEUE_KEY):
+        self.redis = redis
+        self.key = key
+        self._claim_script = redis.register_script(_CLAIM_DUE_SCRIPT)
+
+    async def schedule(self, user_id: int, reminder_type: str, fire_at_utc: datetime):
+        await self.redis.zadd(self.key, {_member(user_id, reminder_type): _score(fire_at_utc)})
+
+    async def schedule_many(self, entries: Iterable[Tuple[int, str, datetime]]):
+        mapping = {
+            _member(user_id, reminder_type): _score(fire_at_utc)
+            for user_id, reminder_type, fire_at_utc in entries
+        }
+        if mapping:
+            await self.redis.zadd(self.key, mapping)
+
+    async def remove(self, user_id: int, reminder_type: str):
+        await self.redis.zrem(self.key, _member(user_id, reminder_type))
+
+    async def claim_due(self, now_utc: datetime, limit: int) -> Dict[Tuple[int, str], float]:
+        """Забирает из очереди до limit наступивших напоминаний: {(user_id, тип): время}"""
+        items = await self._claim_script(keys=[self.key], args=[_score(now_utc), limit])
+        return {_parse_member(member): float(score) for member, score in zip(items[::2], items[1::2])}
+
+    async def restore(self, claimed: Dict[Tuple[int, str], float]):
+        """
+        Возвращает забранные элементы с прежним временем, если обработать их
+        не удалось. Элементы, которые уже снова запланированы, не меняются.
+        """
+        mapping = {
+            _member(user_id, reminder_type): score
+            for (user_id, reminder_type), score in claimed.items()
+        }
+        if mapping:
+            await self.redis.zadd(self.key, mapping, nx=True)
+
+
+reminder_queue = ReminderQueue(redis_client)
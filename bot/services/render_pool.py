@@ -0,0 +1,139 @@
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from bot.config import settings
+from bot.utils.lazy import warm_up
+
+logger = logging.getLogger(__name__)
+
+
+class RenderQueueFull(Exception):
+    """Очередь рендеринга заполнена - задача отклонена"""
+
+
+def _init_worker():
+    # Каждый процесс-воркер рисует без GUI
+    import matplotlib
+    matplotlib.use('Agg')
+    # Воркер существует только ради графиков: грузим библиотеки сразу,
+    # а не на первом запросе пользователя
+    warm_up(["bot.services.chart_renderers"])
+
+
+def _noop():
+    return None
+
+
+class RenderPool:
+    """
+    Пул процессов для рендеринга графиков matplotlib.
+    Асинхронная часть собирает данные, воркер получает простые списки
+    и возвращает PNG-байты, поэтому отрисовка не блокирует event loop.
+    Сломанный (упавший воркер) или зависший пул пересоздается.
+    """
+
+    def __init__(
+        self,
+        workers: int = None,
+        queue_size: int = None,
+        timeout: float = None,
+        stuck_timeout: float = None
+    ):
+        self.workers = workers or settings.CHART_RENDER_WORKERS
+        self.queue_size = queue_size if queue_size is not None else settings.CHART_RENDER_QUEUE_SIZE
+        self.timeout = timeout or settings.CHART_RENDER_TIMEOUT
+        self.stuck_timeout = stuck_timeout or settings.CHART_RENDER_STUCK_TIMEOUT
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots = None
+
+    def _ensure_started(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker)
+            self._slots = asyncio.Semaphore(self.workers + self.queue_size)
+
+    async def render(self, func: Callable[..., bytes], *args) -> bytes:
+        """
+        Выполняет функцию рендеринга в пуле. Бросает RenderQueueFull, если
+        очередь заполнена, и asyncio.TimeoutError, если график не готов за timeout.
+        """
+        self._ensure_started()
+        if self._slots.locked():
+            raise RenderQueueFull(f"В очереди рендеринга уже {self.workers + self.queue_size} задач")
+
+        try:
+            return await self._submit(func, *args)
+        except BrokenProcessPool:
+            # Воркер упал (OOM, segfault в matplotlib) - пул уже пересоздан, повторяем один раз
+            logger.warning("Пул рендеринга сломан, повторяю задачу в новом пуле")
+            return await self._submit(func, *args)
+
+    async def _submit(self, func: Callable[..., bytes], *args) -> bytes:
+        await self._slots.acquire()
+        self._ensure_started()
+        executor = self._executor
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(executor, func, *args)
+        except BaseException as e:
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._recycle(executor)
+            raise
+        # Процесс нельзя прервать посреди задачи: по таймауту мы лишь
+        # перестаем ждать, а слот освобождается, когда воркер закончит рисовать
+        future.add_done_callback(self._release_slot)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except BrokenProcessPool:
+            self._recycle(executor)
+            raise
+        except asyncio.TimeoutError:
+            # Если воркер так и не закончит, пул будет пересоздан
+            loop.call_later(self.stuck_timeout, self._recycle_if_stuck, future, executor)
+            raise
+
+    def _release_slot(self, future: asyncio.Future):
+        self._slots.release()
+        # Результат брошенной по таймауту задачи никто не прочитает
+        if not future.cancelled() and future.exception() is not None:
+            logger.debug(f"Рендеринг завершился с ошибкой: {future.exception()}")
+
+    def _recycle_if_stuck(self, future: asyncio.Future, executor: ProcessPoolExecutor):
+        if not future.done():
+            logger.error(f"Рендеринг завис дольше {self.stuck_timeout:.0f}с, пересоздаю пул")
+            self._recycle(executor)
+
+    def _recycle(self, executor: ProcessPoolExecutor):
+        """Заменяет сломанный или зависший пул: следующая задача создаст новый"""
+        if self._executor is not executor:
+            return  # Уже пересоздан
+        self._executor = None
+        # Зависший процесс сам не завершится: останавливаем воркеры, их задачи
+        # получат BrokenProcessPool и освободят слоты
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def warm_up(self):
+        """
+        Поднимает все процессы пула заранее (инициализатор загружает в них
+        matplotlib), чтобы первый график не ждал старта воркера.
+        """
+        self._ensure_started()
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(self._executor, _noop) for _ in range(self.workers)
+        ])
+        logger.info(f"Пул рендеринга прогрет: {self.workers} воркеров")
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info("Пул рендеринга графиков остановлен")
+
+
+render_pool = RenderPool()
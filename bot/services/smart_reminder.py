@@ -3,20 +3,159 @@ import logging
 from datetime import datetime, time, timedelta
 from typing import Optional
 from aiogram import Bot
-from sqlalchemy import select, and_
-import re
+from sqlalchemy import select, and_, update, delete, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database.models import User, CheckIn
+from database.models import User, CheckIn, ReminderSchedule
 from database.connection import get_session
 from bot.keyboards.checkin import get_checkin_reminder_keyboard
+from bot.services.message_sender import MessageSender
+from bot.services.reminder_queue import ReminderQueue, reminder_queue
+from bot.utils.timezone import parse_utc_offset, user_local_date
 
 logger = logging.getLogger(__name__)
 
+REMINDER_TYPES = ("morning", "evening", "water")
+# Простая логика: напоминаем о воде в 10, 14, 18 часов
+WATER_REMINDER_HOURS = (10, 14, 18)
+# Напоминания, опоздавшие сильнее (например, после простоя бота), не отправляем
+MAX_REMINDER_DELAY = timedelta(minutes=30)
+# Локальная дата пользователя всегда лежит внутри now_utc ± 1 день
+CHECKIN_LOOKUP_WINDOW = timedelta(days=1)
+# Как часто сверять очередь в Redis с таблицей расписания
+QUEUE_SYNC_INTERVAL = timedelta(hours=1)
+
+
+class CheckInState:
+    """Сводка сегодняшних чек-инов пользователя, нужная для решения о напоминании"""
+
+    __slots__ = ("weight_logged", "steps_logged", "water_ml")
+
+    def __init__(self, weight_logged: bool = False, steps_logged: bool = False, water_ml: int = 0):
+        self.weight_logged = weight_logged
+        self.steps_logged = steps_logged
+        self.water_ml = water_ml
+
+    def add(self, weight: Optional[float], steps: Optional[int], water_ml: Optional[int]):
+        self.weight_logged = self.weight_logged or weight is not None
+        self.steps_logged = self.steps_logged or steps is not None
+        self.water_ml = max(self.water_ml, water_ml or 0)
+
+    @classmethod
+    def for_local_day(cls, user: User, now_utc: datetime, rows) -> 'CheckInState':
+        """Собирает состояние из строк (local_date, weight, steps, water_ml) за текущий день пользователя."""
+        local_day = user_local_date(user.timezone, now_utc)
+
+        state = cls()
+        for checkin_date, weight, steps, water_ml in rows:
+            if checkin_date == local_day:
+                state.add(weight, steps, water_ml)
+        return state
+
+
+def _reminder_slots(user: User, reminder_type: str) -> list[time]:
+    """Локальное время срабатывания напоминания данного типа."""
+    settings = user.reminder_settings or {}
+    if settings.get("all_disabled", False):
+        return []
+
+    if reminder_type == "morning":
+        return [datetime.strptime(settings.get("morning_time", "08:00"), "%H:%M").time()]
+    if reminder_type == "evening":
+        return [datetime.strptime(settings.get("evening_time", "20:00"), "%H:%M").time()]
+    if reminder_type == "water" and settings.get("water_reminders", True):
+        return [time(hour, 0) for hour in WATER_REMINDER_HOURS]
+    return []
+
+
+def compute_next_fire_time(user: User, reminder_type: str, after_utc: datetime) -> Optional[datetime]:
+    """
+    Возвращает ближайшее (строго после after_utc) время напоминания в UTC
+    или None, если напоминание отключено.
+    """
+    try:
+        slots = sorted(_reminder_slots(user, reminder_type))
+    except ValueError as e:
+        logger.warning(f"Неверный формат времени '{reminder_type}' для user {user.id}: {e}")
+        return None
+
+    if not slots:
+        return None
+
+    offset = parse_utc_offset(user.timezone)
+    local_after = after_utc + offset
+
+    for day_shift in (0, 1):
+        day = local_after.date() + timedelta(days=day_shift)
+        for slot in slots:
+            candidate = datetime.combine(day, slot)
+            if candidate > local_after:
+                return candidate - offset
+    return None
+
+
+async def reschedule_user_reminders(session: AsyncSession, user: User, now_utc: Optional[datetime] = None):
+    """
+    Пересчитывает сохраненное время следующих напоминаний пользователя.
+    Вызывается при изменении reminder_settings, timezone или статуса онбординга.
+    """
+    now_utc = now_utc or datetime.utcnow()
+
+    result = await session.execute(
+        select(ReminderSchedule).where(ReminderSchedule.user_id == user.id)
+    )
+    existing = {row.reminder_type: row for row in result.scalars().all()}
+    queued = []
+
+    for reminder_type in REMINDER_TYPES:
+        next_fire_at = None
+        if user.is_active and user.onboarding_completed:
+            next_fire_at = compute_next_fire_time(user, reminder_type, now_utc)
+
+        schedule = existing.get(reminder_type)
+        if next_fire_at is None:
+            if schedule:
+                await session.delete(schedule)
+            continue
+
+        if schedule:
+            schedule.next_fire_at = next_fire_at
+        else:
+            session.add(ReminderSchedule(
+                user_id=user.id,
+                reminder_type=reminder_type,
+                next_fire_at=next_fire_at
+            ))
+        queued.append((user.id, reminder_type, next_fire_at))
+
+    # Лишние элементы очереди (отключенные напоминания) отбросятся при
+    # обработке, т.к. строки расписания для них уже нет
+    try:
+        await reminder_queue.schedule_many(queued)
+    except Exception as e:
+        logger.warning(f"Не удалось обновить очередь напоминаний для user {user.id}: {e}")
+
+
 class SmartReminderService:
-    def __init__(self, bot: Bot):
+    """
+    Отправляет напоминания по общей очереди в Redis, поэтому может
+    работать одновременно в нескольких репликах бота без дублей.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        sender: Optional[MessageSender] = None,
+        queue: Optional[ReminderQueue] = None,
+        batch_size: int = 500
+    ):
         self.bot = bot
+        self.sender = sender or MessageSender(bot)
+        self.queue = queue or reminder_queue
+        self.batch_size = batch_size
         self.running = False
         self.task = None
+        self.last_queue_sync = None
 
     async def start(self):
         if self.running:
@@ -31,39 +170,89 @@ class SmartReminderService:
             self.task.cancel()
         logger.info("Сервис умных напоминаний остановлен")
 
-    def _get_timezone_offset(self, tz_string: str) -> timedelta:
-        """Парсит строку часового пояса (напр. 'UTC+3') и возвращает смещение."""
-        if tz_string == "UTC":
-            return timedelta(hours=0)
-        
-        match = re.match(r"UTC([+-])(\d+)", tz_string)
-        if match:
-            sign = 1 if match.group(1) == '+' else -1
-            hours = int(match.group(2))
-            return timedelta(hours=sign * hours)
-        
-        return timedelta(hours=0) # Fallback to UTC
+    async def bootstrap_schedules(self):
+        """Заполняет расписание для пользователей, у которых его еще нет."""
+        now_utc = datetime.utcnow()
+        last_id = 0
+        scheduled = 0
+
+        while True:
+            async with get_session() as session:
+                result = await session.execute(
+                    select(User)
+                    .outerjoin(ReminderSchedule, ReminderSchedule.user_id == User.id)
+                    .where(
+                        User.id > last_id,
+                        User.is_active == True,
+                        User.onboarding_completed == True,
+                        ReminderSchedule.id.is_(None)
+                    )
+                    .order_by(User.id)
+                    .limit(self.batch_size)
+                )
+                users = result.scalars().all()
+                if not users:
+                    break
+
+                for user in users:
+                    await reschedule_user_reminders(session, user, now_utc)
+                last_id = users[-1].id
+                scheduled += len(users)
+
+        if scheduled:
+            logger.info(f"Расписание напоминаний создано для {scheduled} пользователей")
+
+    async def sync_queue(self):
+        """
+        Переносит таблицу расписания в очередь Redis. Операция идемпотентна,
+        поэтому ее безопасно выполнять на каждой реплике: она восстанавливает
+        очередь после сброса Redis или потерянных обновлений.
+        """
+        last_id = 0
+        synced = 0
+
+        while True:
+            async with get_session() as session:
+                result = await session.execute(
+                    select(ReminderSchedule.id, ReminderSchedule.user_id,
+                           ReminderSchedule.reminder_type, ReminderSchedule.next_fire_at)
+                    .where(ReminderSchedule.id > last_id)
+                    .order_by(ReminderSchedule.id)
+                    .limit(self.batch_size)
+                )
+                rows = result.all()
+
+            if not rows:
+                break
+
+            await self.queue.schedule_many(
+                (user_id, reminder_type, next_fire_at)
+                for _, user_id, reminder_type, next_fire_at in rows
+            )
+            last_id = rows[-1][0]
+            synced += len(rows)
+
+        self.last_queue_sync = datetime.utcnow()
+        logger.info(f"Очередь напоминаний синхронизирована: {synced} записей")
 
     async def reminder_loop(self):
-        """Основной цикл, который проверяет, не пора ли отправить напоминания."""
+        """Основной цикл: раз в минуту обрабатывает только наступившие напоминания."""
+        try:
+            await self.bootstrap_schedules()
+            await self.sync_queue()
+        except Exception as e:
+            logger.error(f"Ошибка при построении расписания напоминаний: {e}", exc_info=True)
+
         while self.running:
             try:
                 now_utc = datetime.utcnow()
-                
-                async with get_session() as session:
-                    result = await session.execute(
-                        select(User).where(
-                            User.is_active == True,
-                            User.onboarding_completed == True
-                        )
-                    )
-                    users = result.scalars().all()
+                if not self.last_queue_sync or now_utc - self.last_queue_sync >= QUEUE_SYNC_INTERVAL:
+                    await self.sync_queue()
 
-                for user in users:
-                    await self.check_and_send_reminders(user, now_utc, session)
+                await self.dispatch_due_reminders(now_utc)
 
                 # Ждем до начала следующей минуты
-                await asyncio.sleep(60 - now_utc.second)
+                await asyncio.sleep(60 - datetime.utcnow().second)
 
             except asyncio.CancelledError:
                 break
@@ -71,64 +260,98 @@ class SmartReminderService:
                 logger.error(f"Ошибка в цикле напоминаний: {e}", exc_info=True)
                 await asyncio.sleep(60)
 
-    async def check_and_send_reminders(self, user: User, now_utc: datetime, session: 'AsyncSession'):
-        """Проверяет и отправляет напоминания для конкретного пользователя."""
-        settings = user.reminder_settings or {}
-        if settings.get("all_disabled", False):
-            return
+    async def dispatch_due_reminders(self, now_utc: datetime):
+        """Забирает наступившие напоминания из очереди, отправляет и планирует следующие."""
+        while True:
+            claimed = await self.queue.claim_due(now_utc, self.batch_size)
+            if not claimed:
+                break
 
-        offset = self._get_timezone_offset(user.timezone or "UTC")
-        user_local_time = now_utc + offset
+            pending = []
+            requeue = []
+            try:
+                async with get_session() as session:
+                    # Один запрос на пачку: строки расписания, их пользователи
+                    # и чек-ины из окна, покрывающего "сегодня" в любом часовом поясе
+                    result = await session.execute(
+                        select(ReminderSchedule, User, CheckIn.local_date, CheckIn.weight, CheckIn.steps, CheckIn.water_ml)
+                        .join(User, ReminderSchedule.user_id == User.id)
+                        .outerjoin(CheckIn, and_(
+                            CheckIn.user_id == User.id,
+                            CheckIn.local_date.between(
+                                (now_utc - CHECKIN_LOOKUP_WINDOW).date(),
+                                (now_utc + CHECKIN_LOOKUP_WINDOW).date()
+                            )
+                        ))
+                        .where(tuple_(ReminderSchedule.user_id, ReminderSchedule.reminder_type).in_(list(claimed)))
+                    )
 
-        today_start = datetime.combine(user_local_time.date(), time.min) - offset
-        today_end = datetime.combine(user_local_time.date(), time.max) - offset
+                    due = {}
+                    for schedule, user, checkin_date, weight, steps, water_ml in result.all():
+                        entry = due.setdefault(schedule.id, (schedule, user, []))
+                        if checkin_date is not None:
+                            entry[2].append((checkin_date, weight, steps, water_ml))
 
-        # Утреннее напоминание
-        morning_time_str = settings.get("morning_time", "08:00")
-        try:
-            morning_t = datetime.strptime(morning_time_str, "%H:%M").time()
-            if morning_t.hour == user_local_time.hour and morning_t.minute == user_local_time.minute:
-                # Проверяем, был ли уже утренний чек-ин
-                checkin = await session.scalar(
-                    select(CheckIn).where(
-                        and_(CheckIn.user_id == user.id, CheckIn.date.between(today_start, today_end))
-                    )
-                )
-                if not checkin or checkin.weight is None:
-                    await self.send_reminder(user, 'morning')
-        except Exception as e:
-            logger.warning(f"Неверный формат утреннего времени для user {user.id}: {e}")
+                    for schedule, user, checkin_rows in due.values():
+                        fired_at = schedule.next_fire_at
+                        if fired_at > now_utc:
+                            # Время перенесли после попадания в очередь - вернем с новым
+                            requeue.append((user.id, schedule.reminder_type, fired_at))
+                            continue
 
-        # Вечернее напоминание
-        evening_time_str = settings.get("evening_time", "20:00")
-        try:
-            evening_t = datetime.strptime(evening_time_str, "%H:%M").time()
-            if evening_t.hour == user_local_time.hour and evening_t.minute == user_local_time.minute:
-                # Проверяем, был ли уже вечерний чек-ин
-                checkin = await session.scalar(
-                    select(CheckIn).where(
-                        and_(CheckIn.user_id == user.id, CheckIn.date.between(today_start, today_end))
-                    )
-                )
-                if not checkin or checkin.steps is None:
-                    await self.send_reminder(user, 'evening')
-        except Exception as e:
-            logger.warning(f"Неверный формат вечернего времени для user {user.id}: {e}")
-
-        # Напоминание о воде
-        if settings.get("water_reminders", True):
-            # Простая логика: напоминаем в 10, 14, 18 часов
-            water_reminder_hours = [10, 14, 18]
-            if user_local_time.hour in water_reminder_hours and user_local_time.minute == 0:
-                 checkin = await session.scalar(
-                    select(CheckIn).where(
-                        and_(CheckIn.user_id == user.id, CheckIn.date.between(today_start, today_end))
-                    )
-                )
-                 current_water = checkin.water_ml if checkin and checkin.water_ml else 0
-                 if current_water < 2000:
-                     await self.send_reminder(user, 'water', current_water)
+                        next_fire_at = None
+                        if user.is_active and user.onboarding_completed:
+                            next_fire_at = compute_next_fire_time(user, schedule.reminder_type, now_utc)
+
+                        # Условное обновление защищает от повторной отправки, если
+                        # тот же элемент успела обработать другая реплика
+                        if next_fire_at is None:
+                            stmt = delete(ReminderSchedule)
+                        else:
+                            stmt = update(ReminderSchedule).values(next_fire_at=next_fire_at)
+                        claimed_row = await session.execute(
+                            stmt.where(
+                                ReminderSchedule.id == schedule.id,
+                                ReminderSchedule.next_fire_at == fired_at
+                            ).execution_options(synchronize_session=False)
+                        )
+                        if claimed_row.rowcount != 1:
+                            continue
+
+                        if next_fire_at is not None:
+                            requeue.append((user.id, schedule.reminder_type, next_fire_at))
+                            if now_utc - fired_at <= MAX_REMINDER_DELAY:
+                                state = CheckInState.for_local_day(user, now_utc, checkin_rows)
+                                pending.append(self.check_and_send_reminder(user, schedule.reminder_type, state))
+            except Exception:
+                # Забранные элементы уже удалены из очереди: без возврата они
+                # ждали бы следующей синхронизации с БД
+                await self.queue.restore(claimed)
+                raise
+
+            await self.queue.schedule_many(requeue)
 
+            # Отправляем уже после фиксации расписания, чтобы не держать
+            # соединение с БД, пока отправитель соблюдает лимиты Telegram
+            if pending:
+                await asyncio.gather(*pending)
+
+            if len(claimed) < self.batch_size:
+                break
+
+    async def check_and_send_reminder(self, user: User, reminder_type: str, state: 'CheckInState'):
+        """Решает по сегодняшнему чек-ину, нужно ли еще напоминание, и отправляет его."""
+        if reminder_type == 'morning':
+            # Проверяем, был ли уже утренний чек-ин
+            if not state.weight_logged:
+                await self.send_reminder(user, 'morning')
+        elif reminder_type == 'evening':
+            # Проверяем, был ли уже вечерний чек-ин
+            if not state.steps_logged:
+                await self.send_reminder(user, 'evening')
+        elif reminder_type == 'water':
+            if state.water_ml < 2000:
+                await self.send_reminder(user, 'water', state.water_ml)
 
     async def send_reminder(self, user: User, reminder_type: str, water_level: int = 0):
         """Отправляет конкретный тип напоминания."""
@@ -154,13 +377,6 @@ class SmartReminderService:
         elif reminder_type == 'water':
             text = f"💧 Напоминание о воде! Сегодня выпито: {water_level/1000:.1f}л. Не забывай пить достаточно!"
 
-        try:
-            keyboard = get_checkin_reminder_keyboard() if reminder_type != 'water' else None
-            await self.bot.send_message(
-                user.telegram_id,
-                text,
-                reply_markup=keyboard
-            )
-            logger.info(f"Отправлено '{reminder_type}' напоминание пользователю {user.telegram_id}")
-        except Exception as e:
-            logger.error(f"Не удалось отправить напоминание {user.telegram_id}: {e}")
\ No newline at end of file
+        keyboard = get_checkin_reminder_keyboard() if reminder_type != 'water' else None
+        if await self.sender.send_message(user.telegram_id, text, reply_markup=keyboard):
+            logger.info(f"Отправлено '{reminder_type}' напоминание пользователю {user.telegram_id}")
\ No newline at end of file
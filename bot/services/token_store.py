@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import select
+
+from bot.config import settings
+from database.models import User
+from database.connection import get_session
+
+logger = logging.getLogger(__name__)
+
+REFRESH_CHECK_INTERVAL = 60
+# Пауза перед повтором неудачного обновления: удваивается до максимума
+REFRESH_BACKOFF_BASE = 60
+REFRESH_BACKOFF_MAX = 3600
+# Сколько держать в памяти запись об отсутствии токенов, чтобы не ходить в БД
+MISSING_CACHE_TTL = 60
+
+
+class TokenCipher:
+    """
+    Шифрование токенов в БД (Fernet). Без TOKEN_ENCRYPTION_KEY токены
+    хранятся как есть, как и раньше.
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        self._fernet = None
+        if key:
+            from cryptography.fernet import Fernet
+            self._fernet = Fernet(key.encode())
+
+    @property
+    def enabled(self) -> bool:
+        return self._fernet is not None
+
+    def encrypt(self, value: Optional[str]) -> Optional[str]:
+        if value is None or not self._fernet:
+            return value
+        return self._fernet.encrypt(value.encode()).decode()
+
+    def decrypt(self, value: Optional[str]) -> Optional[str]:
+        if value is None or not self._fernet:
+            return value
+        return self._fernet.decrypt(value.encode()).decode()
+
+
+# Обмен refresh token на новый access token: возвращает ответ провайдера
+# ({"access_token", "expires_in", ...}) или None
+RefreshFunc = Callable[[str], Awaitable[Optional[Dict]]]
+
+
+class TokenManager:
+    """
+    Токены OAuth одного провайдера. Источник истины - User.fitness_tokens
+    (токены зашифрованы), в памяти хранится кэш до истечения токена.
+    Access token недавно активных пользователей обновляется в фоне
+    незадолго до истечения; одновременные запросы для одного пользователя
+    ждут одно и то же обновление. Неиспользуемые и истекшие записи
+    удаляются из кэша, неудачные обновления повторяются с нарастающей паузой.
+    Ключ пользователя - telegram id, как и во всех интеграциях.
+    """
+
+    def __init__(
+        self,
+        provider: str,
+        refresh_func: RefreshFunc,
+        cipher: Optional[TokenCipher] = None,
+        refresh_ahead: int = None,
+        idle_ttl: int = None,
+        max_concurrency: int = None
+    ):
+        self.provider = provider
+        self.refresh_func = refresh_func
+        self.cipher = cipher or TokenCipher(settings.TOKEN_ENCRYPTION_KEY)
+        self.refresh_ahead = timedelta(seconds=refresh_ahead or settings.TOKEN_REFRESH_AHEAD)
+        self.idle_ttl = idle_ttl or settings.TOKEN_CACHE_IDLE_TTL
+        self._refresh_slots = asyncio.Semaphore(max_concurrency or settings.TOKEN_REFRESH_CONCURRENCY)
+        self._cache: Dict[int, Dict] = {}
+        self._last_used: Dict[int, float] = {}
+        # Неудачные обновления: {telegram_id: (число неудач подряд, когда можно повторить)}
+        self._backoff: Dict[int, Tuple[int, float]] = {}
+        self._missing: Dict[int, float] = {}
+        self._inflight: Dict[int, asyncio.Task] = {}
+        self.running = False
+        self.task = None
+
+    async def start(self):
+        if self.running:
+            return
+        self.running = True
+        self.task = asyncio.create_task(self.refresh_loop())
+
+    async def stop(self):
+        self.running = False
+        if self.task:
+            self.task.cancel()
+
+    async def get(self, telegram_id: int) -> Optional[Dict]:
+        """Действующие токены пользователя (при необходимости обновляет) или None"""
+        tokens = self._cache.get(telegram_id)
+        if tokens is None:
+            tokens = await self._load(telegram_id)
+            if tokens is None:
+                return None
+        self._last_used[telegram_id] = time.monotonic()
+
+        if datetime.now() >= tokens["expires_at"] - self.refresh_ahead:
+            if self._in_backoff(telegram_id):
+                # Провайдер недавно отказал - не повторяем до конца паузы
+                return tokens if datetime.now() < tokens["expires_at"] else None
+            tokens = await self.refresh(telegram_id)
+        return tokens
+
+    async def put(self, telegram_id: int, response: Dict):
+        """Сохраняет токены из ответа провайдера в БД и кэш"""
+        previous = self._cache.get(telegram_id) or await self._load(telegram_id) or {}
+        tokens = {
+            "access_token": response["access_token"],
+            # Google присылает refresh token только при первом согласии
+            "refresh_token": response.get("refresh_token") or previous.get("refresh_token"),
+            "expires_at": datetime.now() + timedelta(seconds=response["expires_in"])
+        }
+
+        async with get_session() as session:
+            result = await session.execute(
+                select(User).where(User.telegram_id == telegram_id)
+            )
+            user = result.scalar_one_or_none()
+            if user is None:
+                return
+
+            # Новый словарь, иначе изменение JSON-колонки не попадет в UPDATE
+            stored = dict(user.fitness_tokens or {})
+            stored[self.provider] = {
+                "access_token": self.cipher.encrypt(tokens["access_token"]),
+                "refresh_token": self.cipher.encrypt(tokens["refresh_token"]),
+                "expires_at": tokens["expires_at"].isoformat(),
+                "encrypted": self.cipher.enabled
+            }
+            user.fitness_tokens = stored
+
+        self._cache[telegram_id] = tokens
+        self._missing.pop(telegram_id, None)
+
+    async def forget(self, telegram_id: int):
+        """Убирает токены из кэша (например, после отключения сервиса)"""
+        self._evict(telegram_id)
+        self._missing.pop(telegram_id, None)
+        self._backoff.pop(telegram_id, None)
+
+    def _evict(self, telegram_id: int):
+        self._cache.pop(telegram_id, None)
+        self._last_used.pop(telegram_id, None)
+
+    def _in_backoff(self, telegram_id: int) -> bool:
+        _, retry_at = self._backoff.get(telegram_id, (0, 0.0))
+        return retry_at > time.monotonic()
+
+    async def _load(self, telegram_id: int) -> Optional[Dict]:
+        if self._missing.get(telegram_id, 0) > time.monotonic():
+            return None
+
+        async with get_session() as session:
+            result = await session.execute(
+                select(User.fitness_tokens).where(User.telegram_id == telegram_id)
+            )
+            stored = (result.scalar_one_or_none() or {}).get(self.provider)
+
+        if not stored or not stored.get("access_token"):
+            self._missing[telegram_id] = time.monotonic() + MISSING_CACHE_TTL
+            return None
+
+        try:
+            decrypt = self.cipher.decrypt if stored.get("encrypted") else (lambda value: value)
+            tokens = {
+                "access_token": decrypt(stored["access_token"]),
+                "refresh_token": decrypt(stored.get("refresh_token")),
+                "expires_at": datetime.fromisoformat(stored["expires_at"])
+            }
+        except Exception as e:
+            logger.error(f"Не удалось прочитать токены {self.provider} пользователя {telegram_id}: {e}")
+            return None
+
+        self._cache[telegram_id] = tokens
+        return tokens
+
+    async def refresh(self, telegram_id: int) -> Optional[Dict]:
+        """Обновляет access token; параллельные вызовы ждут одно обновление"""
+        task = self._inflight.get(telegram_id)
+        if task is None:
+            task = asyncio.create_task(self._do_refresh(telegram_id))
+            self._inflight[telegram_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(telegram_id, None))
+        return await asyncio.shield(task)
+
+    async def _do_refresh(self, telegram_id: int) -> Optional[Dict]:
+        tokens = self._cache.get(telegram_id) or await self._load(telegram_id)
+        if not tokens or not tokens.get("refresh_token"):
+            return None
+
+        try:
+            response = await self.refresh_func(tokens["refresh_token"])
+        except Exception as e:
+            logger.error(f"Ошибка обновления токена {self.provider} для {telegram_id}: {e}")
+            response = None
+
+        if not response:
+            failures = self._backoff.get(telegram_id, (0, 0.0))[0] + 1
+            delay = min(REFRESH_BACKOFF_BASE * 2 ** (failures - 1), REFRESH_BACKOFF_MAX)
+            self._backoff[telegram_id] = (failures, time.monotonic() + delay)
+            # Старый токен еще может быть действителен, истекший в кэше не держим
+            if datetime.now() < tokens["expires_at"]:
+                return tokens
+            self._evict(telegram_id)
+            return None
+
+        self._backoff.pop(telegram_id, None)
+        await self.put(telegram_id, response)
+        return self._cache.get(telegram_id)
+
+    async def _refresh_limited(self, telegram_id: int):
+        async with self._refresh_slots:
+            await self.refresh(telegram_id)
+
+    def _expiring_tokens(self) -> List[int]:
+        """Убирает из кэша неиспользуемые и истекшие токены, возвращает те, что пора обновить"""
+        now, monotonic_now = datetime.now(), time.monotonic()
+        soon = now + self.refresh_ahead + timedelta(seconds=REFRESH_CHECK_INTERVAL)
+        expiring = []
+        for telegram_id, tokens in list(self._cache.items()):
+            idle = monotonic_now - self._last_used.get(telegram_id, 0.0) > self.idle_ttl
+            if idle or tokens["expires_at"] <= now:
+                self._evict(telegram_id)
+            elif tokens["expires_at"] <= soon and not self._in_backoff(telegram_id):
+                expiring.append(telegram_id)
+
+        # Записи о неудачах храним, пока не истечет пауза
+        for telegram_id, (_, retry_at) in list(self._backoff.items()):
+            if retry_at <= monotonic_now and telegram_id not in self._cache:
+                self._backoff.pop(telegram_id, None)
+        for telegram_id, until in list(self._missing.items()):
+            if until <= monotonic_now:
+                self._missing.pop(telegram_id, None)
+        return expiring
+
+    async def refresh_loop(self):
+        """Фоновое обновление токенов, которые скоро истекут"""
+        while self.running:
+            try:
+                await asyncio.sleep(REFRESH_CHECK_INTERVAL)
+                expiring = self._expiring_tokens()
+                if expiring:
+                    await asyncio.gather(
+                        *(self._refresh_limited(telegram_id) for telegram_id in expiring),
+                        return_exceptions=True
+                    )
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления токенов {self.provider}: {e}", exc_info=True)
@@ -1,15 +1,19 @@
 import base64
 import logging
 from typing import Dict, Optional
-import google.generativeai as genai
-from PIL import Image
 import io
 
 from bot.config import settings
+from bot.utils.lazy import lazy_import
+from bot.services.model_client import model_client, CircuitOpenError
 from database.models import User
 
 logger = logging.getLogger(__name__)
 
+Image = lazy_import("PIL.Image")
+
+VISION_MODEL = "gemini-1.5-flash"
+
 class VisionService:
     """Сервис для анализа фото еды через Vision API"""
     
@@ -17,9 +21,8 @@ class VisionService:
         self.enabled = False
         if settings.GEMINI_API_KEY:
             try:
-                genai.configure(api_key=settings.GEMINI_API_KEY)
                 # Используем модель с поддержкой изображений
-                self.model = genai.GenerativeModel('gemini-1.5-flash')
+                model_client.get_model(VISION_MODEL)
                 self.enabled = True
                 logger.info("Vision сервис инициализирован с Gemini")
             except Exception as e:
@@ -49,7 +52,7 @@ class VisionService:
                 prompt = self._create_food_analysis_prompt(user)
                 
                 # Отправляем запрос к Gemini
-                response = await self.model.generate_content_async([prompt, img])
+                response = await model_client.generate("vision", [prompt, img], model_name=VISION_MODEL)
                 
                 # Парсим ответ
                 result = self._parse_food_response(response.text)
@@ -57,6 +60,12 @@ class VisionService:
                 logger.info(f"Успешно проанализировано фото: {photo_path}")
                 return result
                 
+        except CircuitOpenError:
+            return {
+                "success": False,
+                "description": "Анализ фото временно недоступен",
+                "estimated_calories": 0
+            }
         except Exception as e:
             logger.error(f"Ошибка при анализе фото: {e}")
             return {
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Dict, Optional, Tuple
+from redis.asyncio import Redis
+from sqlalchemy import select, and_
+
+from database.models import User, CheckIn
+from database.connection import get_session
+from database.checkins import add_water_bulk
+from database.cache import redis_client
+
+logger = logging.getLogger(__name__)
+
+PENDING_KEY = "water:pending"
+FLUSHING_KEY = "water:flushing"
+FLUSH_LOCK_KEY = "water:flush_lock"
+TOTAL_KEY = "water:total:{user_id}:{day}"
+
+# Кэш итогов нужен только для быстрого ответа, поэтому живет недолго
+TOTAL_TTL = 600
+USER_CACHE_TTL = 300
+FLUSH_LOCK_TTL = 30
+
+# Забирает накопленные приращения в отдельный ключ. Если прошлый сброс
+# не завершился (падение процесса), сначала повторяется он
+_TAKE_PENDING_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 0 then
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return {}
+    end
+    redis.call('RENAME', KEYS[1], KEYS[2])
+end
+return redis.call('HGETALL', KEYS[2])
+"""
+
+# Снимает блокировку, только если она все еще принадлежит этому процессу
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def _field(user_id: int, day: date) -> str:
+    return f"{user_id}:{day.isoformat()}"
+
+
+def _parse_field(field) -> Tuple[int, date]:
+    if isinstance(field, bytes):
+        field = field.decode()
+    user_id, day = field.split(":", 1)
+    return int(user_id), date.fromisoformat(day)
+
+
+class WaterBuffer:
+    """
+    Буфер отложенной записи для быстрых нажатий "+вода".
+    Приращения копятся в Redis (переживают перезапуск процесса) и раз в
+    flush_interval секунд записываются в check_ins.water_ml одним запросом.
+    Доставка в БД "как минимум один раз": при падении между коммитом и
+    очисткой ключа последняя пачка может примениться повторно.
+    """
+
+    def __init__(self, redis: Redis, flush_interval: float = 1.0):
+        self.redis = redis
+        self.flush_interval = flush_interval
+        self.running = False
+        self.task = None
+        self._stopping = asyncio.Event()
+        self._users: Dict[int, Tuple[float, int, Optional[str]]] = {}
+        self._take_pending = redis.register_script(_TAKE_PENDING_SCRIPT)
+        self._release_lock = redis.register_script(_RELEASE_LOCK_SCRIPT)
+
+    async def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._stopping.clear()
+        self.task = asyncio.create_task(self.flush_loop())
+        logger.info("Буфер записи воды запущен")
+
+    async def stop(self):
+        # Цикл не отменяется посреди сброса: он завершает текущий сброс и выходит
+        self.running = False
+        self._stopping.set()
+        if self.task:
+            await self.task
+        await self.flush()
+        logger.info("Буфер записи воды остановлен")
+
+    async def resolve_user(self, telegram_id: int) -> Optional[Tuple[int, Optional[str]]]:
+        """Возвращает (user.id, timezone) с коротким кэшем в памяти процесса"""
+        cached = self._users.get(telegram_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+
+        async with get_session() as session:
+            result = await session.execute(
+                select(User.id, User.timezone).where(User.telegram_id == telegram_id)
+            )
+            row = result.one_or_none()
+
+        if row is None:
+            return None
+        self._users[telegram_id] = (time.monotonic() + USER_CACHE_TTL, row[0], row[1])
+        return row[0], row[1]
+
+    async def _buffered_delta(self, user_id: int, day: date) -> int:
+        field = _field(user_id, day)
+        pending, flushing = await asyncio.gather(
+            self.redis.hget(PENDING_KEY, field),
+            self.redis.hget(FLUSHING_KEY, field)
+        )
+        return int(pending or 0) + int(flushing or 0)
+
+    async def _load_stored(self, user_id: int, day: date) -> int:
+        async with get_session() as session:
+            result = await session.execute(
+                select(CheckIn.water_ml).where(
+                    and_(
+                        CheckIn.user_id == user_id,
+                        CheckIn.local_date == day
+                    )
+                )
+            )
+            return result.scalar_one_or_none() or 0
+
+    async def add(self, user_id: int, day: date, amount: int) -> int:
+        """Буферизует приращение и возвращает актуальный итог за день"""
+        total_key = TOTAL_KEY.format(user_id=user_id, day=day.isoformat())
+
+        if not await self.redis.exists(total_key):
+            base = await self._load_stored(user_id, day) + await self._buffered_delta(user_id, day)
+            await self.redis.set(total_key, base, ex=TOTAL_TTL, nx=True)
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(PENDING_KEY, _field(user_id, day), amount)
+            pipe.incrby(total_key, amount)
+            pipe.expire(total_key, TOTAL_TTL)
+            _, total, _ = await pipe.execute()
+        return int(total)
+
+    async def get_total(self, user_id: int, day: date, stored: Optional[int]) -> int:
+        """Итог за день с учетом еще не записанных в БД приращений"""
+        total = await self.redis.get(TOTAL_KEY.format(user_id=user_id, day=day.isoformat()))
+        if total is not None:
+            return int(total)
+        return (stored or 0) + await self._buffered_delta(user_id, day)
+
+    async def invalidate(self, user_id: int, day: date):
+        """Сбрасывает кэш итога после прямой записи water_ml в БД"""
+        await self.redis.delete(TOTAL_KEY.format(user_id=user_id, day=day.isoformat()))
+
+    async def _acquire_lock(self) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if await self.redis.set(FLUSH_LOCK_KEY, token, nx=True, ex=FLUSH_LOCK_TTL):
+            return token
+        return None
+
+    @asynccontextmanager
+    async def overwrite(self, user_id: int, day: date):
+        """
+        Блок для прямой записи water_ml в БД: отбрасывает еще не записанные
+        приращения за этот день и не дает сбросу буфера выполниться до выхода
+        из блока, чтобы старые приращения не легли поверх нового значения.
+        """
+        token = None
+        deadline = time.monotonic() + FLUSH_LOCK_TTL
+        while token is None and time.monotonic() < deadline:
+            token = await self._acquire_lock()
+            if token is None:
+                await asyncio.sleep(0.05)
+        if token is None:
+            logger.warning(f"Не дождались сброса буфера воды для user {user_id}")
+
+        try:
+            field = _field(user_id, day)
+            await self.redis.hdel(PENDING_KEY, field)
+            await self.redis.hdel(FLUSHING_KEY, field)
+            yield
+        finally:
+            await self.invalidate(user_id, day)
+            if token:
+                await self._release_lock(keys=[FLUSH_LOCK_KEY], args=[token])
+
+    async def flush(self) -> int:
+        """Записывает накопленные приращения в БД. Возвращает число обновленных дней."""
+        token = await self._acquire_lock()
+        if token is None:
+            return 0  # Сбрасывает другая реплика
+
+        try:
+            items = await self._take_pending(keys=[PENDING_KEY, FLUSHING_KEY])
+            if not items:
+                return 0
+
+            deltas = {}
+            for field, delta in zip(items[::2], items[1::2]):
+                deltas[_parse_field(field)] = int(delta)
+
+            async with get_session() as session:
+                await add_water_bulk(session, deltas)
+
+            await self.redis.delete(FLUSHING_KEY)
+            return len(deltas)
+        finally:
+            await self._release_lock(keys=[FLUSH_LOCK_KEY], args=[token])
+
+    async def flush_loop(self):
+        while self.running:
+            try:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.flush_interval)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+                await self.flush()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка при сбросе буфера воды: {e}", exc_info=True)
+
+
+water_buffer = WaterBuffer(redis_client)
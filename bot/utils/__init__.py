@@ -4,10 +4,14 @@ from .calculations import (
     calculate_weekly_progress,
     adjust_calories_for_plateau
 )
+from .timezone import parse_utc_offset, to_user_local, user_local_date
 
 __all__ = [
     "calculate_calories_and_macros",
     "calculate_water_intake", 
     "calculate_weekly_progress",
-    "adjust_calories_for_plateau"
+    "adjust_calories_for_plateau",
+    "parse_utc_offset",
+    "to_user_local",
+    "user_local_date"
 ]
\ No newline at end of file
@@ -0,0 +1,104 @@
+import importlib
+import logging
+import sys
+import time
+import types
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Тяжелые библиотеки, которые не должны загружаться при старте бота
+HEAVY_MODULES = (
+    "matplotlib",
+    "seaborn",
+    "numpy",
+    "scipy",
+    "reportlab",
+    "google.generativeai",
+    "PIL",
+)
+
+# Время первой загрузки модулей через lazy_import/load_module: {имя: секунды}
+_load_times: Dict[str, float] = {}
+
+
+def load_module(name: str, on_load: Optional[Callable[[types.ModuleType], None]] = None) -> types.ModuleType:
+    """Импортирует модуль, замеряя время первой загрузки"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    if on_load:
+        on_load(module)
+    _load_times[name] = time.perf_counter() - started
+    logger.info(f"Модуль {name} загружен за {_load_times[name]:.2f} с")
+    return module
+
+
+class LazyModule(types.ModuleType):
+    """
+    Заглушка модуля: настоящий импорт выполняется при первом обращении
+    к атрибуту. on_load вызывается один раз сразу после импорта.
+    """
+
+    def __init__(self, name: str, on_load: Optional[Callable[[types.ModuleType], None]] = None):
+        super().__init__(name)
+        self.__dict__["_lazy_on_load"] = on_load
+        self.__dict__["_lazy_module"] = None
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            module = load_module(self.__name__, self.__dict__["_lazy_on_load"])
+            self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name: str, on_load: Optional[Callable[[types.ModuleType], None]] = None) -> LazyModule:
+    return LazyModule(name, on_load)
+
+
+class LazyCallable:
+    """
+    Ссылка на функцию по имени модуля. Сериализуется (pickle) без импорта
+    модуля, поэтому подходит для передачи в пул процессов: тяжелый модуль
+    загрузится только в воркере.
+    """
+
+    def __init__(self, module: str, name: str):
+        self.module = module
+        self.name = name
+
+    def __call__(self, *args, **kwargs):
+        return getattr(load_module(self.module), self.name)(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<lazy {self.module}.{self.name}>"
+
+
+def warm_up(modules: Iterable[str]):
+    """Заранее загружает модули (для воркеров, которым они точно понадобятся)"""
+    for name in modules:
+        try:
+            load_module(name)
+        except ImportError as e:
+            logger.warning(f"Не удалось предзагрузить {name}: {e}")
+
+
+def import_report() -> Dict[str, object]:
+    """
+    Отчет об импортах: какие тяжелые библиотеки уже загружены
+    и сколько заняла отложенная загрузка модулей.
+    """
+    return {
+        "heavy_loaded": [name for name in HEAVY_MODULES if name in sys.modules],
+        "lazy_load_times": dict(_load_times),
+    }
@@ -0,0 +1,123 @@
+from collections import deque
+from datetime import date, datetime
+from typing import Dict, Hashable, List, Mapping, Optional, Sequence, Tuple, Union
+
+# Плато - окно из PLATEAU_WINDOW замеров, в котором вес менялся
+# не больше чем на PLATEAU_THRESHOLD кг
+PLATEAU_WINDOW = 7
+PLATEAU_THRESHOLD = 0.5
+
+
+def rolling_range(values: Sequence[float], window: int) -> List[float]:
+    """
+    Размах (max - min) каждого окна длины window за O(n):
+    монотонные деки хранят индексы кандидатов в максимум и минимум.
+    Результат i соответствует окну values[i:i + window].
+    """
+    max_idx, min_idx = deque(), deque()
+    ranges = []
+
+    for i, value in enumerate(values):
+        while max_idx and values[max_idx[-1]] <= value:
+            max_idx.pop()
+        max_idx.append(i)
+        while min_idx and values[min_idx[-1]] >= value:
+            min_idx.pop()
+        min_idx.append(i)
+
+        start = i - window + 1
+        if max_idx[0] < start:
+            max_idx.popleft()
+        if min_idx[0] < start:
+            min_idx.popleft()
+        if start >= 0:
+            ranges.append(values[max_idx[0]] - values[min_idx[0]])
+
+    return ranges
+
+
+def plateau_intervals(
+    values: Sequence[float],
+    window: int = PLATEAU_WINDOW,
+    threshold: float = PLATEAU_THRESHOLD
+) -> List[Tuple[int, int]]:
+    """Объединенные периоды плато: список (первый, последний) индексов включительно"""
+    intervals = []
+    for start, value_range in enumerate(rolling_range(values, window)):
+        if value_range > threshold:
+            continue
+        end = start + window - 1
+        # Перекрывающиеся окна сливаются в один период
+        if intervals and intervals[-1][1] >= start:
+            intervals[-1] = (intervals[-1][0], end)
+        else:
+            intervals.append((start, end))
+    return intervals
+
+
+def trailing_plateau_length(values: Sequence[float], threshold: float = PLATEAU_THRESHOLD) -> int:
+    """Число последних замеров, размах которых не превышает threshold"""
+    if not values:
+        return 0
+
+    low = high = values[-1]
+    length = 0
+    for value in reversed(values):
+        low, high = min(low, value), max(high, value)
+        if high - low > threshold:
+            break
+        length += 1
+    return length
+
+
+def _as_date(value: Union[date, datetime]) -> date:
+    return value.date() if isinstance(value, datetime) else value
+
+
+def detect_plateau(
+    values: Sequence[float],
+    window: int = PLATEAU_WINDOW,
+    threshold: float = PLATEAU_THRESHOLD,
+    dates: Optional[Sequence[Union[date, datetime]]] = None
+) -> Dict:
+    """
+    Анализ плато по ряду замеров веса (по возрастанию даты).
+    plateau_days - длина текущего плато (0, если его нет): в календарных днях
+    от первого до последнего замера плато, если переданы dates, иначе в замерах.
+    plateau_start - дата первого замера плато (только с dates).
+    """
+    if len(values) < window:
+        return {"is_plateau": False, "plateau_days": 0, "intervals": []}
+
+    recent = list(values[-window:])
+    weight_range = max(recent) - min(recent)
+    is_plateau = weight_range <= threshold
+    weigh_ins = trailing_plateau_length(values, threshold) if is_plateau else 0
+
+    plateau_days, plateau_start = weigh_ins, None
+    if dates is not None and weigh_ins:
+        plateau_start = _as_date(dates[-weigh_ins])
+        plateau_days = (_as_date(dates[-1]) - plateau_start).days + 1
+
+    return {
+        "is_plateau": is_plateau,
+        "plateau_days": plateau_days,
+        "plateau_start": plateau_start,
+        "weigh_ins": weigh_ins,
+        "weight_range": weight_range,
+        "recent_weights": recent,
+        "intervals": plateau_intervals(values, window, threshold)
+    }
+
+
+def detect_plateaus(
+    series: Mapping[Hashable, Sequence[float]],
+    window: int = PLATEAU_WINDOW,
+    threshold: float = PLATEAU_THRESHOLD,
+    dates: Optional[Mapping[Hashable, Sequence[Union[date, datetime]]]] = None
+) -> Dict[Hashable, Dict]:
+    """detect_plateau для пачки рядов {user_id: веса} (и дат замеров {user_id: даты})"""
+    return {
+        key: detect_plateau(values, window, threshold, dates[key] if dates is not None else None)
+        for key, values in series.items()
+    }
@@ -0,0 +1,93 @@
+import re
+from collections import deque
+from typing import Dict, Hashable, Iterable, List, Optional, Tuple
+
+# Окончания, которые отбрасываются при приведении слова к основе
+# ("помидоры" -> "помидор", "яблоко" -> "яблок")
+_ENDINGS = sorted([
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими", "ая", "яя", "ое", "ее",
+    "ые", "ие", "ый", "ий", "ой", "ом", "ем", "ах", "ях", "ов", "ев",
+    "а", "я", "ы", "и", "о", "е", "у", "ю", "ь", "й",
+], key=len, reverse=True)
+MIN_STEM = 3
+
+
+def normalize_name(name: str) -> str:
+    """Название продукта без количества, регистра, ё и знаков препинания"""
+    name = name.split(' - ', 1)[0].lower().replace('ё', 'е')
+    name = re.sub(r'[^a-zа-я ]+', ' ', name)
+    return ' '.join(name.split())
+
+
+def stem(word: str) -> str:
+    """Грубая основа русского слова: без типового окончания"""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def stem_text(text: str) -> str:
+    return ' '.join(stem(word) for word in normalize_name(text).split())
+
+
+class KeywordMatcher:
+    """
+    Поиск ключевых слов в строке за один проход (Ахо-Корасик).
+    Ключи и текст сравниваются по основам слов, поэтому "помидор"
+    находится и в "Помидоры черри"; ключ совпадает только с начала слова.
+    """
+
+    def __init__(self, keywords: Iterable[Tuple[str, Hashable]] = ()):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[int, Hashable]]] = [[]]
+        for keyword, value in keywords:
+            self._add(stem_text(keyword), value)
+        self._build()
+
+    def _add(self, keyword: str, value: Hashable):
+        if not keyword:
+            return
+        state = 0
+        for char in keyword:
+            if char not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[state][char] = len(self._goto) - 1
+            state = self._goto[state][char]
+        self._output[state].append((len(keyword), value))
+
+    def _build(self):
+        # Ссылки неудач обходом в ширину; у детей корня они ведут в корень
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                if state:
+                    self._fail[child] = self._goto[fallback].get(char, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text: str) -> Optional[Hashable]:
+        """Значение самого длинного найденного ключа (при равенстве - первого в тексте)"""
+        return self.find_stemmed(stem_text(text))
+
+    def find_stemmed(self, text: str) -> Optional[Hashable]:
+        """find для текста, уже приведенного stem_text (повторное приведение срезало бы основу)"""
+        best_length, best_value = 0, None
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, value in self._output[state]:
+                # Ключ должен начинаться с начала слова: "рис" не ищется в "барбарис"
+                start = index - length + 1
+                if length > best_length and (start == 0 or text[start - 1] == ' '):
+                    best_length, best_value = length, value
+        return best_value
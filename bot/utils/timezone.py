@@ -0,0 +1,32 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+_UTC_OFFSET_RE = re.compile(r"UTC([+-])(\d+)")
+
+
+def parse_utc_offset(tz_string: Optional[str]) -> timedelta:
+    """
+    Парсит строку часового пояса (напр. 'UTC+3') и возвращает смещение.
+    Неизвестные значения трактуются как UTC.
+    """
+    if not tz_string or tz_string == "UTC":
+        return timedelta(hours=0)
+
+    match = _UTC_OFFSET_RE.match(tz_string)
+    if match:
+        sign = 1 if match.group(1) == '+' else -1
+        hours = int(match.group(2))
+        return timedelta(hours=sign * hours)
+
+    return timedelta(hours=0)  # Fallback to UTC
+
+
+def to_user_local(now_utc: datetime, tz_string: Optional[str]) -> datetime:
+    """Переводит наивное UTC-время в локальное время пользователя"""
+    return now_utc + parse_utc_offset(tz_string)
+
+
+def user_local_date(tz_string: Optional[str], now_utc: Optional[datetime] = None) -> date:
+    """Текущая календарная дата пользователя (для CheckIn.local_date)"""
+    return to_user_local(now_utc or datetime.utcnow(), tz_string).date()
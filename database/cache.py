@@ -0,0 +1,29 @@
+import logging
+from typing import Iterable
+from redis.asyncio import Redis
+
+from bot.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Общий клиент Redis для сервисов (соединения открываются при первой команде)
+redis_client = Redis.from_url(settings.redis_url)
+
+DATA_VERSION_KEY = "data_version:{user_id}"
+
+
+async def get_data_version(user_id: int) -> int:
+    """Версия данных пользователя: меняется при каждой записи чек-инов или профиля"""
+    version = await redis_client.get(DATA_VERSION_KEY.format(user_id=user_id))
+    return int(version or 0)
+
+
+async def bump_data_versions(user_ids: Iterable[int]):
+    """Увеличивает версии данных (вызывается после коммита изменений)"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for user_id in user_ids:
+            pipe.incr(DATA_VERSION_KEY.format(user_id=user_id))
+        await pipe.execute()
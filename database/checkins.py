@@ -0,0 +1,160 @@
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+from sqlalchemy import func, cast, literal, bindparam
+from sqlalchemy.dialects.postgresql import insert, JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database.models import CheckIn
+from database.connection import mark_user_data_changed
+
+# Запись чек-инов одним запросом: INSERT ... ON CONFLICT (user_id, local_date)
+# DO UPDATE ... RETURNING. Одновременные нажатия не создают дублей и не теряют
+# приращения, т.к. все изменения выполняются на стороне БД.
+
+
+async def _upsert(
+    session: AsyncSession,
+    user_id: int,
+    local_date: date,
+    insert_values: dict,
+    update_set: dict,
+    checkin_date: Optional[datetime] = None
+) -> CheckIn:
+    now = datetime.utcnow()
+    stmt = insert(CheckIn).values(
+        user_id=user_id,
+        local_date=local_date,
+        date=checkin_date or now,
+        created_at=now,
+        **insert_values
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CheckIn.user_id, CheckIn.local_date],
+        set_=update_set
+    ).returning(CheckIn)
+
+    result = await session.execute(stmt, execution_options={"populate_existing": True})
+    mark_user_data_changed(session, user_id)
+    return result.scalar_one()
+
+
+async def upsert_checkin(
+    session: AsyncSession,
+    user_id: int,
+    local_date: date,
+    checkin_date: Optional[datetime] = None,
+    **fields
+) -> CheckIn:
+    """
+    Создает чек-ин за день или перезаписывает в нем переданные поля.
+    Поля со значением None тоже записываются (как и при присваивании атрибутов).
+    checkin_date используется только при создании строки.
+    """
+    return await _upsert(session, user_id, local_date, fields, fields, checkin_date)
+
+
+async def increment_checkin(session: AsyncSession, user_id: int, local_date: date, **deltas) -> CheckIn:
+    """Атомарно прибавляет значения к числовым полям чек-ина (например, water_ml)"""
+    table = CheckIn.__table__
+    update_set = {
+        field: func.coalesce(table.c[field], 0) + delta
+        for field, delta in deltas.items()
+    }
+    return await _upsert(session, user_id, local_date, deltas, update_set)
+
+
+async def merge_checkin_json(
+    session: AsyncSession,
+    user_id: int,
+    local_date: date,
+    field: str,
+    patch: dict,
+    checkin_date: Optional[datetime] = None,
+    **fields
+) -> CheckIn:
+    """
+    Upsert с дополнительным слиянием JSON-поля: ключи patch добавляются
+    к существующему объекту, остальные ключи сохраняются.
+    """
+    column = CheckIn.__table__.c[field]
+    merged = func.coalesce(cast(column, JSONB), cast(literal("{}"), JSONB)).op("||")(
+        bindparam(f"{field}_patch", patch, type_=JSONB)
+    )
+    update_set = dict(fields)
+    update_set[field] = cast(merged, column.type)
+    return await _upsert(session, user_id, local_date, {**fields, field: patch}, update_set, checkin_date)
+
+
+async def add_water_bulk(session: AsyncSession, deltas: Dict[Tuple[int, date], int]):
+    """
+    Применяет накопленные приращения воды {(user_id, local_date): мл}
+    одним многострочным upsert.
+    """
+    if not deltas:
+        return
+
+    now = datetime.utcnow()
+    stmt = insert(CheckIn).values([
+        {
+            "user_id": user_id,
+            "local_date": local_date,
+            "date": now,
+            "created_at": now,
+            "water_ml": delta
+        }
+        for (user_id, local_date), delta in deltas.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CheckIn.user_id, CheckIn.local_date],
+        set_={"water_ml": func.coalesce(CheckIn.__table__.c.water_ml, 0) + stmt.excluded.water_ml}
+    )
+    await session.execute(stmt)
+    for user_id, _ in deltas:
+        mark_user_data_changed(session, user_id)
+
+
+async def merge_checkins_bulk(
+    session: AsyncSession,
+    user_id: int,
+    rows: Dict[date, dict],
+    field: str,
+    patches: Dict[date, dict],
+    checkin_dates: Optional[Dict[date, datetime]] = None
+):
+    """
+    Многострочный вариант merge_checkin_json для нескольких дней одного
+    пользователя {local_date: поля}. Поля со значением None не перезаписывают
+    сохраненные значения; JSON-поле field дополняется patches[local_date].
+    """
+    if not rows:
+        return
+
+    table = CheckIn.__table__
+    columns = sorted({name for values in rows.values() for name in values})
+    checkin_dates = checkin_dates or {}
+    now = datetime.utcnow()
+
+    stmt = insert(CheckIn).values([
+        {
+            "user_id": user_id,
+            "local_date": local_date,
+            "date": checkin_dates.get(local_date, now),
+            "created_at": now,
+            **{name: values.get(name) for name in columns},
+            field: patches.get(local_date, {})
+        }
+        for local_date, values in rows.items()
+    ])
+
+    column = table.c[field]
+    update_set = {name: func.coalesce(stmt.excluded[name], table.c[name]) for name in columns}
+    update_set[field] = cast(
+        func.coalesce(cast(column, JSONB), cast(literal("{}"), JSONB)).op("||")(cast(stmt.excluded[field], JSONB)),
+        column.type
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[CheckIn.user_id, CheckIn.local_date],
+        set_=update_set
+    )
+    await session.execute(stmt)
+    mark_user_data_changed(session, user_id)
@@ -1,10 +1,13 @@
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import DeclarativeBase, Session
 from contextlib import asynccontextmanager
 import logging
 
 from bot.config import settings
-from database.models import Base
+from database.models import Base, User, CheckIn
+from database.cache import bump_data_versions
+from database.migrations import run_migrations
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +35,7 @@ async def init_db():
         # await conn.run_sync(Base.metadata.drop_all)
         # Затем создаем их заново по актуальным моделям
         await conn.run_sync(Base.metadata.create_all)
+        await run_migrations(conn)
     logger.info("База данных инициализирована")
 
 async def close_db():
@@ -39,6 +43,32 @@ async def close_db():
     await engine.dispose()
     logger.info("Соединение с БД закрыто")
 
+def mark_user_data_changed(session, user_id: int):
+    """
+    Отмечает, что данные пользователя изменены в этой сессии: после коммита
+    его версия данных увеличится и закэшированные графики станут неактуальны.
+    """
+    sync_session = session.sync_session if isinstance(session, AsyncSession) else session
+    sync_session.info.setdefault("changed_users", set()).add(user_id)
+
+@event.listens_for(Session, "before_flush")
+def _track_changed_users(session, flush_context, instances):
+    """Автоматически отмечает изменения профиля и чек-инов, сделанные через ORM"""
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            mark_user_data_changed(session, obj.id)
+        elif isinstance(obj, CheckIn) and obj.user_id is not None:
+            mark_user_data_changed(session, obj.user_id)
+
+async def _bump_changed_users(session: AsyncSession):
+    changed = session.sync_session.info.pop("changed_users", None)
+    if not changed:
+        return
+    try:
+        await bump_data_versions(changed)
+    except Exception as e:
+        logger.warning(f"Не удалось обновить версии данных пользователей: {e}")
+
 @asynccontextmanager
 async def get_session():
     """Контекстный менеджер для работы с сессией"""
@@ -46,8 +76,11 @@ async def get_session():
         try:
             yield session
             await session.commit()
+            # Только после коммита, чтобы кэш не сохранил данные под новой версией раньше времени
+            await _bump_changed_users(session)
         except Exception:
             await session.rollback()
+            session.sync_session.info.pop("changed_users", None)
             raise
         finally:
             await session.close()
\ No newline at end of file
@@ -0,0 +1,56 @@
+import logging
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+# create_all не изменяет существующие таблицы, поэтому новые колонки и
+# индексы добавляются здесь. Каждый шаг идемпотентен и выполняется при старте.
+MIGRATIONS = [
+    (
+        "check_ins.local_date",
+        "ALTER TABLE check_ins ADD COLUMN IF NOT EXISTS local_date DATE"
+    ),
+    (
+        "ix_check_ins_user_date",
+        "CREATE INDEX IF NOT EXISTS ix_check_ins_user_date ON check_ins (user_id, date)"
+    ),
+    (
+        "backfill check_ins.local_date",
+        # Локальная дата по часовому поясу пользователя ('UTC+3' и т.п.).
+        # Если за день уже несколько чек-инов, дату получает только последний,
+        # чтобы не нарушить уникальность (user_id, local_date)
+        r"""
+        UPDATE check_ins AS c
+        SET local_date = s.local_date
+        FROM (
+            SELECT id, user_id, local_date,
+                   row_number() OVER (PARTITION BY user_id, local_date ORDER BY id DESC) AS rn
+            FROM (
+                SELECT c2.id, c2.user_id,
+                       (c2.date + COALESCE(substring(u.timezone from '^UTC([+-]\d+)$')::int, 0)
+                                  * interval '1 hour')::date AS local_date
+                FROM check_ins AS c2
+                JOIN users AS u ON u.id = c2.user_id
+                WHERE c2.local_date IS NULL AND c2.date IS NOT NULL
+            ) AS t
+        ) AS s
+        WHERE c.id = s.id
+          AND s.rn = 1
+          AND NOT EXISTS (
+              SELECT 1 FROM check_ins AS e
+              WHERE e.user_id = s.user_id AND e.local_date = s.local_date
+          )
+        """
+    ),
+    (
+        "uq_check_ins_user_local_date",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_check_ins_user_local_date ON check_ins (user_id, local_date)"
+    ),
+]
+
+
+async def run_migrations(conn):
+    """Применяет изменения схемы, которые не покрывает create_all"""
+    for name, statement in MIGRATIONS:
+        await conn.execute(text(statement))
+        logger.debug(f"Миграция применена: {name}")
@@ -1,8 +1,8 @@
 import enum
 from datetime import datetime
 from sqlalchemy import (
-    Column, Integer, BigInteger, String, Float, DateTime, Boolean, 
-    Text, JSON, ForeignKey, Enum as SQLEnum, Numeric
+    Column, Integer, BigInteger, String, Float, DateTime, Date, Boolean, 
+    Text, JSON, ForeignKey, Enum as SQLEnum, Numeric, UniqueConstraint, Index
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
@@ -107,6 +107,8 @@ class User(Base):
     check_ins = relationship("CheckIn", back_populates="user", cascade="all, delete-orphan")
     meal_plans = relationship("MealPlan", back_populates="user", cascade="all, delete-orphan")
     user_patterns = relationship("UserPattern", back_populates="user", cascade="all, delete-orphan")
+    reminder_schedules = relationship("ReminderSchedule", back_populates="user", cascade="all, delete-orphan")
+    tracker_sync_states = relationship("TrackerSyncState", back_populates="user", cascade="all, delete-orphan")
     
     subscriptions = relationship("Subscription", back_populates="user", cascade="all, delete-orphan")
     payments = relationship("Payment", back_populates="user", cascade="all, delete-orphan")
@@ -117,11 +119,17 @@ class User(Base):
 
 class CheckIn(Base):
     __tablename__ = "check_ins"
+    __table_args__ = (
+        Index("ix_check_ins_user_date", "user_id", "date"),
+        # Один чек-ин на календарный день пользователя (в его часовом поясе)
+        Index("uq_check_ins_user_local_date", "user_id", "local_date", unique=True),
+    )
     
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
     date = Column(DateTime, default=datetime.utcnow)
+    local_date = Column(Date, nullable=True)
     weight = Column(Float, nullable=True)
     sleep_hours = Column(Float, nullable=True)
     mood = Column(String(20), nullable=True)
@@ -204,6 +212,46 @@ class UserPattern(Base):
     
     user = relationship("User", back_populates="user_patterns")
 
+class ReminderSchedule(Base):
+    """Время следующего срабатывания напоминания пользователя (UTC)"""
+    __tablename__ = "reminder_schedules"
+    __table_args__ = (
+        UniqueConstraint("user_id", "reminder_type", name="uq_reminder_schedules_user_type"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    reminder_type = Column(String(20), nullable=False)  # morning / evening / water
+    next_fire_at = Column(DateTime, nullable=False, index=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    user = relationship("User", back_populates="reminder_schedules")
+
+class TrackerSyncState(Base):
+    """Отметка последней синхронизации фитнес-трекера пользователя (UTC)"""
+    __tablename__ = "tracker_sync_states"
+    __table_args__ = (
+        UniqueConstraint("user_id", "provider", name="uq_tracker_sync_states_user_provider"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    provider = Column(String(30), nullable=False)  # google_fit / ...
+    last_synced_at = Column(DateTime, nullable=False)
+    last_full_sync_at = Column(DateTime, nullable=True)  # последняя полная сверка окна
+    
+    user = relationship("User", back_populates="tracker_sync_states")
+
+class IngredientCategory(Base):
+    """Категория списка покупок для нормализованного названия ингредиента"""
+    __tablename__ = "ingredient_categories"
+    
+    id = Column(Integer, primary_key=True)
+    name = Column(String(200), nullable=False, unique=True)  # нормализованное название
+    category = Column(String(100), nullable=False)
+    source = Column(String(20), nullable=False, default="ai")  # ai / manual
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 # --- Payment Models ---
 
 class Subscription(Base):